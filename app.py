@@ -110,7 +110,7 @@ class HomeScreen(Screen):
             self.status_text = "Crawler not running"
             return
 
-        crawler.STOP_REQUESTED = True
+        crawler.request_stop()
         self.status_text = "Stopping crawler..."
         Clock.unschedule(self.check_crawler_progress)
 
@@ -161,7 +161,7 @@ class HomeScreen(Screen):
             self.status_text = "Indexer not running"
             return
 
-        indexer.STOP_INDEXER = True
+        indexer.request_stop()
         self.status_text = "Stopping indexer..."
         Clock.unschedule(self.check_indexer_progress)
 
@@ -0,0 +1,207 @@
+"""Headless entry point: run the crawl engines without Kivy.
+
+    python -m artcrawler crawl --data-dir /srv/art/data --images-dir /srv/art/images
+    python -m artcrawler index
+    python -m artcrawler snapshot --keep 3
+    python -m artcrawler verify --dry-run       # hash and check every image
+    python -m artcrawler worker                 # engines behind a Unix socket
+    python -m artcrawler ctl start crawler      # start|stop crawler|indexer
+    python -m artcrawler ctl status             # also: events, shutdown
+    python -m artcrawler coordinator --token s3cret   # share this art.db's queue
+    python -m artcrawler crawl --coordinator http://host:8765
+"""
+import os
+import sys
+import signal
+import argparse
+
+
+def _configure_paths(args):
+    # device.py reads these when db/crawler are first imported
+    if args.home:
+        os.environ["ARTCRAWLER_HOME"] = args.home
+    if args.data_dir:
+        os.environ["ARTCRAWLER_DATA_DIR"] = args.data_dir
+    if args.shared_dir:
+        os.environ["ARTCRAWLER_SHARED_DIR"] = args.shared_dir
+    if args.images_dir:
+        os.environ["ARTCRAWLER_IMAGES_DIR"] = args.images_dir
+
+
+def _stop_on_signal(stop):
+    def handler(signum, frame):
+        print("Stop requested…")
+        stop()
+
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def crawl(args):
+    # remote.py reads these at import
+    if args.coordinator:
+        os.environ["ARTCRAWLER_COORDINATOR"] = args.coordinator
+    if args.node:
+        os.environ["ARTCRAWLER_NODE"] = args.node
+    import crawler
+    import governor
+    import scheduler
+
+    if args.workers:
+        governor.MAX_WORKERS = args.workers
+    if args.progressive:
+        crawler.PROGRESSIVE = True
+    if args.fair_share:
+        scheduler.FAIR_SHARE = True
+    if args.sleep is not None:
+        crawler.SLEEP_BETWEEN_ITEMS = args.sleep
+
+    _stop_on_signal(crawler.request_stop)
+    crawler.run_crawler()
+
+
+def index(args):
+    import indexer
+
+    _stop_on_signal(indexer.request_stop)
+    indexer.run_indexer()
+
+
+def take_snapshot(args):
+    import snapshot
+
+    argv = ["--keep", str(args.keep)]
+    if args.dest:
+        argv += ["--dest", args.dest]
+    if args.no_compress:
+        argv.append("--no-compress")
+    return snapshot.main(argv)
+
+
+def run_verify(args):
+    import verify
+
+    argv = ["--workers", str(args.workers)]
+    if args.quarantine:
+        argv += ["--quarantine", args.quarantine]
+    if args.dry_run:
+        argv.append("--dry-run")
+    return verify.main(argv)
+
+
+def run_coordinator(args):
+    if args.token:
+        os.environ["ARTCRAWLER_COORDINATOR_TOKEN"] = args.token
+    import threading
+    import coordinator
+
+    def stop():
+        threading.Thread(target=coordinator.shutdown, daemon=True).start()
+
+    _stop_on_signal(stop)
+    try:
+        coordinator.serve(args.host or coordinator.HOST, args.port)
+    except ValueError as e:
+        print(e)
+        return 2
+
+
+def run_worker(args):
+    import worker
+
+    def stop():
+        import threading
+        threading.Thread(target=worker.shutdown, daemon=True).start()
+
+    _stop_on_signal(stop)
+    worker.serve(args.socket or worker.SOCKET_PATH)
+
+
+def ctl(args):
+    import json
+    import worker
+
+    path = args.socket or worker.SOCKET_PATH
+    if args.action == "events":
+        done = worker.subscribe(lambda msg: print(json.dumps(msg)), path)
+        _stop_on_signal(done.set)
+        done.wait()
+        return 0
+
+    if args.action in ("start", "stop") and not args.engine:
+        print(f"ctl {args.action} needs an engine: crawler or indexer")
+        return 2
+    if args.action == "start" and not worker.spawn(path):
+        print(f"No worker on {path} and could not start one")
+        return 1
+
+    try:
+        reply = worker.request(args.action, path, engine=args.engine)
+    except OSError as e:
+        print(f"Worker not reachable on {path}: {e}")
+        return 1
+    print(json.dumps(reply, indent=2))
+    return 0 if reply.get("ok") else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m artcrawler")
+    parser.add_argument("--home", help="base dir for headless defaults")
+    parser.add_argument("--data-dir", help="directory holding art.db")
+    parser.add_argument("--shared-dir", help="shared storage root")
+    parser.add_argument("--images-dir", help="image library directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("crawl", help="download images for queued items")
+    p.add_argument("--fair-share", action="store_true",
+                   help="weighted round-robin across year buckets")
+    p.add_argument("--sleep", type=int,
+                   help="seconds between items (default 2)")
+    p.add_argument("--workers", type=int,
+                   help="most items in flight at once (default 3)")
+    p.add_argument("--progressive", action="store_true",
+                   help="small previews first, full resolution queued for later")
+    p.add_argument("--coordinator", metavar="URL",
+                   help="lease work from a coordinator instead of only local items")
+    p.add_argument("--node", help="node name reported to the coordinator")
+    p.set_defaults(func=crawl)
+
+    p = sub.add_parser("index", help="fill the queue from WDQS")
+    p.set_defaults(func=index)
+
+    p = sub.add_parser("snapshot", help="online backup of art.db")
+    p.add_argument("--dest", help="snapshot directory")
+    p.add_argument("--keep", type=int, default=5)
+    p.add_argument("--no-compress", action="store_true")
+    p.set_defaults(func=take_snapshot)
+
+    p = sub.add_parser("verify", help="check the image library, re-queue bad files")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    p.add_argument("--quarantine", metavar="DIR", help="where bad files go")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=run_verify)
+
+    p = sub.add_parser("coordinator", help="hand out this art.db's queue to other devices")
+    p.add_argument("--host",
+                   help="bind address (default: all interfaces with a token, else 127.0.0.1)")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--token", help="shared secret nodes must send")
+    p.set_defaults(func=run_coordinator)
+
+    p = sub.add_parser("worker", help="run engines as a socket-controlled worker")
+    p.add_argument("--socket", help="Unix socket path (default: data dir)")
+    p.set_defaults(func=run_worker)
+
+    p = sub.add_parser("ctl", help="control a running worker")
+    p.add_argument("action", choices=["start", "stop", "status", "events", "shutdown"])
+    p.add_argument("engine", nargs="?", choices=["crawler", "indexer"])
+    p.add_argument("--socket", help="Unix socket path (default: data dir)")
+    p.set_defaults(func=ctl)
+
+    args = parser.parse_args(argv)
+    _configure_paths(args)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,17 @@
-from time import sleep
-from android import AndroidService
+import os
+import sys
+
+# p4a runs this file as a script; the app's modules live one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import worker
+
 
 def main():
-    service = AndroidService("ArtCrawler Background Service", "Running…")
-    service.start()
+    # Foreground service (see buildozer.spec): the crawl keeps going
+    # with the UI closed, and the UI reattaches over the socket
+    worker.serve()
+
 
-    while True:
-        sleep(5)
+if __name__ == "__main__":
+    main()
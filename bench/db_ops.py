@@ -0,0 +1,233 @@
+"""Database micro-benchmarks at 100k-5M rows.
+
+Builds synthetic items tables, times the crawler, indexer and UI
+queries against them and writes the numbers as JSON. Pass a
+previous result with --baseline to flag regressions.
+
+    python -m bench.db_ops --rows 100000,1000000 --json after.json \\
+        --baseline before.json
+"""
+import os
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+from bench.e2e import configure_headless, percentile
+
+# Ignore differences below this; timer noise at sub-ms scale
+MIN_REGRESSION_MS = 0.05
+
+
+# ---------------------------------------------------------
+# Synthetic data
+# ---------------------------------------------------------
+def build_db(db, rows, mix, seed):
+    db.init_db()
+    rng = random.Random(seed)
+    conn = db.get_db()
+    conn.execute("PRAGMA synchronous = OFF")
+
+    now = time.time()
+    batch = []
+    for n in range(rows):
+        year = rng.randint(1300, 2024)
+        bucket, priority = db.classify_year(year)
+        r = rng.random()
+        if r < mix["done"]:
+            state = (1, 0, 0, None, None)
+        elif r < mix["done"] + mix["soft"]:
+            state = (0, 1, rng.randint(1, 4), "download",
+                     now + rng.uniform(-3600, 3600))
+        elif r < mix["done"] + mix["soft"] + mix["hard"]:
+            state = (1, 0, rng.randint(1, 8), "403", None)
+        else:
+            state = (0, 0, 0, None, None)
+        batch.append((f"Q{n + 1}", year, year // 100 + 1, bucket, priority) + state)
+
+        if len(batch) >= 50000:
+            _insert(conn, batch)
+            batch = []
+    _insert(conn, batch)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+def _insert(conn, batch):
+    conn.executemany("""
+        INSERT INTO items (qid, year, century, bucket, priority, done,
+                           wifi_retry, wifi_fail_count, last_fail_reason,
+                           next_attempt_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, batch)
+    conn.commit()
+
+
+# ---------------------------------------------------------
+# Timing
+# ---------------------------------------------------------
+def measure(func, repeat, setup=None, teardown=None):
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        result = func(arg) if setup else func()
+        samples.append(time.perf_counter() - t0)
+        if teardown:
+            teardown(result)
+    samples.sort()
+    return {
+        "n": repeat,
+        "median_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 4),
+    }
+
+
+def run_size(rows, mix, repeat, seed, root):
+    import db
+    import crawler
+    import indexer
+    import scheduler
+    import status
+
+    db.DB_PATH = os.path.join(root, f"bench_{rows}.db")
+    if os.path.exists(db.DB_PATH):
+        os.remove(db.DB_PATH)
+
+    t0 = time.perf_counter()
+    build_db(db, rows, mix, seed)
+    build_s = time.perf_counter() - t0
+
+    rng = random.Random(seed + 1)
+    noop = lambda msg: None
+    results = {}
+
+    results["crawler.get_next_item"] = measure(
+        crawler.get_next_item, repeat,
+        teardown=lambda row: row and scheduler.release(row[0]),
+    )
+    results["crawler.mark_done"] = measure(
+        crawler.mark_done, repeat,
+        setup=lambda: f"Q{rng.randint(1, rows)}",
+    )
+
+    fresh = iter(range(rows + 1, rows + 1 + repeat))
+    results["indexer.insert_item"] = measure(
+        lambda qid: indexer.insert_item(qid, 1900), repeat,
+        setup=lambda: f"Q{next(fresh)}",
+    )
+
+    slow_repeat = max(3, repeat // 10)
+    results["crawler.print_stats"] = measure(
+        lambda: crawler.print_stats(noop), slow_repeat,
+    )
+    results["crawler.print_db_summary"] = measure(
+        lambda: crawler.print_db_summary(noop), slow_repeat,
+    )
+
+    def status_snapshot():
+        conn = db.get_db()
+        status.collect_db(conn)
+        conn.close()
+    results["status.collect_db"] = measure(status_snapshot, slow_repeat)
+
+    size_mb = os.path.getsize(db.DB_PATH) / 1e6
+    os.remove(db.DB_PATH)
+    return {"build_s": round(build_s, 2), "db_mb": round(size_mb, 1),
+            "ops": results}
+
+
+# ---------------------------------------------------------
+# Regression check
+# ---------------------------------------------------------
+def compare(result, baseline, threshold):
+    regressions = []
+    for size, current in result["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if not base:
+            continue
+        for op, stats in current["ops"].items():
+            old = base["ops"].get(op)
+            if not old:
+                continue
+            new_ms, old_ms = stats["median_ms"], old["median_ms"]
+            if new_ms > old_ms * threshold and new_ms - old_ms > MIN_REGRESSION_MS:
+                regressions.append((size, op, old_ms, new_ms))
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="100000,1000000",
+                        help="comma-separated table sizes")
+    parser.add_argument("--done", type=float, default=0.6)
+    parser.add_argument("--soft", type=float, default=0.05)
+    parser.add_argument("--hard", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare to")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="flag ops slower than baseline by this factor")
+    args = parser.parse_args()
+
+    import sqlite3
+
+    root = tempfile.mkdtemp(prefix="artcrawler-dbbench-")
+    configure_headless(root)
+    mix = {"done": args.done, "soft": args.soft, "hard": args.hard}
+
+    result = {
+        "revision": git_revision(),
+        "sqlite": sqlite3.sqlite_version,
+        "timestamp": time.time(),
+        "mix": mix,
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+
+    try:
+        for rows in (int(r) for r in args.rows.split(",")):
+            print(f"--- {rows} rows ---")
+            size = run_size(rows, mix, args.repeat, args.seed, root)
+            result["sizes"][str(rows)] = size
+            print(f"built in {size['build_s']}s, {size['db_mb']} MB")
+            for op, s in size["ops"].items():
+                print(f"  {op:<28} median {s['median_ms']:>10.3f} ms"
+                      f"   p95 {s['p95_ms']:>10.3f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for size, op, old_ms, new_ms in regressions:
+            print(f"REGRESSION {size} rows {op}: "
+                  f"{old_ms:.3f} ms -> {new_ms:.3f} ms")
+        if regressions:
+            raise SystemExit(1)
+        print(f"No regressions against {baseline.get('revision') or args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Offline end-to-end benchmark for the indexer and crawler.
+
+Runs run_indexer() and run_crawler() against bench.fakewiki on
+localhost and reports throughput, per-stage latency and bytes on
+the wire. Headless; needs only requests.
+
+    python -m bench.e2e --items 500 --latency-ms 30 --error-rate 0.02
+"""
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from bench.fakewiki import FakeWiki, DEFAULTS
+
+
+# ---------------------------------------------------------
+# Headless environment
+# ---------------------------------------------------------
+def configure_headless(root):
+    # device.py picks these up when db and crawler are imported
+    os.environ["ARTCRAWLER_DATA_DIR"] = os.path.join(root, "private")
+    os.environ["ARTCRAWLER_SHARED_DIR"] = os.path.join(root, "shared")
+    os.environ.pop("ARTCRAWLER_IMAGES_DIR", None)
+
+
+# ---------------------------------------------------------
+# Stage timing
+# ---------------------------------------------------------
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, module, name, stage=None):
+        func = getattr(module, name)
+        stage = stage or name
+        timer = self
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timer.add(stage, time.perf_counter() - t0)
+
+        setattr(module, name, timed)
+
+    def add(self, stage, seconds):
+        with self.lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def summary(self):
+        out = {}
+        for stage, values in sorted(self.samples.items()):
+            values = sorted(values)
+            out[stage] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "total_s": round(sum(values), 3),
+            }
+        return out
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# ---------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------
+def run(config, keep_dir=False):
+    root = tempfile.mkdtemp(prefix="artcrawler-bench-")
+    configure_headless(root)
+
+    import db
+    import crawler
+    import governor
+    import indexer
+    import retries
+
+    wiki = FakeWiki(**config)
+    wiki.start()
+    urls = wiki.urls
+
+    crawler.WIKIDATA_API = urls["WIKIDATA_API"]
+    crawler.COMMONS_API = urls["COMMONS_API"]
+    crawler.COMMONS_THUMB = urls["COMMONS_THUMB"]
+    indexer.SPARQL_URL = urls["SPARQL_URL"]
+
+    crawler.SLEEP_BETWEEN_ITEMS = 0
+    indexer.SLEEP_BETWEEN_BATCHES = 0
+    indexer.SLEEP_BETWEEN_PASSES = 0
+    # Device sensors aren't what we're measuring here
+    full_speed = governor.Budget(governor.MAX_WORKERS, 1.0, False, False,
+                                 "bench", 0, 100, 30.0)
+    crawler.safety_gate = lambda callback, worker=0: full_speed
+
+    timer = StageTimer()
+    timer.wrap(indexer, "fetch_items", "index.sparql")
+    timer.wrap(indexer, "insert_item", "index.insert")
+    timer.wrap(crawler, "get_next_item", "crawl.claim")
+    timer.wrap(crawler, "get_image_title_for_qid", "crawl.p18")
+    timer.wrap(crawler, "get_image_info", "crawl.imageinfo")
+    timer.wrap(crawler, "download_image", "crawl.download")
+    timer.wrap(crawler, "mark_done", "crawl.commit")
+    timer.wrap(retries, "mark_failed", "crawl.commit")
+    timer.wrap(crawler, "print_stats", "crawl.stats")
+
+    quiet = lambda msg: None
+
+    try:
+        # -------------------------
+        # Indexer
+        # -------------------------
+        t0 = time.perf_counter()
+        indexer.run_indexer(progress_callback=quiet)
+        index_s = time.perf_counter() - t0
+        index_bytes = wiki.bytes_sent
+
+        conn = db.get_db()
+        indexed = conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        conn.close()
+
+        # -------------------------
+        # Crawler: runs until the queue is empty
+        # -------------------------
+        def on_progress(msg):
+            if msg.startswith("No more items"):
+                crawler.request_stop()
+
+        t0 = time.perf_counter()
+        crawler.run_crawler(progress_callback=on_progress)
+        crawl_s = time.perf_counter() - t0
+
+        processed = len(timer.samples.get("crawl.p18", []))
+    finally:
+        wiki.stop()
+        if not keep_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "config": wiki.config,
+        "indexer": {
+            "items": indexed,
+            "seconds": round(index_s, 3),
+            "items_per_sec": round(indexed / index_s, 2) if index_s else 0,
+            "bytes": index_bytes,
+        },
+        "crawler": {
+            "items": processed,
+            "downloaded": crawler.stats["downloaded"],
+            "failures": crawler.stats["failures"],
+            "seconds": round(crawl_s, 3),
+            "items_per_sec": round(processed / crawl_s, 2) if crawl_s else 0,
+            "bytes": wiki.bytes_sent - index_bytes,
+        },
+        "requests": dict(wiki.requests),
+        "bytes_on_wire": wiki.bytes_sent,
+        "stages": timer.summary(),
+        "data_dir": root if keep_dir else None,
+    }
+
+
+def print_report(result):
+    ix = result["indexer"]
+    cr = result["crawler"]
+    print("=== ArtCrawler offline benchmark ===")
+    print(f"Indexer: {ix['items']} items in {ix['seconds']}s "
+          f"({ix['items_per_sec']}/s), {ix['bytes'] / 1e6:.2f} MB")
+    print(f"Crawler: {cr['items']} items in {cr['seconds']}s "
+          f"({cr['items_per_sec']}/s), {cr['downloaded']} downloaded, "
+          f"{cr['failures']} failures, {cr['bytes'] / 1e6:.2f} MB")
+    print(f"Requests: {result['requests']}")
+    print()
+    print(f"{'stage':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}"
+          f"{'max ms':>10}{'total s':>10}")
+    for stage, s in result["stages"].items():
+        print(f"{stage:<18}{s['count']:>7}{s['p50_ms']:>10}{s['p95_ms']:>10}"
+              f"{s['max_ms']:>10}{s['total_s']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=DEFAULTS["items"])
+    parser.add_argument("--latency-ms", type=float, default=DEFAULTS["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=DEFAULTS["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULTS["error_rate"])
+    parser.add_argument("--rate-429", type=float, default=DEFAULTS["rate_429"])
+    parser.add_argument("--forbidden-rate", type=float, default=DEFAULTS["forbidden_rate"])
+    parser.add_argument("--payload-kb", type=int, default=DEFAULTS["payload_kb"])
+    parser.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    parser.add_argument("--json", help="also write the result to this file")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the scratch DB and images")
+    args = parser.parse_args()
+
+    config = {
+        "items": args.items,
+        "latency_ms": args.latency_ms,
+        "jitter_ms": args.jitter_ms,
+        "error_rate": args.error_rate,
+        "rate_429": args.rate_429,
+        "forbidden_rate": args.forbidden_rate,
+        "payload_kb": args.payload_kb,
+        "seed": args.seed,
+    }
+    result = run(config, keep_dir=args.keep)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
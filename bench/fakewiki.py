@@ -0,0 +1,232 @@
+import json
+import re
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote
+
+# ---------------------------------------------------------
+# Local stand-in for wbgetentities, Commons imageinfo,
+# thumb.php, original file downloads and the WDQS endpoint.
+# ---------------------------------------------------------
+DEFAULTS = {
+    "items": 500,            # rows the SPARQL endpoint will hand out
+    "latency_ms": 20,        # added to every response
+    "jitter_ms": 10,
+    "error_rate": 0.0,       # fraction of requests answered with 500
+    "rate_429": 0.0,         # fraction answered with 429
+    "forbidden_rate": 0.0,   # fraction of downloads answered with 403
+    "no_image_rate": 0.05,   # fraction of entities without P18
+    "payload_kb": 256,       # size of each image body
+    "image_px": 3000,        # reported width/height (>1500 picks thumb.php)
+    "seed": 1,
+}
+
+LIMIT_RE = re.compile(r"LIMIT\s+(\d+)")
+OFFSET_RE = re.compile(r"OFFSET\s+(\d+)")
+
+
+class FakeWiki:
+    def __init__(self, **config):
+        self.config = dict(DEFAULTS, **config)
+        self.rng = random.Random(self.config["seed"])
+        self.rng_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.bytes_sent = 0
+        self.requests = {}
+        self.server = None
+        self.thread = None
+        self._payload = self._make_payload(self.config["payload_kb"] * 1024)
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def start(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(_Handler):
+            wiki = fake
+
+        self.server = _QuietServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True
+        )
+        self.thread.start()
+        return self.base_url
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def urls(self):
+        base = self.base_url
+        return {
+            "WIKIDATA_API": base + "/w/api.php",
+            "COMMONS_API": base + "/w/api.php",
+            "COMMONS_THUMB": base + "/w/thumb.php",
+            "SPARQL_URL": base + "/sparql",
+        }
+
+    # -------------------------
+    # Synthetic data
+    # -------------------------
+    @staticmethod
+    def _make_payload(size):
+        # Valid JPEG framing so integrity checks accept it
+        body = bytes(range(256)) * (max(size - 4, 0) // 256 + 1)
+        return b"\xff\xd8" + body[:max(size - 4, 0)] + b"\xff\xd9"
+
+    def year_of(self, n):
+        return 1880 + (n * 7919) % 145
+
+    def title_of(self, qid):
+        return f"Synthetic portrait {qid}.jpg"
+
+    def has_image(self, qid):
+        h = int(hashlib.md5(qid.encode()).hexdigest()[:8], 16)
+        return (h % 10000) / 10000 >= self.config["no_image_rate"]
+
+    def roll(self, rate):
+        if rate <= 0:
+            return False
+        with self.rng_lock:
+            return self.rng.random() < rate
+
+    def delay(self):
+        base = self.config["latency_ms"]
+        jitter = self.config["jitter_ms"]
+        with self.rng_lock:
+            ms = max(base + self.rng.uniform(-jitter, jitter), 0)
+        time.sleep(ms / 1000.0)
+
+    def count(self, endpoint, nbytes):
+        with self.stats_lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.bytes_sent += nbytes
+
+    # -------------------------
+    # Endpoints
+    # -------------------------
+    def sparql(self, params):
+        query = params.get("query", [""])[0]
+        m = LIMIT_RE.search(query)
+        limit = int(m.group(1)) if m else 60
+        m = OFFSET_RE.search(query)
+        offset = int(m.group(1)) if m else 0
+        end = min(offset + limit, self.config["items"])
+
+        bindings = []
+        for n in range(offset, end):
+            qid = f"Q{100000 + n}"
+            bindings.append({
+                "item": {"value": f"http://www.wikidata.org/entity/{qid}"},
+                "itemLabel": {"value": f"Portrait {n}"},
+                "image": {"value": self.title_of(qid)},
+                "year": {"value": str(self.year_of(n))},
+            })
+        return {"results": {"bindings": bindings}}
+
+    def wbgetentities(self, params):
+        qid = params.get("ids", [""])[0]
+        claims = {}
+        if self.has_image(qid):
+            claims["P18"] = [{
+                "mainsnak": {"datavalue": {"value": self.title_of(qid)}}
+            }]
+        return {"entities": {qid: {"id": qid, "claims": claims}}}
+
+    def imageinfo(self, params):
+        title = params.get("titles", [""])[0]
+        name = title[len("File:"):] if title.startswith("File:") else title
+        px = self.config["image_px"]
+        return {"query": {"pages": {"1": {
+            "title": title,
+            "imageinfo": [{
+                "url": f"{self.base_url}/files/{quote(name)}",
+                "size": len(self._payload),
+                "sha1": hashlib.sha1(self._payload).hexdigest(),
+                "width": px,
+                "height": px,
+                "mime": "image/jpeg",
+            }],
+        }}}}
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients drop connections mid-response on purpose (stops, 403s)
+        pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    wiki = None
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without this a
+    # keep-alive client waits out the peer's delayed ACK on each one
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, endpoint, status, body, ctype, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.wiki.count(endpoint, len(body))
+
+    def _json(self, endpoint, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self._send(endpoint, 200, body, "application/json")
+
+    def do_GET(self):
+        wiki = self.wiki
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == "/sparql":
+            endpoint = "sparql"
+        elif url.path == "/w/api.php":
+            endpoint = params.get("action", ["?"])[0]
+        elif url.path == "/w/thumb.php":
+            endpoint = "thumb"
+        elif url.path.startswith("/files/"):
+            endpoint = "file"
+        else:
+            self._send("unknown", 404, b"not found", "text/plain")
+            return
+
+        wiki.delay()
+
+        if wiki.roll(wiki.config["rate_429"]):
+            self._send(endpoint, 429, b"slow down", "text/plain",
+                       {"Retry-After": "1"})
+            return
+        if wiki.roll(wiki.config["error_rate"]):
+            self._send(endpoint, 500, b"server error", "text/plain")
+            return
+
+        if endpoint == "sparql":
+            self._json(endpoint, wiki.sparql(params))
+        elif endpoint == "wbgetentities":
+            self._json(endpoint, wiki.wbgetentities(params))
+        elif endpoint == "query":
+            self._json(endpoint, wiki.imageinfo(params))
+        else:
+            if wiki.roll(wiki.config["forbidden_rate"]):
+                self._send(endpoint, 403, b"forbidden", "text/plain")
+                return
+            self._send(endpoint, 200, wiki._payload, "image/jpeg")
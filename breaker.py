@@ -0,0 +1,218 @@
+import time
+import socket
+import random
+import threading
+
+import requests
+
+import metrics
+
+# ---------------------------------------------------------
+# Request retry policy and per-host circuit breakers
+# ---------------------------------------------------------
+# Every failed request is put in a class, and each class has its own
+# retry budget. Failures that say the host is in trouble (everything
+# except 403) also count towards that host's breaker. After
+# TRIP_AFTER of them in a row the breaker opens, and requests to the
+# host fail at once until the cooldown ends. Then a single probe
+# request is let through. If it succeeds the breaker closes; if not,
+# it reopens with a longer cooldown.
+
+# class: (retries, first delay, max delay) in seconds
+RETRY_POLICY = {
+    "dns": (3, 2, 10),
+    "timeout": (2, 2, 10),
+    "connection": (3, 1, 10),
+    "5xx": (3, 2, 30),
+    "429": (4, 5, 60),      # the server's Retry-After wins if it sent one
+    "403": (0, 0, 0),       # Commons won't change its mind
+}
+
+TRIP_AFTER = 5                  # consecutive host failures
+COOLDOWN = 30                   # first open period, seconds
+MAX_COOLDOWN = 10 * 60          # doubles per re-trip up to this
+PROBE_WAIT = 1                  # others' wait while a probe is out
+PROBE_TIMEOUT = 60              # a probe never reported back is replaced
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+_lock = threading.Lock()
+_hosts = {}
+
+
+class HostUnavailable(Exception):
+    """The host's breaker is open; the request was never sent."""
+
+
+# ---------------------------------------------------------
+# Failure classes
+# ---------------------------------------------------------
+def _causes(exc):
+    """exc and every error it wraps (requests and urllib3 nest them)."""
+    seen = set()
+    stack = [exc]
+    while stack:
+        e = stack.pop()
+        if e is None or id(e) in seen:
+            continue
+        seen.add(id(e))
+        yield e
+        stack += [e.__cause__, e.__context__]
+        reason = getattr(e, "reason", None)
+        if isinstance(reason, BaseException):
+            stack.append(reason)
+        stack += [a for a in e.args if isinstance(a, BaseException)]
+
+
+def _is_dns_error(exc):
+    return any(
+        isinstance(e, socket.gaierror)
+        or type(e).__name__ == "NameResolutionError"
+        for e in _causes(exc)
+    )
+
+
+def classify(exc=None, status=None):
+    """Failure class of an exception or HTTP status; None if it's fine."""
+    if exc is not None:
+        if _is_dns_error(exc):
+            return "dns"
+        if isinstance(exc, requests.Timeout):
+            return "timeout"
+        return "connection"
+    if status == 429:
+        return "429"
+    if status == 403:
+        return "403"
+    if status is not None and status >= 500:
+        return "5xx"
+    return None
+
+
+def retry_delay(failure, attempt, retry_after=None):
+    """Seconds before retry number `attempt` (1-based), or None if
+    the class's budget is spent."""
+    retries, first, cap = RETRY_POLICY.get(failure, (0, 0, 0))
+    if attempt > retries:
+        return None
+    if retry_after is not None:
+        return min(retry_after, cap)
+    delay = min(first * 2 ** (attempt - 1), cap)
+    return delay * random.uniform(0.9, 1.1)
+
+
+def retry_after_seconds(response):
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------
+# Breakers
+# ---------------------------------------------------------
+def _breaker(host):
+    b = _hosts.get(host)
+    if b is None:
+        b = _hosts[host] = {
+            "state": CLOSED, "failures": 0, "trips": 0,
+            "opened_at": 0.0, "cooldown": COOLDOWN,
+            "probing": False, "probe_at": 0.0, "last_failure": None,
+        }
+    return b
+
+
+def _set_state(host, b, state):
+    b["state"] = state
+    metrics.set_gauge("breaker_state", STATE_VALUES[state], {"host": host})
+
+
+def _refresh(host, b, now):
+    if b["state"] == OPEN and now - b["opened_at"] >= b["cooldown"]:
+        _set_state(host, b, HALF_OPEN)
+        b["probing"] = False
+
+
+def allow(host):
+    """May a request go to `host` now? In half-open state only the
+    first caller (the probe) gets True."""
+    with _lock:
+        b = _breaker(host)
+        now = time.time()
+        _refresh(host, b, now)
+        if b["state"] == CLOSED:
+            return True
+        if b["state"] == HALF_OPEN and (
+            not b["probing"] or now - b["probe_at"] > PROBE_TIMEOUT
+        ):
+            b["probing"] = True
+            b["probe_at"] = now
+            return True
+        metrics.inc("breaker_rejected_total", labels={"host": host})
+        return False
+
+
+def wait_time(host):
+    """Seconds until `host` will take requests again (0 if it will now)."""
+    with _lock:
+        b = _hosts.get(host)
+        if b is None:
+            return 0
+        now = time.time()
+        _refresh(host, b, now)
+        if b["state"] == OPEN:
+            return b["opened_at"] + b["cooldown"] - now
+        if b["state"] == HALF_OPEN and b["probing"]:
+            return PROBE_WAIT
+        return 0
+
+
+def record(host, failure):
+    """Report a request outcome (failure class or None).
+
+    Returns True if this outcome tripped the breaker open.
+    """
+    with _lock:
+        b = _breaker(host)
+        if failure is None or failure == "403":
+            # A 403 is about the file, not the host
+            if b["state"] != CLOSED:
+                b["cooldown"] = COOLDOWN
+                _set_state(host, b, CLOSED)
+            b["failures"] = 0
+            b["probing"] = False
+            return False
+
+        b["failures"] += 1
+        b["last_failure"] = failure
+        if b["state"] == HALF_OPEN:
+            # The probe failed: back off harder
+            b["cooldown"] = min(b["cooldown"] * 2, MAX_COOLDOWN)
+        elif b["state"] == OPEN or b["failures"] < TRIP_AFTER:
+            return False
+
+        b["trips"] += 1
+        b["opened_at"] = time.time()
+        b["probing"] = False
+        _set_state(host, b, OPEN)
+    metrics.inc("breaker_trips_total", labels={"host": host})
+    return True
+
+
+def snapshot():
+    """{host: {state, failures, trips, last_failure, retry_in}}"""
+    with _lock:
+        now = time.time()
+        out = {}
+        for host, b in _hosts.items():
+            _refresh(host, b, now)
+            out[host] = {
+                "state": b["state"],
+                "failures": b["failures"],
+                "trips": b["trips"],
+                "last_failure": b["last_failure"],
+                "retry_in": round(max(0, b["opened_at"] + b["cooldown"] - now))
+                if b["state"] == OPEN else 0,
+            }
+        return out
@@ -17,7 +17,7 @@ android.permissions = INTERNET,FOREGROUND_SERVICE
 android.enable_foreground_service = 1
 
 # Service definition (single-line format avoids parser bugs)
-services = artcrawler:artcrawler.service:main
+services = Artcrawler:artcrawler/service.py:foreground
 
 # Use the GitHub Actions SDK/NDK instead of Buildozer auto-download
 use_android_sdk = True
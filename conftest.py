@@ -0,0 +1,2 @@
+# test_db.py is a manual script for the on-device art.db, not a test
+collect_ignore = ["test_db.py"]
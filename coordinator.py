@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import sqlite3
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scheduler
+from db import get_db, init_db
+
+# ---------------------------------------------------------
+# Coordinator: share one items queue between devices
+# ---------------------------------------------------------
+# Runs next to the master art.db. Nodes (remote.py) lease batches
+# of QIDs over HTTP, crawl them from their own local art.db and
+# report the resulting rows back in bulk.
+#
+#   POST /lease   {"node", "count"}              -> {"items": [...], "ttl"}
+#   POST /report  {"node", "rows": [...], "renew": [qid, ...]}
+#   GET  /status
+#
+# Leased rows are done = 2 (scheduler.CLAIMED) until reported or
+# until the lease runs out, when the reaper puts them back.
+#
+# Without a token anyone who can reach the port can lease and report
+# items, so the coordinator stays on loopback unless one is set.
+TOKEN = os.environ.get("ARTCRAWLER_COORDINATOR_TOKEN")
+HOST = "0.0.0.0" if TOKEN else "127.0.0.1"
+PORT = 8765
+
+LEASE_TTL = 2 * 60 * 60
+LEASE_GRACE = 7 * 24 * 60 * 60  # how long a late report is still matched
+MAX_BATCH = 1000
+REAP_INTERVAL = 60
+
+# Row layout shared with remote.py
+LEASE_COLUMNS = ("qid", "year", "century", "bucket", "priority",
+                 "wifi_fail_count", "last_fail_reason")
+REPORT_COLUMNS = ("qid", "done", "wifi_retry", "wifi_fail_count",
+                  "last_fail_reason", "next_attempt_at")
+
+_write_lock = threading.Lock()
+_server = None
+
+
+# ---------------------------------------------------------
+# Queue operations
+# ---------------------------------------------------------
+def lease(node, count):
+    count = max(1, min(int(count), MAX_BATCH))
+    now = time.time()
+    cols = ", ".join(LEASE_COLUMNS)
+
+    with _write_lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+
+            # Same mix as claim_next(): a share of due retries, then
+            # fresh work in priority order
+            retry_share = max(1, count // scheduler.RETRY_EVERY)
+            rows = c.execute(f"""
+                SELECT {cols} FROM items
+                WHERE done = 0 AND wifi_retry = 1 AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            """, (now, retry_share)).fetchall()
+            rows += c.execute(f"""
+                SELECT {cols} FROM items
+                WHERE done = 0 AND wifi_retry = 0
+                ORDER BY priority, qid
+                LIMIT ?
+            """, (count - len(rows),)).fetchall()
+
+            qids = [(row[0],) for row in rows]
+            c.executemany(
+                f"UPDATE items SET done = {scheduler.CLAIMED} WHERE qid = ?", qids
+            )
+            c.executemany(
+                "INSERT OR REPLACE INTO leases (qid, node, expires_at) "
+                "VALUES (?, ?, ?)",
+                [(qid, node, now + LEASE_TTL) for (qid,) in qids],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    return rows
+
+
+def report(node, rows, renew=()):
+    """Apply finished rows from a node. Returns how many changed items.
+
+    A row is applied only if its item is leased to `node`, or was
+    leased to anyone and has expired (within LEASE_GRACE); late
+    reports are how offline nodes reconcile. Conflict rule: a
+    successful download wins over anything, and a row already
+    finished here is only replaced by a success.
+    """
+    now = time.time()
+    with _write_lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            c.execute(f"""
+                CREATE TEMP TABLE IF NOT EXISTS report (
+                    {", ".join(REPORT_COLUMNS)},
+                    PRIMARY KEY (qid)
+                )
+            """)
+            c.execute("DELETE FROM temp.report")
+            c.executemany(
+                f"INSERT OR REPLACE INTO temp.report VALUES "
+                f"({', '.join('?' * len(REPORT_COLUMNS))})",
+                rows,
+            )
+
+            c.execute("""
+                UPDATE items
+                SET done = r.done,
+                    wifi_retry = r.wifi_retry,
+                    wifi_fail_count = MAX(COALESCE(items.wifi_fail_count, 0),
+                                          COALESCE(r.wifi_fail_count, 0)),
+                    last_fail_reason = r.last_fail_reason,
+                    next_attempt_at = r.next_attempt_at
+                FROM temp.report AS r
+                JOIN leases AS l ON l.qid = r.qid
+                WHERE items.qid = r.qid
+                  AND (l.node = ? OR l.expires_at < ?)
+                  AND (items.done != 1
+                       OR (r.done = 1 AND r.last_fail_reason IS NULL))
+            """, (node, now))
+            applied = c.rowcount
+
+            c.execute("""
+                DELETE FROM leases
+                WHERE qid IN (SELECT qid FROM temp.report)
+                  AND (node = ? OR expires_at < ?)
+            """, (node, now))
+            c.executemany(
+                "UPDATE leases SET expires_at = ? "
+                "WHERE qid = ? AND node = ? AND reaped = 0",
+                [(now + LEASE_TTL, qid, node) for qid in renew],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    return applied
+
+
+def reap():
+    """Return expired leases to the queue."""
+    now = time.time()
+    with _write_lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("""
+                UPDATE items SET done = 0
+                WHERE done = ? AND qid IN (
+                    SELECT qid FROM leases WHERE expires_at < ? AND reaped = 0
+                )
+            """, (scheduler.CLAIMED, now))
+            reaped = c.rowcount
+            c.execute(
+                "UPDATE leases SET reaped = 1 WHERE expires_at < ? AND reaped = 0",
+                (now,),
+            )
+            c.execute("DELETE FROM leases WHERE expires_at < ?",
+                      (now - LEASE_GRACE,))
+            conn.commit()
+        finally:
+            conn.close()
+    return reaped
+
+
+def status():
+    conn = get_db()
+    try:
+        nodes = {
+            node: {"leased": n, "next_expiry": round(expiry - time.time())}
+            for node, n, expiry in conn.execute("""
+                SELECT node, COUNT(*), MIN(expires_at)
+                FROM leases WHERE reaped = 0 GROUP BY node
+            """)
+        }
+        pending, leased, done = conn.execute("""
+            SELECT COALESCE(SUM(done = 0), 0),
+                   COALESCE(SUM(done = 2), 0),
+                   COALESCE(SUM(done = 1), 0)
+            FROM items
+        """).fetchone()
+    finally:
+        conn.close()
+    return {"pending": pending, "leased": leased, "done": done, "nodes": nodes}
+
+
+# ---------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------
+def _parse_lease(req):
+    count = req.get("count", 100)
+    if isinstance(count, bool) or not isinstance(count, int):
+        raise ValueError("count must be an integer")
+    return count
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _valid_row(row):
+    """A finished row as remote.finished_rows() sends it: done and
+    wifi_retry 0/1 (never the CLAIMED state), the rest typed."""
+    if not isinstance(row, list) or len(row) != len(REPORT_COLUMNS):
+        return False
+    qid, done, wifi_retry, fail_count, reason, retry_at = row
+    return (
+        isinstance(qid, str)
+        and done in (0, 1) and _is_number(done)
+        and wifi_retry in (0, 1) and _is_number(wifi_retry)
+        and (fail_count is None or _is_number(fail_count))
+        and (reason is None or isinstance(reason, str))
+        and (retry_at is None or _is_number(retry_at))
+    )
+
+
+def _parse_report(req):
+    rows = req.get("rows", [])
+    renew = req.get("renew", [])
+    if not isinstance(rows, list) or not all(map(_valid_row, rows)):
+        raise ValueError(f"rows must be lists of {', '.join(REPORT_COLUMNS)}")
+    if not isinstance(renew, list) or not all(isinstance(q, str) for q in renew):
+        raise ValueError("renew must be a list of QIDs")
+    return rows, renew
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorised(self):
+        if TOKEN and self.headers.get("X-Artcrawler-Token") != TOKEN:
+            self._reply(403, {"error": "bad token"})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorised():
+            return
+        if self.path.startswith("/status"):
+            self._reply(200, status())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self._authorised():
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            req = json.loads(self.rfile.read(length) or b"{}")
+            node = str(req["node"])
+
+            if self.path == "/lease":
+                rows = lease(node, _parse_lease(req))
+                self._reply(200, {"items": rows, "ttl": LEASE_TTL})
+            elif self.path == "/report":
+                applied = report(node, *_parse_report(req))
+                self._reply(200, {"applied": applied})
+            else:
+                self._reply(404, {"error": "not found"})
+        except sqlite3.OperationalError as e:
+            # Locked or busy: the node will retry
+            self._reply(503, {"error": str(e)})
+        except (ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            # Malformed JSON, missing fields, values SQLite won't bind
+            self._reply(400, {"error": f"bad request: {e}"})
+
+
+def _reap_loop():
+    while True:
+        time.sleep(REAP_INTERVAL)
+        try:
+            reaped = reap()
+            if reaped:
+                print(f"Coordinator: {reaped} expired leases back in the queue")
+        except Exception as e:
+            print("Coordinator reap error:", e)
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def serve(host=HOST, port=PORT):
+    """Serve the master art.db until shutdown() (blocks).
+
+    Raises ValueError for a non-loopback host without a TOKEN.
+    """
+    global _server
+    if not TOKEN and not _is_loopback(host):
+        raise ValueError(
+            f"Refusing to listen on {host} without a token; "
+            "set ARTCRAWLER_COORDINATOR_TOKEN (or --token)"
+        )
+    init_db()
+    reap()
+    threading.Thread(target=_reap_loop, daemon=True).start()
+
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    _server.daemon_threads = True
+    print(f"Coordinator listening on http://{host}:{_server.server_address[1]}")
+    try:
+        _server.serve_forever()
+    finally:
+        _server.server_close()
+
+
+def shutdown():
+    if _server is not None:
+        _server.shutdown()
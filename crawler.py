@@ -1,49 +1,59 @@
 import os
 import time
-import socket
-import shutil
-import requests
-from urllib.parse import quote
-import requests.packages.urllib3.util.connection as urllib3_cn
-from db import get_db
-
-# ---------------------------------------------------------
-# GLOBAL STOP FLAG
+import hashlib
+import threading
+from urllib.parse import quote, urlparse
+from db import get_db, init_db, archive_counts, PRIVATE_DIR
+import scheduler
+import retries
+import failures
+import imagestore
+import metrics
+import tracing
+import snapshot
+import remote
+import governor
+import upgrades
+import breaker
+import resolver
+import net
+import device
+
+# ---------------------------------------------------------
+# GLOBAL STOP FLAG (set through request_stop())
 # ---------------------------------------------------------
 STOP_REQUESTED = False
-
-# ---------------------------------------------------------
-# Force IPv4 (fixes DNS failures on Android/Pydroid)
-# ---------------------------------------------------------
-def allowed_gai_family():
-    return socket.AF_INET
-
-urllib3_cn.allowed_gai_family = allowed_gai_family
+_stop = threading.Event()
 
 # ---------------------------------------------------------
 # Paths and constants (UPDATED FOR ANDROID 16)
 # ---------------------------------------------------------
-from android.storage import primary_external_storage_path
-
-# Shared storage root: /storage/emulated/0
-BASE_DIR = primary_external_storage_path()
+# Shared storage root: /storage/emulated/0 (or ARTCRAWLER_SHARED_DIR)
+BASE_DIR = device.shared_dir()
 
 # Public image folder (visible in Gallery)
-IMAGES_DIR = os.path.join(BASE_DIR, "Pictures", "ArtCrawler")
+IMAGES_DIR = device.images_dir()
 os.makedirs(IMAGES_DIR, exist_ok=True)
 
-LOG_403 = os.path.join(BASE_DIR, "failed_403.log")
-LOG_METADATA = os.path.join(BASE_DIR, "failed_metadata.log")
-LOG_DOWNLOAD = os.path.join(BASE_DIR, "failed_download.log")
-LOG_QUERY = os.path.join(BASE_DIR, "failed_query.log")
-
+# Seconds between item starts at full speed, across all workers;
+# the governor stretches this when the device is warm or draining
 SLEEP_BETWEEN_ITEMS = 2
 
+# Progressive mode: save a PREVIEW_WIDTH px preview of every item
+# first, then replace it with the full-size image from the upgrades
+# queue while the governor's budget is full
+PROGRESSIVE = False
+PREVIEW_WIDTH = 500
+UPGRADE_INTERVAL = 10   # between upgrades while items are still queued
+
+# Longest idle wait; the indexer wakes the crawler sooner in-process,
+# this catches items committed by another process
+IDLE_TIMEOUT = 60
+
 WIKIDATA_API = "https://www.wikidata.org/w/api.php"
 COMMONS_API = "https://commons.wikimedia.org/w/api.php"
-
-MIN_FREE_CRITICAL = 500 * 1024 * 1024   # 500 MB
-MIN_FREE_WARN = 1_000_000_000           # 1 GB
+COMMONS_THUMB = "https://commons.wikimedia.org/w/thumb.php"
+UPLOAD_HOST = "upload.wikimedia.org"    # serves the original files
 
 stats = {
     "downloaded": 0,
@@ -52,6 +62,7 @@ stats = {
     "metadata_fail": 0,
     "download_fail": 0,
     "query_fail": 0,
+    "upgraded": 0,
 }
 
 EDGE_HEADERS = {
@@ -71,6 +82,14 @@ API_HEADERS = {
     "User-Agent": "ArtCrawler/1.0 (mobile; portrait-harvest; contact@example.com)"
 }
 
+# All crawler HTTP goes through this, so a stop can cut it
+_session = net.AbortableSession()
+
+# Failure counters above, exported as gauges
+metrics.register_collector(
+    lambda: {f"crawler_{key}": value for key, value in stats.items()}
+)
+
 # ---------------------------------------------------------
 # Helper: safe UI callback
 # ---------------------------------------------------------
@@ -81,14 +100,38 @@ def ui_log(msg, callback):
         print(msg)
 
 # ---------------------------------------------------------
-# Interruptible sleep
+# Stop and interruptible waits
 # ---------------------------------------------------------
-def sleep_interruptible(seconds):
-    for _ in range(seconds):
-        if STOP_REQUESTED:
-            return False
-        time.sleep(1)
-    return True
+def request_stop():
+    """Stop the crawler now: wakes every wait, cuts in-flight requests."""
+    global STOP_REQUESTED
+    STOP_REQUESTED = True
+    _stop.set()
+    scheduler.notify()
+    governor.interrupt()
+    _session.abort()
+
+def sleep_interruptible(seconds, reason="pause"):
+    t0 = time.perf_counter()
+    try:
+        return not _stop.wait(seconds)
+    finally:
+        metrics.observe(
+            "sleep_seconds", time.perf_counter() - t0, {"reason": reason}
+        )
+
+def wait_for_work(since):
+    """Wait for new items (or a due retry). Returns False on stop."""
+    timeout = IDLE_TIMEOUT
+    due = scheduler.next_retry_due()
+    if due is not None:
+        timeout = min(timeout, max(0, due - time.time()))
+    t0 = time.perf_counter()
+    scheduler.wait_for_work(since, timeout)
+    metrics.observe(
+        "sleep_seconds", time.perf_counter() - t0, {"reason": "idle"}
+    )
+    return not STOP_REQUESTED
 
 # ---------------------------------------------------------
 # Thumbnail builder
@@ -96,10 +139,7 @@ def sleep_interruptible(seconds):
 def build_thumbnail_url(filename, width=2500):
     try:
         safe_name = quote(filename, safe="")
-        return (
-            "https://commons.wikimedia.org/w/thumb.php"
-            f"?width={width}&f={safe_name}"
-        )
+        return f"{COMMONS_THUMB}?width={width}&f={safe_name}"
     except Exception:
         return None
 
@@ -107,20 +147,7 @@ def build_thumbnail_url(filename, width=2500):
 # Android media scanner
 # ---------------------------------------------------------
 def scan_media(path):
-    try:
-        from jnius import autoclass
-        MediaScannerConnection = autoclass(
-            "android.media.MediaScannerConnection"
-        )
-        PythonActivity = autoclass("org.kivy.android.PythonActivity")
-        MediaScannerConnection.scanFile(
-            PythonActivity.mActivity,
-            [path],
-            None,
-            None,
-        )
-    except Exception:
-        pass
+    device.scan_media(path)
 
 # ---------------------------------------------------------
 # Filesystem helpers
@@ -129,100 +156,181 @@ def ensure_dirs():
     os.makedirs(BASE_DIR, exist_ok=True)
     os.makedirs(IMAGES_DIR, exist_ok=True)
 
-def log(path, text):
-    try:
-        with open(path, "a") as f:
-            f.write(text + "\n")
-    except Exception:
-        pass
-
 # ---------------------------------------------------------
-# System checks
+# Failure recording (rows in the failures table)
 # ---------------------------------------------------------
-def get_free_space():
-    total, used, free = shutil.disk_usage("/storage/emulated/0")
-    return free
+# Failure reason of items currently in flight, keyed by QID
+item_failures = {}
 
-def get_battery_level():
-    try:
-        with open("/sys/class/power_supply/battery/capacity") as f:
-            return int(f.read().strip())
-    except Exception:
-        return 100
-
-def get_temperature():
-    try:
-        with open("/sys/class/thermal/thermal_zone0/temp") as f:
-            return int(f.read().strip()) / 1000.0
-    except Exception:
-        return 30.0
+def record_failure(qid, stage, reason, detail, counter, http_status=None):
+    # A request cut by a stop isn't a failure: the item is released
+    # and tried again as if it had never been claimed
+    if STOP_REQUESTED:
+        return
+    failures.record(qid, stage, reason, detail, http_status)
+    stats[counter] += 1
+    stats["failures"] += 1
+    item_failures[qid] = reason
 
-def safety_gate(callback):
-    free = get_free_space()
-    if free < MIN_FREE_CRITICAL:
-        ui_log("Storage <500MB. Pausing 10 minutes…", callback)
-        return sleep_interruptible(600)
+def http_status_of(exc):
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
 
-    if free < MIN_FREE_WARN:
-        ui_log("Storage <1GB. Slowing down…", callback)
-        if not sleep_interruptible(5):
-            return False
-
-    battery = get_battery_level()
-    if battery < 20:
-        ui_log("Battery <20%. Pausing 10 minutes…", callback)
-        return sleep_interruptible(600)
-
-    temp = get_temperature()
-    if temp > 45:
-        ui_log(f"Device hot ({temp:.1f}°C). Cooling 5 minutes…", callback)
-        return sleep_interruptible(300)
+# ---------------------------------------------------------
+# System checks (sensors are sampled by governor.py)
+# ---------------------------------------------------------
+@metrics.timed("safety_gate_seconds")
+def safety_gate(callback, worker=0):
+    """Wait until the budget has room for this worker.
 
-    return True
+    Returns the budget to work under, or None on stop.
+    """
+    while not STOP_REQUESTED:
+        budget = governor.current()
+        if not budget.paused and worker < budget.workers:
+            return budget
+        t0 = time.perf_counter()
+        governor.wait_change(governor.SAMPLE_INTERVAL)
+        metrics.observe(
+            "sleep_seconds", time.perf_counter() - t0,
+            {"reason": budget.reason if budget.paused else "budget"},
+        )
+    return None
 
 # ---------------------------------------------------------
 # Network helper
 # ---------------------------------------------------------
-def safe_request(url, params, headers, callback, retries=5):
-    delay = 2
-    for _ in range(retries):
-        if STOP_REQUESTED:
-            return None
+def safe_request(url, params, headers, callback, stream=False, timeout=10):
+    """GET under the retry policy and host breakers in breaker.py.
+
+    Returns the response: a success, a status the policy doesn't
+    retry (403, 404…), or the last error status once its budget is
+    spent. Returns None if network errors used up the budget or the
+    crawler is stopping. Raises breaker.HostUnavailable while the
+    host's breaker is open.
+    """
+    host = urlparse(url).hostname
+    attempt = 0
+    while not STOP_REQUESTED:
+        if not breaker.allow(host):
+            raise breaker.HostUnavailable(host)
+
+        r = error = None
+        t0 = time.perf_counter()
         try:
-            return requests.get(
-                url, params=params, headers=headers, timeout=10
-            )
+            r = _session.get(url, params=params, headers=headers,
+                             timeout=timeout, stream=stream)
+            status = r.status_code
         except Exception as e:
-            ui_log(f"Network error: {e}. Retrying in {delay}s…", callback)
-            if not sleep_interruptible(delay):
-                return None
-            delay *= 2
+            error = e
+            status = "error"
+        elapsed = time.perf_counter() - t0
+        metrics.observe("http_request_seconds", elapsed, {"host": host})
+        metrics.inc(
+            "http_requests_total", labels={"host": host, "status": status}
+        )
+        if STOP_REQUESTED:
+            if r is not None:
+                r.close()
+            return None
+
+        failure = breaker.classify(error, r.status_code if r is not None else None)
+        if breaker.record(host, failure):
+            ui_log(f"Holding requests to {host}: it keeps failing ({failure})",
+                   callback)
+        if failure is None:
+            tracing.event("http", elapsed, host=host, status=status)
+            return r
+
+        metrics.inc("http_failures_total",
+                    labels={"host": host, "class": failure})
+        attempt += 1
+        retry_after = breaker.retry_after_seconds(r) if r is not None else None
+        delay = breaker.retry_delay(failure, attempt, retry_after)
+        tracing.event("http", elapsed, host=host, status=status,
+                      failure=failure, retry_in=delay)
+        if delay is None:
+            return r
+        if r is not None:
+            r.close()
+        ui_log(f"Request failed ({failure}, {host})"
+               + (f": {error}" if error is not None else "")
+               + f". Retrying in {delay:.0f}s…", callback)
+        if not sleep_interruptible(delay, "retry"):
+            return None
     return None
 
+def api_hosts():
+    return tuple(
+        urlparse(url).hostname
+        for url in (WIKIDATA_API, COMMONS_API, COMMONS_THUMB)
+    )
+
+def breaker_hosts():
+    return api_hosts() + (UPLOAD_HOST,)
+
+def breaker_hold():
+    """Seconds until every Wikimedia host's breaker takes requests again."""
+    return max(breaker.wait_time(host) for host in breaker_hosts())
+
 # ---------------------------------------------------------
 # DB helpers
 # ---------------------------------------------------------
-def get_next_item():
-    conn = get_db()
-    c = conn.cursor()
-    c.execute(
-        "SELECT qid, year FROM items "
-        "WHERE done = 0 LIMIT 1"
-    )
-    row = c.fetchone()
-    conn.close()
-    return row
+@metrics.timed("db_claim_seconds")
+def get_next_item(metadata_only=False):
+    return scheduler.claim_next(metadata_only)
 
+def get_cached_url(qid):
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT image_url FROM items WHERE qid = ?", (qid,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+@metrics.timed("db_commit_seconds")
 def mark_done(qid):
     conn = get_db()
     c = conn.cursor()
-    c.execute("UPDATE items SET done = 1 WHERE qid = ?", (qid,))
+    c.execute("""
+        UPDATE items
+        SET done = 1,
+            wifi_retry = 0,
+            last_fail_reason = NULL,
+            next_attempt_at = NULL
+        WHERE qid = ?
+    """, (qid,))
     conn.commit()
     conn.close()
 
+def record_image(qid, size, sha1, source):
+    """Remember what was written, for verify.py to check against.
+    source: "commons" if it matched the file page, else "download"."""
+    conn = get_db()
+    try:
+        conn.execute("""
+            INSERT OR REPLACE INTO images (qid, size, sha1, source, saved_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (qid, size, sha1, source, time.time()))
+        conn.commit()
+    finally:
+        conn.close()
+
+def finish_item(qid):
+    # Soft failures go back on the retry queue, everything else is done
+    reason = item_failures.pop(qid, None)
+    if reason:
+        retries.mark_failed(qid, reason)
+    else:
+        mark_done(qid)
+    return reason
+
 # ---------------------------------------------------------
 # Metadata fetch
 # ---------------------------------------------------------
+@metrics.timed("p18_lookup_seconds")
 def get_image_title_for_qid(qid, callback):
     params = {
         "action": "wbgetentities",
@@ -233,9 +341,10 @@ def get_image_title_for_qid(qid, callback):
 
     r = safe_request(WIKIDATA_API, params, API_HEADERS, callback)
     if r is None:
-        log(LOG_QUERY, f"{qid} | QUERY ERROR | Network unreachable")
-        stats["query_fail"] += 1
-        stats["failures"] += 1
+        record_failure(
+            qid, "p18", "query", "Network unreachable",
+            "query_fail",
+        )
         return None
 
     try:
@@ -252,28 +361,31 @@ def get_image_title_for_qid(qid, callback):
         return p18[0]["mainsnak"]["datavalue"]["value"]
 
     except Exception as e:
-        log(LOG_QUERY, f"{qid} | QUERY ERROR | {e}")
-        stats["query_fail"] += 1
-        stats["failures"] += 1
+        record_failure(
+            qid, "p18", "query", str(e),
+            "query_fail",
+        )
         return None
 
 # ---------------------------------------------------------
 # Commons metadata
 # ---------------------------------------------------------
+@metrics.timed("imageinfo_seconds")
 def get_image_info(title, qid, callback):
     params = {
         "action": "query",
         "titles": "File:" + title,
         "prop": "imageinfo",
-        "iiprop": "url|size|mime|extmetadata|dimensions",
+        "iiprop": "url|size|sha1|mime|extmetadata|dimensions",
         "format": "json",
     }
 
     r = safe_request(COMMONS_API, params, API_HEADERS, callback)
     if r is None:
-        log(LOG_QUERY, f"{qid} | METADATA ERROR | Network unreachable")
-        stats["query_fail"] += 1
-        stats["failures"] += 1
+        record_failure(
+            qid, "imageinfo", "query", "Network unreachable",
+            "query_fail",
+        )
         return None
 
     try:
@@ -283,9 +395,10 @@ def get_image_info(title, qid, callback):
         for page in pages.values():
             info = page.get("imageinfo")
             if not info:
-                log(LOG_METADATA, f"{qid} | NO METADATA | {title}")
-                stats["metadata_fail"] += 1
-                stats["failures"] += 1
+                record_failure(
+                    qid, "imageinfo", "metadata", f"No metadata: {title}",
+                    "metadata_fail",
+                )
                 return None
 
             ii = info[0]
@@ -311,82 +424,165 @@ def get_image_info(title, qid, callback):
 
             full_url = ii.get("url")
             thumb_url = build_thumbnail_url(title, width=2500)
+            # Only worth it if the preview is much smaller
+            preview_url = None
+            if width > 2 * PREVIEW_WIDTH:
+                preview_url = build_thumbnail_url(title, width=PREVIEW_WIDTH)
 
             chosen_url = full_url
             if width > 1500 or height > 1500:
                 chosen_url = thumb_url or full_url
 
             if not chosen_url:
-                log(LOG_METADATA, f"{qid} | NO URL | {title}")
-                stats["metadata_fail"] += 1
-                stats["failures"] += 1
+                record_failure(
+                    qid, "imageinfo", "metadata", f"No URL: {title}",
+                    "metadata_fail",
+                )
                 return None
 
             return {
                 "url": chosen_url,
                 "orig_url": full_url,
                 "thumb_url": thumb_url,
+                "preview_url": preview_url,
+                # Of the original file only, not of any thumbnail
+                "sha1": ii.get("sha1"),
+                "size": ii.get("size"),
             }
 
-        log(LOG_METADATA, f"{qid} | NO METADATA | {title}")
-        stats["metadata_fail"] += 1
-        stats["failures"] += 1
+        record_failure(
+            qid, "imageinfo", "metadata", f"No metadata: {title}",
+            "metadata_fail",
+        )
         return None
 
     except Exception as e:
-        log(LOG_QUERY, f"{qid} | METADATA ERROR | {e}")
-        stats["query_fail"] += 1
-        stats["failures"] += 1
+        record_failure(
+            qid, "imageinfo", "query", str(e),
+            "query_fail",
+        )
         return None
 
 # ---------------------------------------------------------
 # Download
 # ---------------------------------------------------------
-def download_image(url, qid, callback):
+def download_image(url, qid, callback, replace=False, expect=None):
+    """Save url as the image for qid. replace: overwrite the file
+    already there (a preview being upgraded). expect: Commons'
+    (size, sha1) when url is the original file; a body that doesn't
+    match is thrown away as a failed download."""
+    r = None
     try:
         safe_url = quote(url, safe=":/?&=%")
         ext = os.path.splitext(url)[1].split("?")[0] or ".jpg"
-        path = os.path.join(IMAGES_DIR, f"{qid}{ext}")
 
-        if os.path.exists(path):
-            return path
+        existing = imagestore.find(qid)
+        if existing and not replace:
+            return existing
 
-        r = requests.get(
-            safe_url,
-            stream=True,
-            headers=EDGE_HEADERS,
-            timeout=20,
-        )
+        path = imagestore.path_for(qid, ext)
+
+        # With stream=True this returns once the headers are in; the
+        # response holds a pooled connection until it's closed
+        r = safe_request(safe_url, None, EDGE_HEADERS, callback,
+                         stream=True, timeout=20)
+        if r is None:
+            record_failure(
+                qid, "download", "download", "Network unreachable",
+                "download_fail",
+            )
+            return None
+        ttfb = r.elapsed.total_seconds()
+        metrics.observe("download_ttfb_seconds", ttfb)
+        tracing.event("download_ttfb", ttfb, status=r.status_code)
 
         if r.status_code == 403:
-            log(LOG_403, f"{qid} | 403 | {safe_url}")
-            stats["forbidden_403"] += 1
-            stats["failures"] += 1
+            record_failure(
+                qid, "download", "403", safe_url,
+                "forbidden_403",
+                http_status=403,
+            )
+            r.close()
             return None
 
         r.raise_for_status()
 
+    except breaker.HostUnavailable:
+        raise
     except Exception as e:
-        log(LOG_DOWNLOAD, f"{qid} | DOWNLOAD ERROR | {e}")
-        stats["download_fail"] += 1
-        stats["failures"] += 1
+        if r is not None:
+            r.close()
+        record_failure(
+            qid, "download", "download", str(e),
+            "download_fail",
+            http_status=http_status_of(e),
+        )
         return None
 
+    # Stream to a .part file so a cut-off download never looks complete
+    part_path = path + imagestore.PARTIAL_SUFFIX
+    nbytes = 0
+    digest = hashlib.sha1()
+    t0 = time.perf_counter()
+    renamed = False
     try:
-        with open(path, "wb") as f:
+        with open(part_path, "wb") as f:
             for chunk in r.iter_content(8192):
                 if STOP_REQUESTED:
-                    return None
+                    break
                 if chunk:
                     f.write(chunk)
+                    digest.update(chunk)
+                    nbytes += len(chunk)
+        if STOP_REQUESTED:
+            return None
+        sha1 = digest.hexdigest()
+        if expect and (expect[0] not in (None, nbytes)
+                       or expect[1] not in (None, sha1)):
+            record_failure(
+                qid, "download", "download",
+                f"Body doesn't match Commons ({nbytes} bytes, sha1 {sha1})",
+                "download_fail",
+            )
+            return None
+        os.replace(part_path, path)
+        renamed = True
+        if existing and existing != path:
+            # The preview had a different extension
+            os.remove(existing)
+            scan_media(existing)
     except Exception as e:
-        log(LOG_DOWNLOAD, f"{qid} | FILE WRITE ERROR | {e}")
-        stats["download_fail"] += 1
-        stats["failures"] += 1
+        record_failure(
+            qid, "write", "download", str(e),
+            "download_fail",
+        )
         return None
+    finally:
+        r.close()
+        # Whatever went wrong, don't leave the partial body behind
+        if not renamed:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+
+    imagestore.add(qid, path)
+    record_image(qid, nbytes, sha1, "commons" if expect else "download")
+
+    elapsed = time.perf_counter() - t0
+    tracing.event("write", elapsed, bytes=nbytes)
+    metrics.observe("download_body_seconds", elapsed)
+    metrics.inc("download_bytes_total", nbytes)
+    if elapsed > 0:
+        metrics.observe(
+            "download_throughput_bytes_per_second",
+            nbytes / elapsed,
+            buckets=metrics.RATE_BUCKETS,
+        )
 
     if ext.lower() in (".jpg", ".jpeg", ".png"):
-        scan_media(path)
+        with tracing.span("media_scan"):
+            scan_media(path)
 
     return path
 
@@ -412,6 +608,11 @@ def print_stats(callback):
     """)
     downloaded = c.fetchone()[0]
 
+    # Pruned items count too
+    archive = archive_counts(conn)
+    downloaded += archive["downloaded"]
+    hard_fails += archive["hard_fails"]
+
     conn.close()
 
     total_attempted = downloaded + soft_fails + hard_fails
@@ -452,89 +653,299 @@ def print_db_summary(callback):
     c.execute("SELECT SUM(wifi_fail_count) FROM items")
     wifi_attempts = c.fetchone()[0] or 0
 
+    # Archived items are finished: add them to the totals
+    archive = archive_counts(conn)
+    archived = archive["archived"]
+    total += archived
+    done += archived
+    hard_fails += archive["hard_fails"]
+    wifi_attempts += archive["fail_attempts"]
+
+    full = upgrades.counts(conn)
+
     conn.close()
 
     ui_log(
         f"DB: total={total} | done={done} | pending={pending} | "
-        f"soft={soft_fails} | hard={hard_fails} | wifi_attempts={wifi_attempts}",
+        f"soft={soft_fails} | hard={hard_fails} | wifi_attempts={wifi_attempts} | "
+        f"archived={archived} | full_res={full['done']}/{full['pending']} queued",
         callback,
     )
 
 # ---------------------------------------------------------
-# MAIN CRAWLER LOOP
+# One item: P18 -> imageinfo -> download -> commit
 # ---------------------------------------------------------
-def run_crawler(progress_callback=None):
-    global STOP_REQUESTED
-    STOP_REQUESTED = False
+def process_item(qid, year, callback, metadata_only=False):
+    """Returns the item's outcome, or None if a stop interrupted it.
+    "held": a breaker is open; the item is back in the queue.
 
-    ensure_dirs()
-    ui_log("Crawler started…", progress_callback)
+    metadata_only: look the image up but don't download it; the URL
+    is stored and the item goes back in the queue ("deferred").
+    In PROGRESSIVE mode a large image is saved as a preview and its
+    full-size URL queued in upgrades ("preview").
+    """
+    outcome = "no_image"
+    info = None
+    url = get_cached_url(qid)
 
-    item_counter = 0
+    if url is None:
+        with tracing.span("p18"):
+            title = get_image_title_for_qid(qid, callback)
+        if STOP_REQUESTED:
+            return None
 
-    while not STOP_REQUESTED:
-        if not safety_gate(progress_callback):
+        if title:
+            with tracing.span("imageinfo"):
+                info = get_image_info(title, qid, callback)
             if STOP_REQUESTED:
+                return None
+            if info:
+                url = info["url"]
+
+    if url and metadata_only:
+        scheduler.release(qid, url)
+        return "deferred"
+
+    if url:
+        preview = PROGRESSIVE and info and info["preview_url"]
+        expect = None
+        if info and not preview and url == info["orig_url"]:
+            expect = (info["size"], info["sha1"])
+        try:
+            path = download_image(preview or url, qid, callback,
+                                  expect=expect)
+        except breaker.HostUnavailable:
+            # Keep the URL: the next attempt goes straight to the
+            # download instead of repeating the lookups
+            item_failures.pop(qid, None)
+            scheduler.release(qid, url)
+            return "held"
+        if STOP_REQUESTED:
+            return None
+        if path is not None:
+            ui_log(f"Saved {path}", callback)
+            stats["downloaded"] += 1
+            outcome = "downloaded"
+            if preview:
+                if info["orig_url"] == url:
+                    upgrades.add(qid, url, info["size"], info["sha1"])
+                else:
+                    upgrades.add(qid, url)
+                outcome = "preview"
+
+    with tracing.span("commit"):
+        reason = finish_item(qid)
+    return f"failed:{reason}" if reason else outcome
+
+# ---------------------------------------------------------
+# Crawl workers
+# ---------------------------------------------------------
+# Up to governor.MAX_WORKERS of these run at once; worker n only
+# takes items while the budget allows more than n workers.
+_items_done = 0
+_idle_workers = 0
+_count_lock = threading.Lock()
+
+def crawl_worker(n, callback):
+    global _items_done, _idle_workers
+
+    while not STOP_REQUESTED:
+        budget = safety_gate(callback, n)
+        if budget is None:
+            break
+
+        # Wikimedia is failing: wait for the breaker rather than
+        # burning through the queue with fail-fast items
+        hold = breaker_hold()
+        if hold > 0:
+            if not sleep_interruptible(hold, "breaker"):
                 break
             continue
 
-        item = get_next_item()
+        wait = governor.reserve(SLEEP_BETWEEN_ITEMS)
+        if wait > 0 and not sleep_interruptible(wait, "between_items"):
+            break
+
+        t0 = time.perf_counter()
+        generation = scheduler.work_generation()
+        item = get_next_item(budget.metadata_only)
         if not item:
-            ui_log("No more items. Sleeping 60s…", progress_callback)
-            if not sleep_interruptible(60):
-                break
+            if remote.COORDINATOR_URL:
+                remote.sync_soon()
+            if budget.metadata_only:
+                ui_log("Storage low and nothing left to look up. Waiting…",
+                       callback)
+            else:
+                ui_log("No more items. Waiting for new work…", callback)
+            with _count_lock:
+                _idle_workers += 1
+            try:
+                if not wait_for_work(generation):
+                    break
+            finally:
+                with _count_lock:
+                    _idle_workers -= 1
             continue
 
         qid, year = item
-        ui_log(f"Processing {qid} ({year})", progress_callback)
+        tracing.begin(qid, claim_seconds=time.perf_counter() - t0)
+        ui_log(f"Processing {qid} ({year})", callback)
 
-        title = get_image_title_for_qid(qid, progress_callback)
-        if STOP_REQUESTED:
+        try:
+            outcome = process_item(qid, year, callback, budget.metadata_only)
+        except breaker.HostUnavailable:
+            # Not the item's fault: put it back untouched
+            item_failures.pop(qid, None)
+            scheduler.release(qid)
+            outcome = "held"
+        if outcome == "held":
+            tracing.end(outcome)
+            continue
+        if outcome is None:
+            scheduler.release(qid)
+            tracing.end("stopped")
             break
-        if not title:
-            mark_done(qid)
-            print_stats(progress_callback)
-            item_counter += 1
-            if item_counter % 20 == 0:
-                print_db_summary(progress_callback)
-            sleep_interruptible(SLEEP_BETWEEN_ITEMS)
+        tracing.end(outcome)
+
+        print_stats(callback)
+        with _count_lock:
+            _items_done += 1
+            summary_due = _items_done % 20 == 0
+        if summary_due:
+            print_db_summary(callback)
+
+# ---------------------------------------------------------
+# Full-resolution upgrades (PROGRESSIVE mode)
+# ---------------------------------------------------------
+def upgrade_worker(callback):
+    """Replace previews with full-size images, one at a time.
+
+    Runs only on a full budget (no heat, battery or storage
+    pressure). While items are still queued it takes one upgrade per
+    UPGRADE_INTERVAL; once the crawl workers go idle it speeds up to
+    the normal item pace.
+    """
+    while not STOP_REQUESTED:
+        budget = governor.current()
+        if (budget.paused or budget.metadata_only or budget.factor < 1.0
+                or breaker_hold() > 0):
+            governor.wait_change(governor.SAMPLE_INTERVAL)
             continue
 
-        info = get_image_info(title, qid, progress_callback)
-        if STOP_REQUESTED:
+        if _idle_workers:
+            wait = governor.reserve(SLEEP_BETWEEN_ITEMS)
+        else:
+            wait = UPGRADE_INTERVAL
+        if wait > 0 and not sleep_interruptible(wait, "upgrade"):
             break
-        if not info:
-            mark_done(qid)
-            print_stats(progress_callback)
-            item_counter += 1
-            if item_counter % 20 == 0:
-                print_db_summary(progress_callback)
-            sleep_interruptible(SLEEP_BETWEEN_ITEMS)
+
+        row = upgrades.claim_next()
+        if not row:
+            if not sleep_interruptible(IDLE_TIMEOUT, "idle"):
+                break
             continue
 
-        path = download_image(info["url"], qid, progress_callback)
+        qid, url, size, sha1 = row
+        expect = (size, sha1) if sha1 else None
+        tracing.begin(qid)
+        try:
+            path = download_image(url, qid, callback, replace=True,
+                                  expect=expect)
+        except breaker.HostUnavailable:
+            item_failures.pop(qid, None)
+            upgrades.release(qid)
+            tracing.end("held")
+            continue
         if STOP_REQUESTED:
+            upgrades.release(qid)
+            tracing.end("stopped")
             break
-        if path is None:
-            mark_done(qid)
-            print_stats(progress_callback)
-            item_counter += 1
-            if item_counter % 20 == 0:
-                print_db_summary(progress_callback)
-            sleep_interruptible(SLEEP_BETWEEN_ITEMS)
-            continue
 
-        ui_log(f"Saved {path}", progress_callback)
-        stats["downloaded"] += 1
-        mark_done(qid)
+        reason = item_failures.pop(qid, None)
+        if path is not None:
+            upgrades.mark_done(qid)
+            stats["upgraded"] += 1
+            ui_log(f"Saved {path} (full resolution)", callback)
+            tracing.end("upgraded")
+        else:
+            upgrades.mark_failed(qid, reason or "download")
+            tracing.end(f"failed:{reason}")
+
+# ---------------------------------------------------------
+# MAIN CRAWLER LOOP
+# ---------------------------------------------------------
+def write_pid():
+    with open(device.crawler_pid_path(), "w") as f:
+        f.write(str(os.getpid()))
+
+
+def remove_pid():
+    if device.crawler_pid() == os.getpid():
+        os.remove(device.crawler_pid_path())
+
 
-        print_stats(progress_callback)
-        item_counter += 1
-        if item_counter % 20 == 0:
-            print_db_summary(progress_callback)
+def run_crawler(progress_callback=None):
+    global STOP_REQUESTED
+    STOP_REQUESTED = False
+    _stop.clear()
 
-        sleep_interruptible(SLEEP_BETWEEN_ITEMS)
+    ensure_dirs()
+    init_db()
+    write_pid()
+    try:
+        _run_crawler(progress_callback)
+    finally:
+        remove_pid()
+
+
+def _run_crawler(progress_callback):
+    item_failures.clear()
+    indexed = imagestore.init(IMAGES_DIR)
+    ui_log(f"Image index: {indexed} files ({imagestore.LAYOUT} layout)", progress_callback)
+    metrics.start_exporters(os.path.join(PRIVATE_DIR, "metrics.json"))
+    tracing.configure(os.path.join(PRIVATE_DIR, "traces.jsonl"))
+    snapshot.start_background()
+    # IPv4 lookups, cached and refreshed ahead of expiry (resolver.py)
+    resolver.prefetch(breaker_hosts())
+    released = scheduler.release_all_claims() + upgrades.release_all_claims()
+    if released:
+        ui_log(f"Released {released} stale claims.", progress_callback)
+    if remote.COORDINATOR_URL:
+        ui_log(f"Node {remote.NODE_ID} of {remote.COORDINATOR_URL}", progress_callback)
+        remote.start(callback=progress_callback)
+    governor.start(callback=progress_callback)
+    ui_log(governor.describe(governor.current()), progress_callback)
+    ui_log("Crawler started…", progress_callback)
+
+    errors = []
 
+    def guarded(target, *args):
+        try:
+            target(*args)
+        except Exception as e:
+            # One worker failing stops the rest, as the old loop did
+            errors.append(e)
+            request_stop()
+
+    threads = [
+        threading.Thread(target=guarded,
+                         args=(crawl_worker, n, progress_callback),
+                         name=f"crawler-{n}", daemon=True)
+        for n in range(governor.MAX_WORKERS)
+    ]
+    if PROGRESSIVE:
+        threads.append(threading.Thread(
+            target=guarded, args=(upgrade_worker, progress_callback),
+            name="crawler-upgrades", daemon=True,
+        ))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    failures.flush()
+    if errors:
+        raise errors[0]
     ui_log("Crawler stopped.", progress_callback)
 
 if __name__ == "__main__":
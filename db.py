@@ -1,47 +1,104 @@
 import sqlite3
-from android.storage import app_storage_path
 import os
-import shutil
+import time
+
+import device
 
 # ---------------------------------------------------------
 # PATHS
 # ---------------------------------------------------------
 
 # New private app storage: /data/data/<package>/files
-PRIVATE_DIR = app_storage_path()
+# (ARTCRAWLER_DATA_DIR or ~/.artcrawler/data when headless)
+PRIVATE_DIR = device.private_dir()
 os.makedirs(PRIVATE_DIR, exist_ok=True)
 
 DB_PATH = os.path.join(PRIVATE_DIR, "art.db")
 
-# Old DB location (shared storage)
-OLD_DB_PATH = "/storage/emulated/0/Download/ArtCrawler/art.db"
+# Old DB location (shared storage; Android only)
+OLD_DB_PATH = device.legacy_db_path()
 
 # ---------------------------------------------------------
-# AUTO-MIGRATE OLD DB → NEW PRIVATE LOCATION
+# DB ACCESS
 # ---------------------------------------------------------
-# Pydroid3 sandbox breaks the original migration logic.
-# This version ALWAYS copies the old DB if it exists.
-try:
-    if os.path.exists(OLD_DB_PATH):
-        shutil.copy2(OLD_DB_PATH, DB_PATH)
-except Exception as e:
-    print("DB migration error:", e)
+def get_db():
+    return sqlite3.connect(DB_PATH)
 
 
 # ---------------------------------------------------------
-# DB ACCESS
+# ONE-TIME MIGRATION: OLD SHARED DB → PRIVATE LOCATION
 # ---------------------------------------------------------
-def get_db():
-    return sqlite3.connect(DB_PATH)
+# PRAGMA user_version >= 1 records that the check has run, so the
+# old DB is copied at most once and never over newer progress.
+LEGACY_CHECKED_VERSION = 1
+
+
+def migrate_legacy_db():
+    conn = get_db()
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= LEGACY_CHECKED_VERSION:
+            return False
+
+        copied = False
+        if OLD_DB_PATH and os.path.exists(OLD_DB_PATH):
+            has_items = conn.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = 'items'"
+            ).fetchone() and conn.execute(
+                "SELECT 1 FROM items LIMIT 1"
+            ).fetchone()
+
+            if has_items:
+                print("DB migration skipped: private DB already has "
+                      f"progress; {OLD_DB_PATH} left untouched "
+                      f"(combine them with: python merge_db.py {OLD_DB_PATH})")
+            else:
+                # Online backup API: consistent copy, no torn pages
+                src = sqlite3.connect(f"file:{OLD_DB_PATH}?mode=ro", uri=True)
+                try:
+                    src.backup(conn, pages=1024)
+                finally:
+                    src.close()
+                copied = True
+                print("DB migrated from", OLD_DB_PATH)
+
+        conn.execute(f"PRAGMA user_version = {LEGACY_CHECKED_VERSION}")
+        conn.commit()
+        return copied
+    except Exception as e:
+        print("DB migration error:", e)
+        return False
+    finally:
+        conn.close()
+
+
+# ---------------------------------------------------------
+# SCHEMA MIGRATION HELPERS
+# ---------------------------------------------------------
+def _add_column(c, table, column, decl):
+    c.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in c.fetchall()}:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
 
 
 # ---------------------------------------------------------
 # MAIN INITIALIZATION
 # ---------------------------------------------------------
 def init_db():
+    migrate_legacy_db()
+
     conn = get_db()
     c = conn.cursor()
 
+    # Lets prune.py give pages back with incremental_vacuum.
+    # Only takes effect on a brand new database file.
+    c.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    # WAL lets snapshot.py hold a read transaction for a whole backup
+    # while the crawler and indexer keep committing. Persistent.
+    c.execute("PRAGMA journal_mode = WAL")
+
     # Main items table
     c.execute("""
         CREATE TABLE IF NOT EXISTS items (
@@ -71,6 +128,128 @@ def init_db():
         )
     """)
 
+    # Retry state (read by recovery.py and the crawler stats)
+    _add_column(c, "items", "wifi_retry", "INTEGER DEFAULT 0")
+    _add_column(c, "items", "wifi_fail_count", "INTEGER DEFAULT 0")
+    _add_column(c, "items", "last_fail_reason", "TEXT")
+    _add_column(c, "items", "next_attempt_at", "REAL")
+
+    # Download URL resolved while storage was too low to fetch it
+    _add_column(c, "items", "image_url", "TEXT")
+
+    # Scheduler indexes: fresh work in (priority, qid) order,
+    # soft failures in next_attempt_at order
+    c.execute("DROP INDEX IF EXISTS idx_items_claim")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_items_queue
+        ON items (done, wifi_retry, priority, qid)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_items_retry
+        ON items (done, wifi_retry, next_attempt_at)
+    """)
+    # Metadata-only claims: fresh work not yet looked up
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_items_lookup
+        ON items (priority, qid)
+        WHERE done = 0 AND wifi_retry = 0 AND image_url IS NULL
+    """)
+
+    # Completed items moved out of the hot table by prune.py.
+    # Kept so the indexer doesn't re-queue them and stats survive.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS items_archive (
+            qid TEXT PRIMARY KEY,
+            year INTEGER,
+            bucket TEXT,
+            wifi_fail_count INTEGER,
+            last_fail_reason TEXT,
+            archived_at REAL
+        ) WITHOUT ROWID
+    """)
+
+    # Failure events (replaces the failed_*.log text files)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS failures (
+            id INTEGER PRIMARY KEY,
+            qid TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            reason TEXT NOT NULL,
+            http_status INTEGER,
+            detail TEXT,
+            created_at REAL NOT NULL
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_failures_reason
+        ON failures (reason, qid)
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_failures_qid
+        ON failures (qid)
+    """)
+
+    # Coordinator side: items handed to other devices (done = 2)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS leases (
+            qid TEXT PRIMARY KEY,
+            node TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_leases_expiry
+        ON leases (expires_at)
+    """)
+    # Expired leases are kept (reaped = 1) for a while so a late report
+    # from the node that held one can still be matched to it
+    _add_column(c, "leases", "reaped", "INTEGER NOT NULL DEFAULT 0")
+
+    # Node side: items leased from a coordinator, not yet reported
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS node_leases (
+            qid TEXT PRIMARY KEY,
+            leased_at REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+    # Progressive mode: items saved as a preview, full resolution to
+    # follow (upgrades.py). state: 0 pending, 1 done, 2 claimed, 3 gave up
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS upgrades (
+            qid TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            state INTEGER NOT NULL DEFAULT 0,
+            fail_count INTEGER NOT NULL DEFAULT 0,
+            last_fail_reason TEXT,
+            next_attempt_at REAL,
+            created_at REAL NOT NULL,
+            done_at REAL
+        ) WITHOUT ROWID
+    """)
+    # Commons' size/sha1 when url is the original file (verified on download)
+    _add_column(c, "upgrades", "size", "INTEGER")
+    _add_column(c, "upgrades", "sha1", "TEXT")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_upgrades_queue
+        ON upgrades (state, next_attempt_at)
+    """)
+
+    # What each saved image should hash to (verify.py). source:
+    # "commons" matched the file page's sha1, "download" is the body
+    # as received (thumbnails have no published hash), "verify" is a
+    # baseline taken from a file that predates this table
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS images (
+            qid TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            sha1 TEXT NOT NULL,
+            source TEXT NOT NULL,
+            saved_at REAL NOT NULL,
+            verified_at REAL
+        ) WITHOUT ROWID
+    """)
+
     conn.commit()
     conn.close()
 
@@ -95,6 +274,37 @@ def set_indexer_offset(offset):
     conn.close()
 
 
+# ---------------------------------------------------------
+# ARCHIVE COUNTS (for the stats lines)
+# ---------------------------------------------------------
+# items_archive only grows when prune.py runs, so its totals are
+# cached rather than rescanned for every stats line.
+ARCHIVE_COUNTS_TTL = 60
+_archive_counts = (0.0, None)
+
+
+def archive_counts(conn):
+    """Totals of archived items: {"archived", "downloaded", "hard_fails",
+    "fail_attempts", "modern", "contemporary"}."""
+    global _archive_counts
+    at, counts = _archive_counts
+    if counts is not None and time.monotonic() - at < ARCHIVE_COUNTS_TTL:
+        return counts
+    row = conn.execute("""
+        SELECT COUNT(*),
+               COALESCE(SUM(last_fail_reason IS NULL), 0),
+               COALESCE(SUM(last_fail_reason IS NOT NULL), 0),
+               COALESCE(SUM(wifi_fail_count), 0),
+               COALESCE(SUM(bucket = 'modern'), 0),
+               COALESCE(SUM(bucket = 'contemporary'), 0)
+        FROM items_archive
+    """).fetchone()
+    counts = dict(zip(("archived", "downloaded", "hard_fails",
+                       "fail_attempts", "modern", "contemporary"), row))
+    _archive_counts = (time.monotonic(), counts)
+    return counts
+
+
 # ---------------------------------------------------------
 # NEW: PER-CLASS OFFSET SYSTEM
 # ---------------------------------------------------------
@@ -124,6 +334,18 @@ def set_class_offset(class_name, offset):
 # ---------------------------------------------------------
 # YEAR CLASSIFICATION (unchanged)
 # ---------------------------------------------------------
+# Bucket -> priority, as assigned by classify_year()
+BUCKET_PRIORITIES = {
+    "contemporary": 1,
+    "modern": 2,
+    "romantic": 3,
+    "classical": 4,
+    "renaissance": 5,
+    "medieval": 6,
+    "unknown": 99,
+}
+
+
 def classify_year(year):
     if year is None:
         return ("unknown", 99)
@@ -0,0 +1,173 @@
+import os
+import shutil
+
+# ---------------------------------------------------------
+# Platform layer: Android device or headless Linux box
+# ---------------------------------------------------------
+# Every path can be overridden from the environment, which is
+# how `python -m artcrawler` points a server run somewhere else:
+#
+#   ARTCRAWLER_HOME        base for headless defaults (~/.artcrawler)
+#   ARTCRAWLER_DATA_DIR    private dir holding art.db
+#   ARTCRAWLER_SHARED_DIR  shared storage root
+#   ARTCRAWLER_IMAGES_DIR  image library
+try:
+    from android.storage import (
+        app_storage_path,
+        primary_external_storage_path,
+    )
+    IS_ANDROID = True
+except ImportError:
+    IS_ANDROID = False
+
+HOME = os.environ.get(
+    "ARTCRAWLER_HOME", os.path.join(os.path.expanduser("~"), ".artcrawler")
+)
+
+# DB location used by the Pydroid3 builds (shared storage)
+ANDROID_LEGACY_DB = "/storage/emulated/0/Download/ArtCrawler/art.db"
+
+BATTERY_CAPACITY = "/sys/class/power_supply/battery/capacity"
+THERMAL_ZONE = "/sys/class/thermal/thermal_zone0/temp"
+
+
+# ---------------------------------------------------------
+# Paths
+# ---------------------------------------------------------
+def private_dir():
+    path = os.environ.get("ARTCRAWLER_DATA_DIR")
+    if path:
+        return path
+    if IS_ANDROID:
+        return app_storage_path()
+    return os.path.join(HOME, "data")
+
+
+def shared_dir():
+    path = os.environ.get("ARTCRAWLER_SHARED_DIR")
+    if path:
+        return path
+    if IS_ANDROID:
+        return primary_external_storage_path()
+    return HOME
+
+
+def images_dir():
+    path = os.environ.get("ARTCRAWLER_IMAGES_DIR")
+    if path:
+        return path
+    return os.path.join(shared_dir(), "Pictures", "ArtCrawler")
+
+
+def legacy_db_path():
+    return ANDROID_LEGACY_DB if IS_ANDROID else None
+
+
+def crawler_pid_path():
+    # Written by run_crawler() however it was started (app, worker or
+    # command line), so other tools can tell a crawl is in progress
+    return os.path.join(private_dir(), "crawler.pid")
+
+
+def crawler_pid():
+    """pid of the process crawling this library, or None."""
+    try:
+        with open(crawler_pid_path()) as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return pid              # alive, owned by another user
+    except OSError:
+        return None             # left behind by a crawl that died
+    return pid
+
+
+# ---------------------------------------------------------
+# Sensors (neutral readings when headless)
+# ---------------------------------------------------------
+def free_space(path=None):
+    total, used, free = shutil.disk_usage(path or shared_dir())
+    return free
+
+
+def battery_level():
+    if not IS_ANDROID:
+        return 100
+    try:
+        with open(BATTERY_CAPACITY) as f:
+            return int(f.read().strip())
+    except Exception:
+        return 100
+
+
+def temperature():
+    if not IS_ANDROID:
+        return 30.0
+    try:
+        with open(THERMAL_ZONE) as f:
+            return int(f.read().strip()) / 1000.0
+    except Exception:
+        return 30.0
+
+
+# ---------------------------------------------------------
+# Android media scanner (no-op headless)
+# ---------------------------------------------------------
+_scan_errors = set()
+
+
+def _android_context():
+    # The UI process has the activity; the worker service (where the
+    # crawler runs) has only the service, and mActivity is null there
+    from jnius import autoclass
+    activity = autoclass("org.kivy.android.PythonActivity").mActivity
+    if activity is not None:
+        return activity
+    return autoclass("org.kivy.android.PythonService").mService
+
+
+def scan_media(path):
+    if not IS_ANDROID:
+        return
+    try:
+        from jnius import autoclass
+        MediaScannerConnection = autoclass(
+            "android.media.MediaScannerConnection"
+        )
+        MediaScannerConnection.scanFile(
+            _android_context(),
+            [path],
+            None,
+            None,
+        )
+    except Exception as e:
+        # Once per kind of error, not once per image
+        msg = str(e).split("\n")[0]
+        if msg not in _scan_errors:
+            _scan_errors.add(msg)
+            print(f"Media scan failed ({msg}); new images may not show in the gallery")
+
+
+# ---------------------------------------------------------
+# Background worker (artcrawler/service.py on Android)
+# ---------------------------------------------------------
+# p4a names the class after buildozer's package.domain/name and
+# the service name in `services =`
+WORKER_SERVICE_CLASS = "org.art.artcrawler.ServiceArtcrawler"
+
+
+def start_worker_service():
+    """Start the Android foreground service. False when headless."""
+    if not IS_ANDROID:
+        return False
+    try:
+        from jnius import autoclass
+        service = autoclass(WORKER_SERVICE_CLASS)
+        PythonActivity = autoclass("org.kivy.android.PythonActivity")
+        service.start(PythonActivity.mActivity, "")
+        return True
+    except Exception:
+        return False
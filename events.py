@@ -0,0 +1,52 @@
+import time
+from collections import deque
+
+# ---------------------------------------------------------
+# Progress event bus: workers -> UI
+# ---------------------------------------------------------
+# deque.append and popleft are atomic, so producers never take a
+# lock or wait on the UI. If the UI stops draining, the oldest
+# events fall off the end instead of growing without bound.
+MAX_PENDING = 5000
+
+_queue = deque(maxlen=MAX_PENDING)
+
+
+def log(source, msg, at=None):
+    """A log line from `source` ("crawler", "indexer", ...)."""
+    _queue.append((at or time.time(), source, msg, None))
+
+
+def update(source, **fields):
+    """Field updates; only the newest value per field survives a drain."""
+    _queue.append((time.time(), source, None, fields))
+
+
+def publisher(source):
+    """A progress_callback for run_crawler/run_indexer."""
+    def callback(msg):
+        log(source, msg)
+    return callback
+
+
+def drain():
+    """Take everything pending.
+
+    Returns (lines, latest): every log line as (time, source, msg),
+    and {source: {field: value}} with repeated updates collapsed.
+    A source's last log line is also its "message" field.
+    """
+    lines = []
+    latest = {}
+    for _ in range(len(_queue)):
+        try:
+            at, source, msg, fields = _queue.popleft()
+        except IndexError:
+            break
+        current = latest.setdefault(source, {})
+        if msg is not None:
+            lines.append((at, source, msg))
+            current["message"] = msg
+        if fields:
+            current.update(fields)
+    return lines, latest
@@ -0,0 +1,64 @@
+import time
+import threading
+
+from db import get_db
+
+# ---------------------------------------------------------
+# Batched failure event writer
+# ---------------------------------------------------------
+# Failures are buffered in memory and written with one
+# executemany() per batch instead of one file append per line.
+FLUSH_EVERY = 50        # events
+FLUSH_INTERVAL = 30     # seconds
+
+_lock = threading.Lock()
+_buffer = []
+_last_flush = time.time()
+
+
+def record(qid, stage, reason, detail=None, http_status=None):
+    """Queue a failure event.
+
+    stage:  where it failed (p18, imageinfo, download, write)
+    reason: retry class (query, metadata, download, 403)
+    """
+    with _lock:
+        _buffer.append(
+            (qid, stage, reason, http_status, detail, time.time())
+        )
+        due = (
+            len(_buffer) >= FLUSH_EVERY
+            or time.time() - _last_flush >= FLUSH_INTERVAL
+        )
+    if due:
+        flush()
+
+
+def flush():
+    global _buffer, _last_flush
+
+    with _lock:
+        batch, _buffer = _buffer, []
+        _last_flush = time.time()
+
+    if not batch:
+        return 0
+
+    conn = get_db()
+    try:
+        conn.executemany("""
+            INSERT INTO failures
+                (qid, stage, reason, http_status, detail, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, batch)
+        conn.commit()
+    except Exception as e:
+        # Keep the events for the next attempt rather than losing them
+        with _lock:
+            _buffer = batch + _buffer
+        print("Failure log flush error:", e)
+        return 0
+    finally:
+        conn.close()
+
+    return len(batch)
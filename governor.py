@@ -0,0 +1,195 @@
+import time
+import threading
+from collections import namedtuple
+
+import device
+import metrics
+
+# ---------------------------------------------------------
+# Resource governor
+# ---------------------------------------------------------
+# Storage, battery and temperature are read on a background thread
+# and turned into a budget: how many crawl workers may run, how far
+# apart item starts are, whether downloads are allowed at all. The
+# budget shrinks smoothly as the device warms up or drains; only a
+# hard limit pauses the crawler outright.
+SAMPLE_INTERVAL = 15    # seconds between sensor readings
+
+MAX_WORKERS = 3
+MIN_FACTOR = 0.1        # slowest pace: 10x the base interval
+
+# Storage: metadata only below FREE_LOW, paused below FREE_HARD
+FREE_LOW = 1_000_000_000
+FREE_HARD = 500 * 1024 * 1024
+
+# Battery (%): full speed above BATTERY_LOW, paused below BATTERY_HARD
+BATTERY_LOW = 40
+BATTERY_HARD = 20
+
+# Temperature (°C): full speed below TEMP_WARM, paused above TEMP_HARD
+TEMP_WARM = 38
+TEMP_HARD = 45
+
+# A pause lifts only once a reading is this far back from the limit,
+# so a sensor hovering at the edge doesn't toggle it every sample
+RESUME_FREE = 100 * 1024 * 1024
+RESUME_BATTERY = 5
+RESUME_TEMP = 3
+
+Budget = namedtuple(
+    "Budget",
+    "workers factor metadata_only paused reason free battery temp",
+)
+
+_cond = threading.Condition()
+_budget = None
+_next_slot = 0.0
+_started = False
+
+
+# ---------------------------------------------------------
+# Budget
+# ---------------------------------------------------------
+def _scale(value, full, hard):
+    """1.0 at `full`, 0.0 at `hard`, linear in between."""
+    return max(0.0, min(1.0, (value - hard) / (full - hard)))
+
+
+def compute(free, battery, temp, previous=None):
+    """Turn sensor readings into a Budget."""
+    was_paused = previous is not None and previous.paused
+
+    # Hard limits, with hysteresis on the way out of a pause
+    free_hard = FREE_HARD + (RESUME_FREE if was_paused else 0)
+    battery_hard = BATTERY_HARD + (RESUME_BATTERY if was_paused else 0)
+    temp_hard = TEMP_HARD - (RESUME_TEMP if was_paused else 0)
+
+    if free < free_hard:
+        return Budget(0, 0.0, True, True, "storage full", free, battery, temp)
+    if battery < battery_hard:
+        return Budget(0, 0.0, False, True, "battery low", free, battery, temp)
+    if temp > temp_hard:
+        return Budget(0, 0.0, False, True, "device hot", free, battery, temp)
+
+    battery_factor = _scale(battery, BATTERY_LOW, BATTERY_HARD)
+    temp_factor = _scale(-temp, -TEMP_WARM, -TEMP_HARD)
+    factor = max(MIN_FACTOR, min(battery_factor, temp_factor))
+    workers = max(1, round(MAX_WORKERS * factor))
+
+    reasons = []
+    if factor < 1.0:
+        reasons.append("device warm" if temp_factor < battery_factor
+                       else "battery draining")
+    metadata_only = free < FREE_LOW
+    if metadata_only:
+        reasons.append("storage low, metadata only")
+    reason = ", ".join(reasons) or "full speed"
+
+    return Budget(workers, factor, metadata_only, False, reason,
+                  free, battery, temp)
+
+
+def describe(budget):
+    if budget.paused:
+        return (f"Paused: {budget.reason} (free {budget.free / 1e6:.0f} MB, "
+                f"battery {budget.battery}%, {budget.temp:.1f}°C)")
+    return (f"Budget: {budget.workers} worker(s) at {budget.factor:.0%} pace "
+            f"({budget.reason}; battery {budget.battery}%, "
+            f"{budget.temp:.1f}°C)")
+
+
+def sample():
+    """Read the sensors now and publish the new budget."""
+    global _budget
+    budget = compute(device.free_space(), device.battery_level(),
+                     device.temperature(), _budget)
+    with _cond:
+        _budget = budget
+        _cond.notify_all()
+    return budget
+
+
+def current():
+    """The cached budget; samples once if the sampler isn't running."""
+    if _budget is None:
+        sample()
+    return _budget
+
+
+def wait_change(timeout):
+    """Block until the next sample, or `timeout` seconds."""
+    with _cond:
+        _cond.wait(timeout)
+
+
+def interrupt():
+    """Wake everyone in wait_change() without a new sample."""
+    with _cond:
+        _cond.notify_all()
+
+
+def reserve(base_interval):
+    """Claim the next start slot. Returns seconds to wait for it.
+
+    Slots are `base_interval / factor` apart across all workers, so
+    the item rate falls with the budget as well as the worker count.
+    """
+    global _next_slot
+    budget = current()
+    interval = base_interval / max(budget.factor, MIN_FACTOR)
+    with _cond:
+        now = time.monotonic()
+        slot = max(now, _next_slot)
+        _next_slot = slot + interval
+    return slot - now
+
+
+# ---------------------------------------------------------
+# Background sampler
+# ---------------------------------------------------------
+def start(callback=None):
+    """Sample every SAMPLE_INTERVAL seconds (once per process).
+
+    callback(msg) hears about every change of budget level.
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+
+    def loop():
+        announced = None
+        while True:
+            try:
+                budget = sample()
+                level = (budget.workers, budget.paused, budget.metadata_only)
+                if level != announced:
+                    announced = level
+                    msg = describe(budget)
+                    if callback:
+                        callback(msg)
+                    else:
+                        print(msg)
+            except Exception as e:
+                print("Governor sample error:", e)
+            time.sleep(SAMPLE_INTERVAL)
+
+    threading.Thread(target=loop, name="governor", daemon=True).start()
+
+
+def _gauges():
+    budget = _budget
+    if budget is None:
+        return {}
+    return {
+        "governor_workers": budget.workers,
+        "governor_pace": budget.factor,
+        "governor_paused": int(budget.paused),
+        "governor_metadata_only": int(budget.metadata_only),
+        "free_space_bytes": budget.free,
+        "battery_percent": budget.battery,
+        "temperature_celsius": budget.temp,
+    }
+
+
+metrics.register_collector(_gauges)
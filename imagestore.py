@@ -0,0 +1,172 @@
+import os
+import sys
+import hashlib
+import threading
+
+# ---------------------------------------------------------
+# Image library layout
+# ---------------------------------------------------------
+# flat:    IMAGES_DIR/<qid><ext>
+# sharded: IMAGES_DIR/<2 hex chars of md5(qid)>/<qid><ext>
+#
+# The active layout is recorded in a marker file so the crawler
+# picks it up after `python imagestore.py migrate sharded`.
+# Note that gallery apps show each shard folder as its own album.
+LAYOUTS = ("flat", "sharded")
+LAYOUT_MARKER = ".artcrawler-layout"
+SHARD_CHARS = 2
+
+# Suffix for downloads in progress; never counted as present
+PARTIAL_SUFFIX = ".part"
+
+ROOT = None
+LAYOUT = "flat"
+
+# QID -> path of every image already on disk. Built with one
+# scandir pass so existence checks never stat the filesystem.
+_index = {}
+_made_dirs = set()
+_lock = threading.Lock()
+
+
+def shard_of(qid):
+    return hashlib.md5(qid.encode("ascii")).hexdigest()[:SHARD_CHARS]
+
+
+def _is_shard_name(name):
+    return len(name) == SHARD_CHARS and all(
+        ch in "0123456789abcdef" for ch in name
+    )
+
+
+def read_layout(root):
+    try:
+        with open(os.path.join(root, LAYOUT_MARKER)) as f:
+            layout = f.read().strip()
+    except OSError:
+        return "flat"
+    return layout if layout in LAYOUTS else "flat"
+
+
+def _write_layout(root, layout):
+    with open(os.path.join(root, LAYOUT_MARKER), "w") as f:
+        f.write(layout + "\n")
+
+
+# ---------------------------------------------------------
+# Index
+# ---------------------------------------------------------
+def _scan(root):
+    found = {}
+    with os.scandir(root) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if _is_shard_name(name):
+                    with os.scandir(entry.path) as shard:
+                        for f in shard:
+                            if f.name.startswith("Q") and not f.name.endswith(PARTIAL_SUFFIX):
+                                found[f.name.split(".", 1)[0]] = f.path
+                continue
+            if name.startswith("Q") and not name.endswith(PARTIAL_SUFFIX):
+                found[name.split(".", 1)[0]] = entry.path
+    return found
+
+
+def scan(root):
+    """QID -> path for every image under root, in either layout."""
+    if not os.path.isdir(root):
+        return {}
+    return _scan(root)
+
+
+def init(root):
+    """Load the layout and build the existence index for root."""
+    global ROOT, LAYOUT, _index
+
+    os.makedirs(root, exist_ok=True)
+    found = _scan(root)
+    with _lock:
+        ROOT = root
+        LAYOUT = read_layout(root)
+        _index = found
+        _made_dirs.clear()
+    return len(found)
+
+
+def find(qid):
+    return _index.get(qid)
+
+
+def add(qid, path):
+    with _lock:
+        _index[qid] = path
+
+
+def remove(qid):
+    with _lock:
+        return _index.pop(qid, None)
+
+
+def count():
+    return len(_index)
+
+
+def path_for(qid, ext):
+    if LAYOUT == "sharded":
+        folder = os.path.join(ROOT, shard_of(qid))
+        if folder not in _made_dirs:
+            os.makedirs(folder, exist_ok=True)
+            _made_dirs.add(folder)
+        return os.path.join(folder, f"{qid}{ext}")
+    return os.path.join(ROOT, f"{qid}{ext}")
+
+
+# ---------------------------------------------------------
+# Migration between layouts
+# ---------------------------------------------------------
+def migrate(root, layout):
+    """Move every image into `layout`. Safe to re-run if interrupted."""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+
+    init(root)
+    global LAYOUT
+    LAYOUT = layout
+
+    moved = 0
+    for qid, src in list(_index.items()):
+        dst = path_for(qid, os.path.splitext(src)[1])
+        if src == dst:
+            continue
+        os.replace(src, dst)
+        add(qid, dst)
+        moved += 1
+
+    _write_layout(root, layout)
+
+    if layout == "flat":
+        # Drop the now-empty shard folders
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir() and _is_shard_name(entry.name):
+                    try:
+                        os.rmdir(entry.path)
+                    except OSError:
+                        pass
+
+    return moved
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "migrate" or sys.argv[2] not in LAYOUTS:
+        print("Usage: python imagestore.py migrate flat|sharded")
+        raise SystemExit(2)
+
+    from crawler import IMAGES_DIR
+
+    moved = migrate(IMAGES_DIR, sys.argv[2])
+    print(f"Moved {moved} files; layout is now {sys.argv[2]} "
+          f"({count()} images indexed).")
@@ -1,8 +1,14 @@
-import time
-import socket
-import requests
+import os
+import threading
+from urllib.parse import urlparse
+
+import metrics
+import net
+import resolver
+import scheduler
 
 from db import (
+    PRIVATE_DIR,
     get_db,
     init_db,
     classify_year,
@@ -10,7 +16,10 @@ from db import (
     set_class_offset,
 )
 
+# Set through request_stop()
 STOP_INDEXER = False
+_stop = threading.Event()
+_session = net.AbortableSession()
 
 SPARQL_URL = "https://query.wikidata.org/sparql"
 
@@ -19,6 +28,7 @@ YEAR_MAX = 2024
 
 BATCH_LIMIT = 60
 SLEEP_BETWEEN_BATCHES = 5
+SLEEP_BETWEEN_PASSES = 5
 
 HEADERS = {
     "Accept": "application/sparql-results+json",
@@ -29,15 +39,12 @@ CLASSES = [
     ("portrait", "wd:Q134307"),
 ]
 
-# ---------------------------------------------------------
-# Force IPv4 (Android DNS stability)
-# ---------------------------------------------------------
-import requests.packages.urllib3.util.connection as urllib3_cn
-
-def allowed_gai_family():
-    return socket.AF_INET
-
-urllib3_cn.allowed_gai_family = allowed_gai_family
+def request_stop():
+    """Stop now: wakes the pauses and cuts a SPARQL query in flight."""
+    global STOP_INDEXER
+    STOP_INDEXER = True
+    _stop.set()
+    _session.abort()
 
 
 def ui_log(msg, callback):
@@ -70,6 +77,7 @@ def build_query(class_qid, offset):
 # ---------------------------------------------------------
 # SPARQL fetch with retry (Android network can be flaky)
 # ---------------------------------------------------------
+@metrics.timed("sparql_fetch_seconds")
 def fetch_items(class_qid, offset):
     query = build_query(class_qid, offset)
 
@@ -78,7 +86,7 @@ def fetch_items(class_qid, offset):
 
     for attempt in range(retries):
         try:
-            response = requests.get(
+            response = _session.get(
                 SPARQL_URL,
                 params={"query": query},
                 headers=HEADERS,
@@ -105,14 +113,15 @@ def fetch_items(class_qid, offset):
             return results
 
         except Exception as e:
-            if attempt == retries - 1:
+            if attempt == retries - 1 or STOP_INDEXER:
                 raise
-            time.sleep(delay)
+            _stop.wait(delay)
             delay *= 2  # exponential backoff
 
     return []
 
 
+@metrics.timed("db_insert_seconds")
 def insert_item(qid, year):
     bucket, priority = classify_year(year)
     century = (year // 100) + 1
@@ -120,17 +129,25 @@ def insert_item(qid, year):
     conn = get_db()
     c = conn.cursor()
     try:
+        # Skip QIDs prune.py already archived as completed
         c.execute("""
             INSERT OR IGNORE INTO items (qid, year, century, bucket, priority)
-            VALUES (?, ?, ?, ?, ?)
-        """, (qid, year, century, bucket, priority))
+            SELECT ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM items_archive WHERE qid = ?)
+        """, (qid, year, century, bucket, priority, qid))
         conn.commit()
     finally:
         conn.close()
 
 
 def run_indexer(progress_callback=None):
+    global STOP_INDEXER
+    STOP_INDEXER = False
+    _stop.clear()
+
     init_db()
+    metrics.start_exporters(os.path.join(PRIVATE_DIR, "metrics.json"))
+    resolver.prefetch([urlparse(SPARQL_URL).hostname])
 
     classes_done = {name: False for name, _ in CLASSES}
     consecutive_failures = 0
@@ -158,11 +175,13 @@ def run_indexer(progress_callback=None):
                 items = fetch_items(class_qid, offset)
                 consecutive_failures = 0
             except Exception as e:
+                if STOP_INDEXER:
+                    break
                 consecutive_failures += 1
                 wait_time = min(30 * consecutive_failures, 300)
                 ui_log(f"[ERROR] Fetch error for {class_name} at offset {offset}: {e}", progress_callback)
                 ui_log(f"[INFO] Sleeping {wait_time}s before retry…", progress_callback)
-                time.sleep(wait_time)
+                _stop.wait(wait_time)
                 continue
 
             if not items:
@@ -172,16 +191,21 @@ def run_indexer(progress_callback=None):
 
             for qid, year in items:
                 insert_item(qid, year)
+            # Idle crawlers pick the new batch up straight away
+            scheduler.notify()
 
             new_offset = offset + BATCH_LIMIT
             set_class_offset(class_name, new_offset)
             ui_log(f"[INFO] Indexed {len(items)} items for {class_name}. New offset={new_offset}", progress_callback)
 
             ui_log(f"[INFO] Sleeping {SLEEP_BETWEEN_BATCHES}s before next batch…", progress_callback)
-            time.sleep(SLEEP_BETWEEN_BATCHES)
+            if _stop.wait(SLEEP_BETWEEN_BATCHES):
+                break
 
+        if STOP_INDEXER:
+            continue
         ui_log("[INFO] Completed one full pass over classes. Short pause…", progress_callback)
-        time.sleep(5)
+        _stop.wait(SLEEP_BETWEEN_PASSES)
 
 
 if __name__ == "__main__":
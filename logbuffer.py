@@ -0,0 +1,90 @@
+import time
+from collections import namedtuple
+
+# ---------------------------------------------------------
+# Fixed-capacity ring buffer for UI log lines
+# ---------------------------------------------------------
+# Slots are preallocated and overwritten in place. Every entry gets
+# a sequence number, so views (the log screen's RecycleView) hold
+# seq ints and look entries up instead of copying them.
+CAPACITY = 5000
+
+LEVELS = ("info", "warn", "error")
+STAGES = ("crawler", "claim", "download", "network", "safety", "stats", "indexer")
+
+LogEntry = namedtuple("LogEntry", "seq at source level stage msg")
+
+
+class RingBuffer:
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self.next_seq = 0
+
+    @property
+    def first_seq(self):
+        """Oldest seq still held."""
+        return max(0, self.next_seq - self.capacity)
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def append(self, source, msg, at=None):
+        seq = self.next_seq
+        level, stage = classify(source, msg)
+        self._slots[seq % self.capacity] = LogEntry(
+            seq, at or time.time(), source, level, stage, msg
+        )
+        self.next_seq = seq + 1
+        return seq
+
+    def get(self, seq):
+        if self.first_seq <= seq < self.next_seq:
+            return self._slots[seq % self.capacity]
+        return None
+
+    def iter_from(self, seq=0, level=None, stage=None):
+        """Entries from seq onwards, optionally filtered. A generator."""
+        for n in range(max(seq, self.first_seq), self.next_seq):
+            entry = self._slots[n % self.capacity]
+            if level and entry.level != level:
+                continue
+            if stage and entry.stage != stage:
+                continue
+            yield entry
+
+
+# ---------------------------------------------------------
+# Level / stage from the messages crawler and indexer emit
+# ---------------------------------------------------------
+# ui_log() only passes text, so this reads the prefixes and phrases
+# those modules already use.
+_STAGE_PREFIXES = (
+    ("Processing ", "claim"),
+    ("Saved ", "download"),
+    ("Request failed", "network"),
+    ("Holding requests", "network"),
+    ("Storage ", "safety"),
+    ("Budget: ", "safety"),
+    ("Paused: ", "safety"),
+    ("Downloaded: ", "stats"),
+    ("DB: ", "stats"),
+)
+
+_WARN_WORDS = ("Paused", "Retrying", "Holding", "stalled", "Storage low")
+
+
+def classify(source, msg):
+    if msg.startswith("[ERROR]") or "error" in msg.lower():
+        level = "error"
+    elif any(word in msg for word in _WARN_WORDS):
+        level = "warn"
+    else:
+        level = "info"
+
+    if source != "crawler":
+        return level, source
+    for prefix, stage in _STAGE_PREFIXES:
+        if msg.startswith(prefix):
+            return level, stage
+    return level, "crawler"
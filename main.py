@@ -1,19 +1,33 @@
+import time
+_APP_START = time.perf_counter()
+
 import threading
 from kivy.app import App
 from kivy.uix.screenmanager import ScreenManager, Screen
-from kivy.properties import StringProperty
+from kivy.properties import StringProperty, NumericProperty
 from kivy.clock import Clock
+from kivy.uix.label import Label
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 
-import crawler
-import indexer
-from db import get_db, get_indexer_offset
+# crawler/indexer run in the worker process (worker.py); this
+# process only renders and sends start/stop over its socket
+from db import init_db
+import status
+import events
+import logbuffer
+import worker
 
-from android.storage import app_storage_path
-import os
+UI_FPS = 10         # event bus drain rate; the only timer on the home screen
+STATUS_HOLD = 5     # keep one-off messages up this long before the summary
 
-PRIVATE_DIR = app_storage_path()
-LOG_PATH = os.path.join(PRIVATE_DIR, "failed_download.log")
+# Crawler/indexer log lines, shared by the home and log screens
+LOG = logbuffer.RingBuffer()
 
+LEVEL_COLORS = {
+    "info": (1, 1, 1, 1),
+    "warn": (1, 0.8, 0.3, 1),
+    "error": (1, 0.4, 0.4, 1),
+}
 
 
 class HomeScreen(Screen):
@@ -23,52 +37,89 @@ class HomeScreen(Screen):
     crawler_status_text = StringProperty("Crawler: idle")
     indexer_status_text = StringProperty("Indexer: idle")
 
-    # NEW: buffer for crawler logs
-    crawler_log_buffer = []
-
-    last_offset = 0
-
-    crawler_thread = None
-    indexer_thread = None
-
     crawler_running = False
     indexer_running = False
 
+    _refresh_event = None
+    _status_hold_until = 0
+
     def on_enter(self):
-        Clock.schedule_interval(self.update_status, 1)
+        # on_enter fires on every return from the log screen
+        if self._refresh_event is None:
+            self._refresh_event = Clock.schedule_interval(self.refresh, 1 / UI_FPS)
 
     # -------------------------
     # Unified status updater
     # -------------------------
-    def update_status(self, dt):
-        self.update_db_stats()
-        self.update_running_status()
+    # Drains the worker event bus and reads the status service's
+    # latest snapshot; never touches SQLite.
+    def refresh(self, dt):
+        lines, latest = events.drain()
+        for at, source, msg in lines:
+            LOG.append(source, msg, at)
+        if lines and self.manager.current == "logs":
+            self.manager.get_screen("logs").sync()
+
+        if "message" in latest.get("crawler", {}):
+            self.crawler_status_text = latest["crawler"]["message"]
+        if "message" in latest.get("indexer", {}):
+            self.indexer_status_text = latest["indexer"]["message"]
+        if "status" in latest.get("app", {}):
+            self._set_status(latest["app"]["status"])
+        engines = latest.get("worker", {})
+        if "crawler" in engines:
+            self.crawler_running = engines["crawler"]
+        if "indexer" in engines:
+            self.indexer_running = engines["indexer"]
+
+        snap = status.latest()
+        if not snap:
+            return
+
+        if "error" in snap:
+            self.db_stats_text = f"DB error: {snap['error']}"
+        else:
+            self.db_stats_text = (
+                f"Items: {snap['total']} | Modern: {snap['modern']} | "
+                f"Contemporary: {snap['contemporary']}"
+            )
+
+        if time.time() < self._status_hold_until:
+            return
+        self.status_text = self._summary_text(snap)
+
+    def _summary_text(self, snap):
+        if "error" not in snap:
+            if self.crawler_running:
+                return self._crawler_progress_text(snap)
+            if self.indexer_running:
+                return self._indexer_progress_text(snap)
 
-    def update_running_status(self):
         parts = []
         parts.append("Crawler: RUNNING" if self.crawler_running else "Crawler: stopped")
         parts.append("Indexer: RUNNING" if self.indexer_running else "Indexer: stopped")
-        self.status_text = " | ".join(parts)
+        return " | ".join(parts)
 
     # -------------------------
-    # DB stats
+    # Worker controls
     # -------------------------
-    def update_db_stats(self):
-        try:
-            conn = get_db()
-            c = conn.cursor()
-
-            total = c.execute("SELECT COUNT(*) FROM items").fetchone()[0]
-            modern = c.execute("SELECT COUNT(*) FROM items WHERE bucket='modern'").fetchone()[0]
-            contemporary = c.execute("SELECT COUNT(*) FROM items WHERE bucket='contemporary'").fetchone()[0]
-
-            self.db_stats_text = (
-                f"Items: {total} | Modern: {modern} | Contemporary: {contemporary}"
-            )
-
-            conn.close()
-        except Exception as e:
-            self.db_stats_text = f"DB error: {e}"
+    # Spawning the worker can take a few seconds, so requests go out
+    # from a thread; results come back as events. The running flags
+    # follow the worker's own updates; if there is no worker to send
+    # them, the engine is reported stopped here.
+    def _control(self, action, engine):
+        def run():
+            try:
+                if action == "start" and not worker.spawn():
+                    events.update("app", status="Could not start the crawl worker")
+                    events.update("worker", **{engine: False})
+                    return
+                worker.request(action, engine=engine)
+            except OSError as e:
+                events.update("app", status=f"Worker error: {e}")
+                events.update("worker", **{engine: False})
+
+        threading.Thread(target=run, daemon=True).start()
 
     # -------------------------
     # Crawler controls
@@ -78,58 +129,17 @@ class HomeScreen(Screen):
             self.status_text = "Crawler already running"
             return
 
-        self.status_text = "Starting crawler..."
-        crawler.STOP_REQUESTED = False
-        self.crawler_running = True
-
-        Clock.unschedule(self.check_crawler_progress)
-        Clock.schedule_interval(self.check_crawler_progress, 10)
-
-        self.crawler_thread = threading.Thread(
-            target=self._run_crawler_thread,
-            daemon=True
-        )
-        self.crawler_thread.start()
-
-    def _run_crawler_thread(self):
-        try:
-            crawler.run_crawler(
-                progress_callback=lambda msg: Clock.schedule_once(
-                    lambda dt: self._set_crawler_status(msg)
-                )
-            )
-        except Exception as e:
-            msg = str(e).split("\n")[0]
-            Clock.schedule_once(
-                lambda dt, err=msg: self._set_status(f"CRAWLER ERROR: {err}")
-            )
-        finally:
-            self.crawler_running = False
-            Clock.unschedule(self.check_crawler_progress)
-            Clock.schedule_once(lambda dt: self._set_status("Crawler stopped"))
+        self._set_status("Starting crawler...")
+        status.refresh_soon()
+        self._control("start", "crawler")
 
     def stop_crawler(self):
         if not self.crawler_running:
             self.status_text = "Crawler not running"
             return
 
-        crawler.STOP_REQUESTED = True
-        self.status_text = "Stopping crawler..."
-        Clock.unschedule(self.check_crawler_progress)
-
-    # -------------------------
-    # NEW: Append crawler logs instead of overwriting
-    # -------------------------
-    def _set_crawler_status(self, msg):
-        # Append to buffer
-        self.crawler_log_buffer.append(msg)
-
-        # Keep last 500 lines to avoid memory bloat
-        if len(self.crawler_log_buffer) > 500:
-            self.crawler_log_buffer = self.crawler_log_buffer[-500:]
-
-        # Show latest line in UI
-        self.crawler_status_text = msg
+        self._control("stop", "crawler")
+        self._set_status("Stopping crawler...")
 
     # -------------------------
     # Indexer controls
@@ -139,127 +149,123 @@ class HomeScreen(Screen):
             self.status_text = "Indexer already running"
             return
 
-        self.status_text = "Starting indexer..."
-        indexer.STOP_INDEXER = False
-        self.indexer_running = True
-
-        self.last_offset = 0
-
-        Clock.schedule_interval(self.check_indexer_progress, 300)
-
-        self.indexer_thread = threading.Thread(
-            target=self._run_indexer_thread,
-            daemon=True
-        )
-        self.indexer_thread.start()
-
-    def _run_indexer_thread(self):
-        try:
-            indexer.run_indexer(
-                progress_callback=lambda msg: Clock.schedule_once(
-                    lambda dt: self._set_indexer_status(msg)
-                )
-            )
-        except Exception as e:
-            msg = str(e).split("\n")[0]
-            Clock.schedule_once(
-                lambda dt, err=msg: self._set_status(f"INDEXER ERROR: {err}")
-            )
-        finally:
-            self.indexer_running = False
-            Clock.unschedule(self.check_indexer_progress)
-            Clock.schedule_once(lambda dt: self._set_status("Indexer stopped"))
+        self._set_status("Starting indexer...")
+        status.refresh_soon()
+        self._control("start", "indexer")
 
     def stop_indexer(self):
         if not self.indexer_running:
             self.status_text = "Indexer not running"
             return
 
-        indexer.STOP_INDEXER = True
-        self.status_text = "Stopping indexer..."
-        Clock.unschedule(self.check_indexer_progress)
-
-    def _set_indexer_status(self, msg):
-        self.indexer_status_text = msg
+        self._control("stop", "indexer")
+        self._set_status("Stopping indexer...")
 
     # -------------------------
-    # Progress checks
+    # Progress text (from status snapshots)
     # -------------------------
-    def check_indexer_progress(self, dt):
-        try:
-            current = get_indexer_offset()
-        except Exception as e:
-            self._set_status(f"DB error: {e}")
-            return
-
-        if self.last_offset == 0:
-            self.last_offset = current
-            self._set_status(f"Indexer running… offset {current}")
-            return
-
-        if current > self.last_offset:
-            self._set_status(f"Indexer active — offset {self.last_offset} → {current}")
-        else:
-            self._set_status("Indexer stalled — no progress in last check")
-
-        self.last_offset = current
-
-    def check_crawler_progress(self, dt):
-        try:
-            conn = get_db()
-            c = conn.cursor()
-
-            c.execute("SELECT COUNT(*) FROM items")
-            total = c.fetchone()[0]
-
-            c.execute("SELECT COUNT(*) FROM items WHERE done = 1")
-            downloaded = c.fetchone()[0]
-
-            pending = total - downloaded
-
-            c.execute("""
-                SELECT qid, year, bucket
-                FROM items
-                WHERE done = 1
-                ORDER BY rowid DESC
-                LIMIT 1
-            """)
-            last = c.fetchone()
-
-            conn.close()
-
-        except Exception as e:
-            self._set_status(f"Crawler DB error: {e}")
-            return
-
+    def _indexer_progress_text(self, snap):
+        current = snap["indexer_offset"]
+        was = snap["indexer_offset_was"]
+
+        if current > was:
+            return f"Indexer active — offset {was} → {current}"
+        if snap["indexer_window"] >= status.INDEXER_STALL_CHECK:
+            return "Indexer stalled — no progress in last check"
+        return f"Indexer running… offset {current}"
+
+    def _crawler_progress_text(self, snap):
+        last = snap["last_done"]
         if last:
             qid, year, bucket = last
             last_text = f"Last: {qid} ({year}, {bucket})"
         else:
             last_text = "Last: none yet"
 
-        self._set_status(
-            f"Crawler — {downloaded}/{total} downloaded | Pending {pending} | {last_text}"
+        text = (
+            f"Crawler — {snap['downloaded']}/{snap['total']} downloaded | "
+            f"Pending {snap['pending']} | {last_text}"
         )
+        if snap.get("upgrades_pending") or snap.get("upgrades_done"):
+            text += (f" | Full-res {snap['upgrades_done']} done, "
+                     f"{snap['upgrades_pending']} queued")
+        return text
 
     # -------------------------
     # Log forwarding
     # -------------------------
     def _set_status(self, text):
         self.status_text = text
+        self._status_hold_until = time.time() + STATUS_HOLD
+
+
+class LogRow(RecycleDataViewBehavior, Label):
+    # Rows carry only a seq; the text stays in the ring buffer
+    seq = NumericProperty(-1)
+
+    def refresh_view_attrs(self, rv, index, data):
+        entry = LOG.get(data["seq"])
+        if entry:
+            stamp = time.strftime("%H:%M:%S", time.localtime(entry.at))
+            self.text = f"{stamp}  {entry.msg}"
+            self.color = LEVEL_COLORS[entry.level]
+        else:
+            self.text = ""
+        return super().refresh_view_attrs(rv, index, data)
 
 
 class LogScreen(Screen):
-    log_text = StringProperty("")
+    level_filter = StringProperty("all")
+    stage_filter = StringProperty("all")
+
+    level_choices = ["all"] + list(logbuffer.LEVELS)
+    stage_choices = ["all"] + list(logbuffer.STAGES)
+
+    _synced_seq = 0
 
     def on_enter(self):
-        self.load_logs()
+        self.reload()
+
+    def on_level_filter(self, *args):
+        self.reload()
 
-    # NEW: show crawler log buffer instead of failed_download.log
-    def load_logs(self):
-        home = self.manager.get_screen("home")
-        text = "\n".join(home.crawler_log_buffer)
-        self.log_text = text if text else "No crawler logs yet."
+    def on_stage_filter(self, *args):
+        self.reload()
+
+    def _filters(self):
+        level = None if self.level_filter == "all" else self.level_filter
+        stage = None if self.stage_filter == "all" else self.stage_filter
+        return level, stage
+
+    def reload(self):
+        if "log_view" not in self.ids:
+            return
+        level, stage = self._filters()
+        self.ids.log_view.data = [
+            {"seq": e.seq} for e in LOG.iter_from(0, level, stage)
+        ]
+        self._synced_seq = LOG.next_seq
+        self.ids.log_view.scroll_y = 0
+
+    def sync(self):
+        """Append lines logged since the last sync; drop overwritten ones."""
+        view = self.ids.log_view
+        data = view.data
+        at_bottom = view.scroll_y <= 0.001
+
+        first = LOG.first_seq
+        stale = 0
+        while stale < len(data) and data[stale]["seq"] < first:
+            stale += 1
+        if stale:
+            del data[:stale]
+
+        level, stage = self._filters()
+        data.extend({"seq": e.seq} for e in LOG.iter_from(self._synced_seq, level, stage))
+        self._synced_seq = LOG.next_seq
+
+        if at_bottom:
+            view.scroll_y = 0
 
 
 class RootManager(ScreenManager):
@@ -270,6 +276,29 @@ class ArtCrawlerApp(App):
     def build(self):
         return RootManager()
 
+    def on_start(self):
+        # on_start fires before the first frame; a 0-delay callback
+        # runs on the next tick, once that frame is on screen
+        Clock.schedule_once(self._after_first_frame, 0)
+
+    def _after_first_frame(self, dt):
+        # Logged only: metrics are exported by the worker process,
+        # and this one is measured in the UI process
+        first_frame = time.perf_counter() - _APP_START
+        print(f"Time to first frame: {first_frame * 1000:.0f} ms")
+
+        # One-time legacy migration and schema upgrade, then status
+        # snapshots, all off the UI thread
+        def init_then_status():
+            init_db()
+            status.start()
+
+        threading.Thread(target=init_then_status, daemon=True).start()
+
+        # Reattach to a worker left running by an earlier session (and
+        # to any started later); its events land on the local bus
+        worker.subscribe(worker.forward_to_bus)
+
 
 if __name__ == "__main__":
     ArtCrawlerApp().run()
@@ -0,0 +1,331 @@
+"""Combine the progress of several art.db files into one.
+
+    python merge_db.py phone.db tablet.db old-shared.db
+    python merge_db.py *.db --into merged.db --images ~/Pictures/ArtCrawler /mnt/tablet/ArtCrawler
+
+Each source is ATTACHed in turn and folded in with set-based SQL.
+Conflict rules for items:
+  - a successful download beats a permanent failure, which beats a
+    scheduled retry, which beats a pending row
+  - between two rows of the same kind, the one with more attempts wins
+  - wifi_fail_count is the maximum seen anywhere
+  - rows claimed mid-crawl (done = 2) come in as pending
+  - a resolved image_url fills in one the target doesn't have
+Indexer cursors (class_offsets, indexer_state) keep the furthest
+offset. Archived items stay archived; failure events are unioned.
+Recorded hashes (images) and full-resolution upgrades are copied for
+items the target has none for; claimed upgrades come in as pending.
+"""
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+
+import db
+import imagestore
+import upgrades
+
+ITEM_COLUMNS = ("qid", "year", "century", "bucket", "priority", "done",
+                "wifi_retry", "wifi_fail_count", "last_fail_reason",
+                "next_attempt_at", "image_url")
+
+ITEM_DEFAULTS = {"done": "0", "wifi_retry": "0", "wifi_fail_count": "0"}
+
+
+def _rank(t):
+    return f"""(CASE
+        WHEN {t}.done = 1 AND {t}.last_fail_reason IS NULL THEN 3
+        WHEN {t}.done = 1 THEN 2
+        WHEN {t}.wifi_retry = 1 THEN 1
+        ELSE 0 END)"""
+
+
+def _columns(conn, schema, table):
+    return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")}
+
+
+# ---------------------------------------------------------
+# Merge one source
+# ---------------------------------------------------------
+def merge_source(conn, path):
+    conn.execute("ATTACH DATABASE ? AS src", (f"file:{path}?mode=ro",))
+    try:
+        return _merge_attached(conn)
+    finally:
+        conn.execute("DETACH DATABASE src")
+
+
+def _merge_attached(conn):
+    stats = {}
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+
+    src_items = _columns(conn, "src", "items")
+    if src_items:
+        # Normalise the source once: missing columns get defaults,
+        # claims become pending
+        select = []
+        for col in ITEM_COLUMNS:
+            if col == "done" and col in src_items:
+                select.append("CASE WHEN done = 1 THEN 1 ELSE 0 END")
+            elif col in src_items:
+                select.append(f"COALESCE({col}, {ITEM_DEFAULTS[col]})"
+                              if col in ITEM_DEFAULTS else col)
+            else:
+                select.append(ITEM_DEFAULTS.get(col, "NULL"))
+
+        c.execute("DROP TABLE IF EXISTS temp.incoming")
+        c.execute(f"""
+            CREATE TEMP TABLE incoming (
+                {", ".join(ITEM_COLUMNS)},
+                PRIMARY KEY (qid)
+            ) WITHOUT ROWID
+        """)
+        c.execute(f"""
+            INSERT OR IGNORE INTO temp.incoming
+            SELECT {", ".join(select)} FROM src.items
+        """)
+
+        c.execute(f"""
+            UPDATE items
+            SET done = i.done,
+                wifi_retry = i.wifi_retry,
+                last_fail_reason = i.last_fail_reason,
+                next_attempt_at = i.next_attempt_at,
+                image_url = COALESCE(i.image_url, items.image_url)
+            FROM temp.incoming AS i
+            WHERE items.qid = i.qid
+              AND ({_rank("i")} > {_rank("items")}
+                   OR ({_rank("i")} = {_rank("items")}
+                       AND i.wifi_fail_count > COALESCE(items.wifi_fail_count, 0)))
+        """)
+        stats["items_updated"] = c.rowcount
+
+        c.execute("""
+            UPDATE items
+            SET wifi_fail_count = i.wifi_fail_count
+            FROM temp.incoming AS i
+            WHERE items.qid = i.qid
+              AND i.wifi_fail_count > COALESCE(items.wifi_fail_count, 0)
+        """)
+
+        # A URL looked up on the other device saves a lookup here
+        c.execute("""
+            UPDATE items
+            SET image_url = i.image_url
+            FROM temp.incoming AS i
+            WHERE items.qid = i.qid
+              AND items.done = 0
+              AND items.image_url IS NULL AND i.image_url IS NOT NULL
+        """)
+
+        # Fill metadata an older indexer didn't record
+        c.execute("""
+            UPDATE items
+            SET year = i.year, century = i.century,
+                bucket = i.bucket, priority = i.priority
+            FROM temp.incoming AS i
+            WHERE items.qid = i.qid
+              AND items.year IS NULL AND i.year IS NOT NULL
+        """)
+
+        c.execute(f"""
+            INSERT INTO items ({", ".join(ITEM_COLUMNS)})
+            SELECT {", ".join("i." + col for col in ITEM_COLUMNS)}
+            FROM temp.incoming AS i
+            WHERE NOT EXISTS (SELECT 1 FROM items WHERE qid = i.qid)
+              AND NOT EXISTS (SELECT 1 FROM items_archive WHERE qid = i.qid)
+        """)
+        stats["items_added"] = c.rowcount
+        c.execute("DROP TABLE temp.incoming")
+
+    if _columns(conn, "src", "items_archive"):
+        c.execute("""
+            INSERT OR IGNORE INTO items_archive
+                (qid, year, bucket, wifi_fail_count, last_fail_reason, archived_at)
+            SELECT qid, year, bucket, wifi_fail_count, last_fail_reason, archived_at
+            FROM src.items_archive
+        """)
+        stats["archived_added"] = c.rowcount
+        # Archived means finished on that device
+        c.execute("""
+            DELETE FROM items
+            WHERE qid IN (SELECT qid FROM src.items_archive)
+        """)
+
+    if _columns(conn, "src", "class_offsets"):
+        c.execute("""
+            INSERT INTO class_offsets (class_name, offset)
+            SELECT class_name, offset FROM src.class_offsets WHERE true
+            ON CONFLICT(class_name) DO UPDATE
+            SET offset = MAX(offset, excluded.offset)
+        """)
+
+    if _columns(conn, "src", "indexer_state"):
+        c.execute("""
+            UPDATE indexer_state
+            SET offset = MAX(offset, (
+                SELECT COALESCE(MAX(offset), 0) FROM src.indexer_state
+            ))
+            WHERE id = 1
+        """)
+
+    if _columns(conn, "src", "failures"):
+        c.execute("""
+            INSERT INTO failures (qid, stage, reason, http_status, detail, created_at)
+            SELECT f.qid, f.stage, f.reason, f.http_status, f.detail, f.created_at
+            FROM src.failures AS f
+            WHERE NOT EXISTS (
+                SELECT 1 FROM failures AS x
+                WHERE x.qid = f.qid
+                  AND x.created_at = f.created_at
+                  AND x.stage = f.stage
+            )
+        """)
+        stats["failures_added"] = c.rowcount
+
+    if _columns(conn, "src", "images"):
+        c.execute("""
+            INSERT OR IGNORE INTO images
+                (qid, size, sha1, source, saved_at, verified_at)
+            SELECT qid, size, sha1, source, saved_at, verified_at
+            FROM src.images
+        """)
+        stats["images_added"] = c.rowcount
+
+    src_upgrades = _columns(conn, "src", "upgrades")
+    if src_upgrades:
+        size, sha1 = (("size", "sha1") if "size" in src_upgrades
+                      else ("NULL", "NULL"))
+        c.execute(f"""
+            INSERT OR IGNORE INTO upgrades
+                (qid, url, state, fail_count, last_fail_reason,
+                 next_attempt_at, created_at, done_at, size, sha1)
+            SELECT qid, url,
+                   CASE WHEN state = {upgrades.CLAIMED}
+                        THEN {upgrades.PENDING} ELSE state END,
+                   fail_count, last_fail_reason,
+                   next_attempt_at, created_at, done_at, {size}, {sha1}
+            FROM src.upgrades
+        """)
+        stats["upgrades_added"] = c.rowcount
+
+    conn.commit()
+    return stats
+
+
+# ---------------------------------------------------------
+# Images from several devices
+# ---------------------------------------------------------
+def dedupe_images(conn, roots, dry_run=False):
+    """Keep one copy per QID (the largest) in roots[0].
+
+    Items with a file anywhere are then marked done in the merged DB.
+    """
+    primary = roots[0]
+    imagestore.init(primary)
+
+    copies = {}
+    for root in roots:
+        for qid, path in imagestore.scan(root).items():
+            copies.setdefault(qid, []).append(path)
+
+    kept = moved = removed = 0
+    sizes = {}
+    for qid, paths in copies.items():
+        paths.sort(key=os.path.getsize, reverse=True)
+        best = paths[0]
+        sizes[qid] = os.path.getsize(best)
+        kept += 1
+        target = imagestore.path_for(qid, os.path.splitext(best)[1])
+        if best != target:
+            moved += 1
+            if not dry_run:
+                shutil.move(best, target)
+        for extra in paths[1:]:
+            removed += 1
+            # A smaller copy sitting at `target` was just overwritten
+            if not dry_run and extra != target:
+                os.remove(extra)
+
+    if not dry_run:
+        c = conn.cursor()
+        c.execute("CREATE TEMP TABLE IF NOT EXISTS on_disk (qid TEXT PRIMARY KEY)")
+        c.execute("DELETE FROM temp.on_disk")
+        c.executemany("INSERT INTO temp.on_disk VALUES (?)", [(q,) for q in copies])
+        c.execute("""
+            UPDATE items
+            SET done = 1, wifi_retry = 0,
+                last_fail_reason = NULL, next_attempt_at = NULL
+            WHERE qid IN (SELECT qid FROM temp.on_disk)
+              AND NOT (done = 1 AND last_fail_reason IS NULL)
+        """)
+        marked = c.rowcount
+        # The copy kept may not be the one a merged hash was recorded
+        # for; verify.py takes a new baseline where the row is dropped
+        c.executemany("DELETE FROM images WHERE qid = ? AND size != ?",
+                      sizes.items())
+        conn.commit()
+    else:
+        marked = 0
+
+    return {"images": kept, "moved": moved, "duplicates_removed": removed,
+            "marked_done": marked}
+
+
+# ---------------------------------------------------------
+# CLI
+# ---------------------------------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[5:]),
+    )
+    parser.add_argument("sources", nargs="+", help="art.db files to fold in")
+    parser.add_argument("--into", default=db.DB_PATH,
+                        help="target DB, created if missing (default: this device's)")
+    parser.add_argument("--images", nargs="+", metavar="DIR",
+                        help="image libraries to dedupe; the first one keeps the files")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="with --images: report, don't move or delete")
+    args = parser.parse_args(argv)
+
+    target = os.path.abspath(args.into)
+    for path in args.sources:
+        if os.path.abspath(path) == target:
+            parser.error(f"{path} is the target")
+        if not os.path.exists(path):
+            parser.error(f"{path} not found")
+
+    # Schema for the target; never pull the legacy DB in implicitly
+    db.DB_PATH = target
+    db.OLD_DB_PATH = None
+    db.init_db()
+
+    conn = sqlite3.connect(target, uri=True)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    try:
+        for path in args.sources:
+            t0 = time.time()
+            stats = merge_source(conn, path)
+            detail = ", ".join(f"{k}={v}" for k, v in stats.items())
+            print(f"Merged {path} in {time.time() - t0:.1f}s: {detail}")
+
+        if args.images:
+            stats = dedupe_images(conn, args.images, args.dry_run)
+            print("Images: " + ", ".join(f"{k}={v}" for k, v in stats.items()))
+
+        total, done = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(done = 1), 0) FROM items"
+        ).fetchone()
+        print(f"{target}: {total} items, {done} done")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
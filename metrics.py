@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import bisect
+import threading
+import functools
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ---------------------------------------------------------
+# Settings
+# ---------------------------------------------------------
+PREFIX = "artcrawler_"
+
+# Local Prometheus-style endpoint (None disables it)
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 9464
+
+# Periodic JSON snapshot
+JSON_DUMP_INTERVAL = 60  # seconds
+
+# Latency buckets (seconds) - covers DB calls through 5 minute pauses
+TIME_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30, 60, 120, 300,
+)
+
+# Throughput buckets (bytes/second)
+RATE_BUCKETS = tuple(kb * 1024 for kb in (
+    16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384,
+))
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_collectors = []
+_started = set()
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _key(name, labels):
+    if not labels:
+        return (name, ())
+    return (name, tuple(sorted(labels.items())))
+
+
+# ---------------------------------------------------------
+# Recording
+# ---------------------------------------------------------
+def inc(name, amount=1, labels=None):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def set_gauge(name, value, labels=None):
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name, value, labels=None, buckets=TIME_BUCKETS):
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram(buckets)
+        hist.observe(value)
+
+
+@contextmanager
+def timer(name, labels=None):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - t0, labels)
+
+
+def timed(name):
+    """Decorator: record the wrapped call's duration in `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - t0)
+        return wrapper
+    return decorate
+
+
+def register_collector(func):
+    """func() -> {name: value}; sampled as gauges at export time."""
+    _collectors.append(func)
+
+
+# ---------------------------------------------------------
+# Export
+# ---------------------------------------------------------
+def _labels_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def _collected():
+    values = {}
+    for func in _collectors:
+        try:
+            values.update(func())
+        except Exception:
+            pass
+    return values
+
+
+def render_prometheus():
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        hists = {k: (h.bounds, list(h.counts), h.sum, h.count)
+                 for k, h in _histograms.items()}
+    for name, value in _collected().items():
+        gauges[(name, ())] = value
+
+    lines = []
+    typed = set()
+
+    def type_line(name, kind):
+        if name not in typed:
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            typed.add(name)
+
+    for (name, labels), value in sorted(counters.items()):
+        type_line(name, "counter")
+        lines.append(f"{PREFIX}{name}{_labels_text(labels)} {value}")
+
+    for (name, labels), value in sorted(gauges.items()):
+        type_line(name, "gauge")
+        lines.append(f"{PREFIX}{name}{_labels_text(labels)} {value}")
+
+    for (name, labels), (bounds, counts, total, count) in sorted(hists.items()):
+        type_line(name, "histogram")
+        running = 0
+        for bound, n in zip(bounds, counts):
+            running += n
+            le = _labels_text(labels, ("le", bound))
+            lines.append(f"{PREFIX}{name}_bucket{le} {running}")
+        le = _labels_text(labels, ("le", "+Inf"))
+        lines.append(f"{PREFIX}{name}_bucket{le} {count}")
+        lines.append(f"{PREFIX}{name}_sum{_labels_text(labels)} {total:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_labels_text(labels)} {count}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _quantile(bounds, counts, count, q):
+    # Upper bound of the bucket holding the q-th observation
+    if not count:
+        return None
+    target = q * count
+    running = 0
+    for bound, n in zip(bounds, counts):
+        running += n
+        if running >= target:
+            return bound
+    return float("inf")
+
+
+def snapshot():
+    def label_name(name, labels):
+        return name + _labels_text(labels)
+
+    with _lock:
+        out = {
+            "time": time.time(),
+            "counters": {label_name(*k): v for k, v in _counters.items()},
+            "gauges": {label_name(*k): v for k, v in _gauges.items()},
+            "histograms": {},
+        }
+        for key, h in _histograms.items():
+            out["histograms"][label_name(*key)] = {
+                "count": h.count,
+                "sum": round(h.sum, 6),
+                "p50": _quantile(h.bounds, h.counts, h.count, 0.50),
+                "p95": _quantile(h.bounds, h.counts, h.count, 0.95),
+                "p99": _quantile(h.bounds, h.counts, h.count, 0.99),
+            }
+    out["gauges"].update(_collected())
+    return out
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body = json.dumps(snapshot()).encode("utf-8")
+            ctype = "application/json"
+        elif self.path.startswith("/metrics"):
+            body = render_prometheus().encode("utf-8")
+            ctype = "text/plain; version=0.0.4"
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(host=HTTP_HOST, port=HTTP_PORT):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def dump_json(path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot(), f)
+    os.replace(tmp, path)
+
+
+def start_json_dump(path, interval=JSON_DUMP_INTERVAL):
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                dump_json(path)
+            except Exception:
+                pass
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def start_exporters(json_path=None):
+    """Start the HTTP endpoint and JSON dump once per process."""
+    with _lock:
+        if "exporters" in _started:
+            return
+        _started.add("exporters")
+
+    if HTTP_PORT:
+        try:
+            start_http_server()
+        except OSError as e:
+            print("Metrics endpoint unavailable:", e)
+    if json_path:
+        start_json_dump(json_path)
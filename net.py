@@ -0,0 +1,74 @@
+import socket
+import threading
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# ---------------------------------------------------------
+# Abortable HTTP sessions
+# ---------------------------------------------------------
+# A blocked socket read can't be cancelled, only cut: abort() shuts
+# down every connection the session has opened, so a request stuck
+# in recv() fails at once instead of running out its timeout.
+# Connections cut while idle are noticed and replaced by urllib3
+# the next time the pool hands them out.
+
+
+def _tracking_pool(base, track):
+    class Connection(base.ConnectionCls):
+        def connect(self):
+            super().connect()
+            track(self)
+
+    class Pool(base):
+        ConnectionCls = Connection
+
+    return Pool
+
+
+class _TrackingAdapter(HTTPAdapter):
+    def __init__(self, track, **kwargs):
+        self._track = track
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _tracking_pool(HTTPConnectionPool, self._track),
+            "https": _tracking_pool(HTTPSConnectionPool, self._track),
+        }
+
+
+class AbortableSession(requests.Session):
+    """A requests.Session whose in-flight requests abort() can cut."""
+
+    def __init__(self):
+        super().__init__()
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+        adapter = _TrackingAdapter(self._track)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def _track(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+
+    def abort(self):
+        """Shut down every open connection. Returns how many."""
+        with self._lock:
+            connections = list(self._connections)
+            self._connections.clear()
+        cut = 0
+        for conn in connections:
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+                cut += 1
+            except OSError:
+                pass
+        return cut
@@ -1,9 +1,142 @@
-from db import get_db
+import time
+import sqlite3
+import argparse
 
-conn = get_db()
-c = conn.cursor()
-c.execute("DELETE FROM items WHERE done = 1")
-conn.commit()
-conn.close()
+from db import get_db, init_db
 
-print("Pruned completed items.")
+# ---------------------------------------------------------
+# Online prune: move completed items to items_archive in
+# small transactions so the crawler and indexer keep going.
+# ---------------------------------------------------------
+BATCH_SIZE = 500
+PAUSE_BETWEEN_BATCHES = 0.2     # seconds other writers get the lock
+VACUUM_EVERY = 20               # batches
+VACUUM_PAGES = 500
+MAX_BUSY_RETRIES = 5            # locked/busy batches in a row before giving up
+
+COMPLETED = "done = 1 AND wifi_retry = 0"
+
+
+def archive_batch(conn, batch_size):
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        # Seek on idx_items_queue: no scan of the pending rows
+        c.execute(
+            f"SELECT qid FROM items WHERE {COMPLETED} LIMIT ?",
+            (batch_size,),
+        )
+        qids = [row[0] for row in c.fetchall()]
+        if not qids:
+            conn.commit()
+            return 0
+
+        marks = ",".join("?" * len(qids))
+        c.execute(f"""
+            INSERT OR REPLACE INTO items_archive
+                (qid, year, bucket, wifi_fail_count, last_fail_reason,
+                 archived_at)
+            SELECT qid, year, bucket, wifi_fail_count, last_fail_reason, ?
+            FROM items
+            WHERE qid IN ({marks})
+        """, [time.time()] + qids)
+        c.execute(f"DELETE FROM items WHERE qid IN ({marks})", qids)
+        conn.commit()
+        return len(qids)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def incremental_vacuum(conn, pages):
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if mode != 2:
+        return False
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+    conn.commit()
+    return True
+
+
+def enable_incremental_vacuum(conn):
+    # One-off conversion; this VACUUM rewrites the file and blocks
+    # other writers, so run it while the crawler is stopped.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+def prune(batch_size=BATCH_SIZE, pause=PAUSE_BETWEEN_BATCHES, limit=None):
+    conn = get_db()
+    # Fail over quickly on contention and retry after the pause
+    conn.execute("PRAGMA busy_timeout = 2000")
+
+    total = 0
+    batches = 0
+    busy = 0
+    vacuum_warned = False
+
+    try:
+        while limit is None or total < limit:
+            size = batch_size if limit is None else min(batch_size, limit - total)
+            try:
+                moved = archive_batch(conn, size)
+            except sqlite3.OperationalError as e:
+                # Only lock contention is worth waiting out
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                busy += 1
+                if busy > MAX_BUSY_RETRIES:
+                    raise
+                print(f"Batch skipped ({e}); retrying…")
+                time.sleep(pause * 5)
+                continue
+            busy = 0
+
+            if not moved:
+                break
+
+            total += moved
+            batches += 1
+
+            if batches % VACUUM_EVERY == 0:
+                if not incremental_vacuum(conn, VACUUM_PAGES) and not vacuum_warned:
+                    print("auto_vacuum is not INCREMENTAL; "
+                          "run with --enable-incremental-vacuum once.")
+                    vacuum_warned = True
+                print(f"Archived {total} items…")
+
+            time.sleep(pause)
+
+        # Hand the remaining free pages back, still in small steps
+        while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+            if not incremental_vacuum(conn, VACUUM_PAGES):
+                break
+            time.sleep(pause)
+    finally:
+        conn.close()
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive completed items")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=PAUSE_BETWEEN_BATCHES)
+    parser.add_argument("--limit", type=int, help="stop after N items")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="one-off blocking VACUUM to switch auto_vacuum mode")
+    args = parser.parse_args()
+
+    init_db()
+
+    if args.enable_incremental_vacuum:
+        conn = get_db()
+        enable_incremental_vacuum(conn)
+        conn.close()
+        print("auto_vacuum set to INCREMENTAL.")
+
+    total = prune(args.batch_size, args.pause, args.limit)
+    print(f"Pruned completed items: {total} archived.")
+
+
+if __name__ == "__main__":
+    main()
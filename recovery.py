@@ -1,58 +1,176 @@
-import sqlite3
+import os
 import re
+import time
+import argparse
 
-DB_PATH = "art.db"
+from db import get_db, init_db
+import device
 
-LOGS = {
-    "403": "failed_403.log",
-    "metadata": "failed_metadata.log",
-    "download": "failed_download.log",
-    "query": "failed_query.log",
+# Text logs written by older crawler versions
+LEGACY_LOGS = {
+    "403": ("download", "failed_403.log"),
+    "metadata": ("imageinfo", "failed_metadata.log"),
+    "download": ("download", "failed_download.log"),
+    "query": ("p18", "failed_query.log"),
 }
 
-def extract_qids(path):
-    qids = set()
-    try:
-        with open(path) as f:
+LINE_RE = re.compile(r"(Q\d+)\s*\|\s*([^|]*?)\s*\|\s*(.*)")
+
+
+# ---------------------------------------------------------
+# Legacy text logs -> failures table
+# ---------------------------------------------------------
+def import_legacy_logs(conn, logs_dir):
+    c = conn.cursor()
+    c.execute("SELECT COALESCE(MAX(id), 0) FROM failures")
+    first_new_id = c.fetchone()[0] + 1
+    imported = 0
+
+    for reason, (stage, name) in LEGACY_LOGS.items():
+        path = os.path.join(logs_dir, name)
+        if not os.path.exists(path):
+            continue
+
+        mtime = os.path.getmtime(path)
+        rows = []
+        with open(path, errors="replace") as f:
             for line in f:
-                m = re.match(r"(Q\d+)", line)
-                if m:
-                    qids.add(m.group(1))
-    except FileNotFoundError:
-        pass
-    return qids
-
-conn = sqlite3.connect(DB_PATH)
-c = conn.cursor()
-
-total_updated = 0
-
-for reason, logfile in LOGS.items():
-    qids = extract_qids(logfile)
-    print(f"{logfile}: {len(qids)} failures")
-
-    for qid in qids:
-        if reason == "403":
-            c.execute("""
-                UPDATE items
-                SET last_fail_reason = '403',
-                    done = 1,
-                    wifi_retry = 0
-                WHERE qid = ?
-            """, (qid,))
-        else:
-            c.execute("""
-                UPDATE items
-                SET last_fail_reason = ?,
-                    wifi_fail_count = wifi_fail_count + 1,
-                    wifi_retry = 1,
-                    done = 0
-                WHERE qid = ?
-            """, (reason, qid))
-
-        total_updated += 1
-
-conn.commit()
-conn.close()
-
-print(f"Updated {total_updated} items.")
+                m = LINE_RE.match(line.strip())
+                if not m:
+                    continue
+                http_status = 403 if reason == "403" else None
+                rows.append((m.group(1), stage, reason, http_status,
+                             m.group(3), mtime))
+
+        c.executemany("""
+            INSERT INTO failures
+                (qid, stage, reason, http_status, detail, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        os.replace(path, path + ".imported")
+        imported += len(rows)
+        print(f"{name}: {len(rows)} failures imported")
+
+    if not imported:
+        return 0
+
+    # Old crawlers marked every failure done; apply the retry
+    # state the text logs implied, in two set-based updates.
+    c.execute("""
+        UPDATE items
+        SET done = 1,
+            wifi_retry = 0,
+            last_fail_reason = '403',
+            next_attempt_at = NULL
+        WHERE qid IN (
+            SELECT qid FROM failures WHERE id >= ? AND reason = '403'
+        )
+    """, (first_new_id,))
+    c.execute("""
+        UPDATE items
+        SET last_fail_reason = (
+                SELECT f.reason FROM failures f
+                WHERE f.qid = items.qid AND f.id >= :first
+                ORDER BY f.id DESC LIMIT 1
+            ),
+            wifi_fail_count = wifi_fail_count + 1,
+            wifi_retry = 1,
+            next_attempt_at = :now,
+            done = 0
+        WHERE qid IN (
+            SELECT qid FROM failures
+            WHERE id >= :first AND reason != '403'
+        )
+        AND COALESCE(last_fail_reason, '') != '403'
+        AND done != 2
+    """, {"first": first_new_id, "now": time.time()})
+    conn.commit()
+    return imported
+
+
+# ---------------------------------------------------------
+# Triage
+# ---------------------------------------------------------
+def print_triage(conn):
+    c = conn.cursor()
+    c.execute("""
+        SELECT reason, stage, http_status, COUNT(*), COUNT(DISTINCT qid)
+        FROM failures
+        GROUP BY reason, stage, http_status
+        ORDER BY COUNT(*) DESC
+    """)
+    rows = c.fetchall()
+    if not rows:
+        print("No failures recorded.")
+        return
+
+    print("reason     stage      http  events    items")
+    for reason, stage, status, events, items in rows:
+        print(f"{reason:<10} {stage:<10} {status or '-':<5} "
+              f"{events:<9} {items}")
+
+    c.execute("""
+        SELECT
+            SUM(wifi_retry = 1),
+            SUM(wifi_retry = 1 AND next_attempt_at <= ?),
+            SUM(done = 1 AND wifi_retry = 0 AND last_fail_reason IS NOT NULL)
+        FROM items
+        WHERE last_fail_reason IS NOT NULL
+    """, (time.time(),))
+    soft, due, hard = (v or 0 for v in c.fetchone())
+    print(f"Retry queue: {soft} ({due} due now) | Hard fails: {hard}")
+
+
+# ---------------------------------------------------------
+# Retry: one UPDATE for the whole selection
+# ---------------------------------------------------------
+def retry_now(conn, reason=None, include_hard=False):
+    # done = 2: claimed by a running crawler or leased to a node
+    where = ["last_fail_reason IS NOT NULL", "last_fail_reason != '403'",
+             "done != 2"]
+    params = [time.time()]
+    if reason:
+        where.append("last_fail_reason = ?")
+        params.append(reason)
+    if not include_hard:
+        where.append("wifi_retry = 1")
+
+    c = conn.cursor()
+    c.execute(f"""
+        UPDATE items
+        SET done = 0,
+            wifi_retry = 1,
+            next_attempt_at = ?
+        WHERE {" AND ".join(where)}
+    """, params)
+    conn.commit()
+    return c.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Failure triage and retry")
+    parser.add_argument("--logs-dir", default=device.shared_dir(),
+                        help="where legacy failed_*.log files live")
+    parser.add_argument("--retry", action="store_true",
+                        help="make failed items due for retry now")
+    parser.add_argument("--reason", choices=["query", "metadata", "download"],
+                        help="only retry this failure class")
+    parser.add_argument("--include-hard", action="store_true",
+                        help="also retry items that ran out of attempts")
+    args = parser.parse_args()
+
+    init_db()
+    conn = get_db()
+
+    import_legacy_logs(conn, args.logs_dir)
+    print_triage(conn)
+
+    if args.retry:
+        updated = retry_now(conn, args.reason, args.include_hard)
+        print(f"Queued {updated} items for retry.")
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
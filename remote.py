@@ -0,0 +1,184 @@
+import os
+import time
+import socket
+import sqlite3
+import hashlib
+import threading
+
+import requests
+
+import scheduler
+from db import get_db, PRIVATE_DIR
+from coordinator import LEASE_COLUMNS, REPORT_COLUMNS
+
+# ---------------------------------------------------------
+# Node side of coordinator.py
+# ---------------------------------------------------------
+# Leased items are copied into the local items table, so the crawler
+# and scheduler run unchanged against local art.db. This thread
+# refills that local queue, reports finished rows and renews leases.
+# If the coordinator is unreachable the crawler carries on with
+# what it has, and the unreported rows go out once it's back.
+COORDINATOR_URL = os.environ.get("ARTCRAWLER_COORDINATOR")
+TOKEN = os.environ.get("ARTCRAWLER_COORDINATOR_TOKEN")
+NODE_ID = os.environ.get("ARTCRAWLER_NODE") or (
+    socket.gethostname() + "-"
+    + hashlib.md5(PRIVATE_DIR.encode()).hexdigest()[:6]
+)
+
+BATCH = 100             # items per lease request
+LOW_WATER = 25          # lease more when fewer than this are left
+REPORT_BATCH = 500
+SYNC_INTERVAL = 30
+TIMEOUT = 15
+
+_started = False
+_online = None
+_wake = threading.Event()
+
+
+# ---------------------------------------------------------
+# Local queue
+# ---------------------------------------------------------
+def _post(url, path, payload):
+    headers = {"X-Artcrawler-Token": TOKEN} if TOKEN else {}
+    r = requests.post(url.rstrip("/") + path, json=payload,
+                      headers=headers, timeout=TIMEOUT)
+    r.raise_for_status()
+    return r.json()
+
+
+def local_backlog(conn):
+    """Leased items still waiting for a first attempt here."""
+    return conn.execute("""
+        SELECT COUNT(*)
+        FROM node_leases AS l JOIN items AS i ON i.qid = l.qid
+        WHERE i.done = 0 AND i.wifi_retry = 0
+    """).fetchone()[0]
+
+
+def store_lease(conn, rows):
+    now = time.time()
+    cols = ", ".join(LEASE_COLUMNS)
+    marks = ", ".join("?" * len(LEASE_COLUMNS))
+    # An item this device already finished stays finished; it's
+    # simply reported back on the next sync
+    conn.executemany(
+        f"INSERT OR IGNORE INTO items ({cols}, done, wifi_retry) "
+        f"VALUES ({marks}, 0, 0)",
+        rows,
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO node_leases (qid, leased_at) VALUES (?, ?)",
+        [(row[0], now) for row in rows],
+    )
+    conn.commit()
+    scheduler.notify()
+
+
+def finished_rows(conn, limit=REPORT_BATCH):
+    cols = ", ".join("i." + col for col in REPORT_COLUMNS)
+    return conn.execute(f"""
+        SELECT {cols}
+        FROM node_leases AS l JOIN items AS i ON i.qid = l.qid
+        WHERE i.done = 1 OR (i.done = 0 AND i.wifi_retry = 1)
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def held_qids(conn):
+    return [qid for (qid,) in conn.execute("""
+        SELECT l.qid
+        FROM node_leases AS l JOIN items AS i ON i.qid = l.qid
+        WHERE i.done != 1 AND i.wifi_retry = 0
+    """)]
+
+
+def forget_reported(conn, rows):
+    qids = [(row[0],) for row in rows]
+    # Soft failures go back to the coordinator, which schedules the
+    # retry for whichever device is free when it comes due
+    conn.executemany(
+        "DELETE FROM items WHERE qid = ? AND done = 0 AND wifi_retry = 1", qids
+    )
+    conn.executemany("DELETE FROM node_leases WHERE qid = ?", qids)
+    conn.commit()
+
+
+# ---------------------------------------------------------
+# Sync
+# ---------------------------------------------------------
+def sync_once(url=None, node=None):
+    """One report + renew + refill round. Raises on network errors."""
+    url = url or COORDINATOR_URL
+    node = node or NODE_ID
+    conn = get_db()
+    try:
+        reported = 0
+        while True:
+            rows = finished_rows(conn)
+            if not rows:
+                break
+            _post(url, "/report", {"node": node, "rows": rows, "renew": []})
+            forget_reported(conn, rows)
+            reported += len(rows)
+
+        held = held_qids(conn)
+        if held:
+            _post(url, "/report", {"node": node, "rows": [], "renew": held})
+
+        leased = 0
+        if local_backlog(conn) < LOW_WATER:
+            reply = _post(url, "/lease", {"node": node, "count": BATCH})
+            store_lease(conn, reply["items"])
+            leased = len(reply["items"])
+        return reported, leased
+    finally:
+        conn.close()
+
+
+def _set_online(online, callback):
+    global _online
+    if online != _online:
+        _online = online
+        msg = ("Coordinator reachable." if online
+               else "Coordinator unreachable; crawling the local queue.")
+        if callback:
+            callback(msg)
+        else:
+            print(msg)
+
+
+def start(url=None, node=None, callback=None):
+    """Sync with the coordinator in the background (once per process)."""
+    global _started
+    if _started:
+        return
+    _started = True
+
+    def loop():
+        while True:
+            try:
+                reported, leased = sync_once(url, node)
+                _set_online(True, callback)
+                if leased and callback:
+                    callback(f"Leased {leased} items (reported {reported}).")
+            except (requests.RequestException, ValueError, KeyError):
+                _set_online(False, callback)
+            except Exception as e:
+                # Usually the local DB being locked; this thread must
+                # not die, or the node never syncs again
+                kind = "local DB" if isinstance(e, sqlite3.Error) else type(e).__name__
+                msg = f"Coordinator sync failed ({kind}: {e}); retrying…"
+                if callback:
+                    callback(msg)
+                else:
+                    print(msg)
+            _wake.wait(SYNC_INTERVAL)
+            _wake.clear()
+
+    threading.Thread(target=loop, name="remote", daemon=True).start()
+
+
+def sync_soon():
+    _wake.set()
@@ -0,0 +1,179 @@
+import time
+import socket
+import threading
+import ipaddress
+
+import requests.packages.urllib3.util.connection as urllib3_cn
+
+import metrics
+
+# ---------------------------------------------------------
+# DNS cache for urllib3 connections (IPv4 only)
+# ---------------------------------------------------------
+# The crawler talks to the same handful of Wikimedia hosts all day,
+# and DNS is the flakiest part of the network on Android. Answers
+# are cached for TTL seconds and refreshed in the background before
+# they expire, so a new connection normally never waits on a lookup.
+# If a lookup fails, the last address that worked keeps being used
+# for up to STALE_MAX, instead of the request failing.
+#
+# getaddrinfo() doesn't report record TTLs, so TTL is our own.
+TTL = 5 * 60
+REFRESH_AHEAD = 60          # refresh entries this close to expiry
+REFRESH_INTERVAL = 30
+STALE_MAX = 24 * 60 * 60
+
+WIKIMEDIA_HOSTS = (
+    "www.wikidata.org",
+    "query.wikidata.org",
+    "commons.wikimedia.org",
+    "upload.wikimedia.org",
+)
+
+_cache = {}                 # host -> (addresses, expires_at, resolved_at)
+_lock = threading.Lock()
+_original_create_connection = urllib3_cn.create_connection
+_installed = False
+_refresher = False
+
+
+def allowed_gai_family():
+    # Force IPv4 (fixes DNS failures on Android/Pydroid)
+    return socket.AF_INET
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host)
+        return True
+    except ValueError:
+        return False
+
+
+def _lookup(host):
+    t0 = time.perf_counter()
+    try:
+        infos = socket.getaddrinfo(host, None, socket.AF_INET,
+                                   socket.SOCK_STREAM)
+    finally:
+        metrics.observe("dns_resolve_seconds", time.perf_counter() - t0,
+                        {"host": host})
+    addresses = []
+    for info in infos:
+        if info[4][0] not in addresses:
+            addresses.append(info[4][0])
+    return addresses
+
+
+def _count(host, result):
+    metrics.inc("dns_lookups_total", labels={"host": host, "result": result})
+
+
+def resolve(host, refresh=False):
+    """IPv4 addresses for `host`: cached, looked up, or last known good."""
+    if _is_ip(host) or host == "localhost":
+        return [host]
+
+    now = time.time()
+    with _lock:
+        entry = _cache.get(host)
+    if entry and entry[1] > now and not refresh:
+        _count(host, "hit")
+        return entry[0]
+
+    try:
+        addresses = _lookup(host)
+    except socket.gaierror:
+        if entry and now - entry[2] < STALE_MAX:
+            _count(host, "stale")
+            # Don't make every connection wait on a failing lookup;
+            # the refresher keeps trying in the background
+            with _lock:
+                _cache[host] = (entry[0], now + REFRESH_INTERVAL, entry[2])
+            return entry[0]
+        _count(host, "error")
+        raise
+
+    _count(host, "refresh" if refresh else "miss")
+    with _lock:
+        now = time.time()
+        _cache[host] = (addresses, now + TTL, now)
+    return addresses
+
+
+def forget(host):
+    """Expire `host` early (its addresses stopped answering)."""
+    with _lock:
+        entry = _cache.get(host)
+        if entry:
+            _cache[host] = (entry[0], 0, entry[2])
+
+
+def create_connection(address, *args, **kwargs):
+    """urllib3's create_connection, resolving through the cache."""
+    host, port = address
+    error = None
+    for ip in resolve(host.strip("[]")):
+        try:
+            return _original_create_connection((ip, port), *args, **kwargs)
+        except OSError as e:
+            error = e
+    forget(host)
+    raise error
+
+
+# ---------------------------------------------------------
+# Setup
+# ---------------------------------------------------------
+def install():
+    """Route urllib3 connections through the cache (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    urllib3_cn.allowed_gai_family = allowed_gai_family
+    urllib3_cn.create_connection = create_connection
+
+
+def prefetch(hosts=WIKIMEDIA_HOSTS):
+    """Resolve `hosts` now and keep every cached host fresh from a
+    background thread. Lookup failures are left for later."""
+    global _refresher
+    install()
+
+    def warm(names):
+        for host in names:
+            try:
+                resolve(host, refresh=True)
+            except (socket.gaierror, UnicodeError):
+                pass
+
+    def loop():
+        while True:
+            time.sleep(REFRESH_INTERVAL)
+            soon = time.time() + REFRESH_AHEAD
+            with _lock:
+                due = [h for h, entry in _cache.items() if entry[1] < soon]
+            warm(due)
+
+    hosts = [h for h in hosts if h]
+    threading.Thread(target=warm, args=(hosts,), name="dns-prefetch",
+                     daemon=True).start()
+    with _lock:
+        if _refresher:
+            return
+        _refresher = True
+    threading.Thread(target=loop, name="dns-refresh", daemon=True).start()
+
+
+def snapshot():
+    now = time.time()
+    with _lock:
+        return {
+            host: {"addresses": addresses, "expires_in": max(0, round(expires - now)),
+                   "age": round(now - resolved_at)}
+            for host, (addresses, expires, resolved_at) in _cache.items()
+        }
+
+
+install()
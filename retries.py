@@ -0,0 +1,69 @@
+import time
+import random
+
+from db import get_db
+import metrics
+
+# ---------------------------------------------------------
+# Retry policy for soft failures
+# ---------------------------------------------------------
+# Failure reasons are the same names recovery.py uses.
+# 403s are never retried: Commons will keep refusing them.
+PERMANENT_REASONS = {"403"}
+
+# First retry delay per failure class (seconds); doubles per attempt
+RETRY_BASE_DELAY = {
+    "query": 5 * 60,
+    "metadata": 60 * 60,
+    "download": 10 * 60,
+}
+DEFAULT_BASE_DELAY = 10 * 60
+MAX_RETRY_DELAY = 24 * 60 * 60
+
+# After this many soft failures an item becomes a hard failure
+MAX_ATTEMPTS = 8
+
+
+def backoff_delay(reason, fail_count):
+    base = RETRY_BASE_DELAY.get(reason, DEFAULT_BASE_DELAY)
+    delay = min(base * (2 ** max(fail_count - 1, 0)), MAX_RETRY_DELAY)
+    # +/-10% jitter so a burst of failures doesn't come due together
+    return delay * random.uniform(0.9, 1.1)
+
+
+@metrics.timed("db_commit_seconds")
+def mark_failed(qid, reason):
+    """Record a failure: schedule a retry, or fail permanently."""
+    conn = get_db()
+    c = conn.cursor()
+
+    c.execute("SELECT wifi_fail_count FROM items WHERE qid = ?", (qid,))
+    row = c.fetchone()
+    fail_count = ((row[0] if row else 0) or 0) + 1
+
+    if reason in PERMANENT_REASONS or fail_count >= MAX_ATTEMPTS:
+        c.execute("""
+            UPDATE items
+            SET done = 1,
+                wifi_retry = 0,
+                wifi_fail_count = ?,
+                last_fail_reason = ?,
+                next_attempt_at = NULL
+            WHERE qid = ?
+        """, (fail_count, reason, qid))
+        retry_at = None
+    else:
+        retry_at = time.time() + backoff_delay(reason, fail_count)
+        c.execute("""
+            UPDATE items
+            SET done = 0,
+                wifi_retry = 1,
+                wifi_fail_count = ?,
+                last_fail_reason = ?,
+                next_attempt_at = ?
+            WHERE qid = ?
+        """, (fail_count, reason, retry_at, qid))
+
+    conn.commit()
+    conn.close()
+    return retry_at
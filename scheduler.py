@@ -0,0 +1,236 @@
+import time
+import threading
+
+from db import get_db, BUCKET_PRIORITIES
+
+# ---------------------------------------------------------
+# Scheduler settings
+# ---------------------------------------------------------
+# done = 2 marks an item claimed by a running crawler
+CLAIMED = 2
+
+# Off: strict priority order (contemporary first, unknown last).
+# On: weighted round-robin across buckets so one huge bucket
+# cannot starve the others.
+FAIR_SHARE = False
+
+BUCKET_WEIGHTS = {
+    "contemporary": 6,
+    "modern": 5,
+    "romantic": 4,
+    "classical": 3,
+    "renaissance": 2,
+    "medieval": 1,
+    "unknown": 1,
+}
+
+# Every Nth claim looks at due retries first, so soft failures
+# are worked off steadily instead of only when the queue drains.
+RETRY_EVERY = 5
+
+# Empty buckets are skipped until this many claims have passed,
+# then probed again in case the indexer added work.
+EMPTY_RECHECK_CLAIMS = 200
+
+_lock = threading.Lock()
+_work = threading.Condition()
+_work_generation = 0
+_credit = {bucket: 0 for bucket in BUCKET_WEIGHTS}
+_empty = set()
+_claims_since_recheck = 0
+_claims_total = 0
+
+
+# ---------------------------------------------------------
+# Claim helpers
+# ---------------------------------------------------------
+def _select_sql(where, index=None):
+    indexed = f" INDEXED BY {index}" if index else ""
+    return f"SELECT qid, year FROM items{indexed} WHERE {where} LIMIT 1"
+
+
+def _claim(where, params=(), index=None):
+    # Every lookup is a single seek on idx_items_queue,
+    # idx_items_retry or idx_items_lookup, so the cost stays
+    # O(log n) however large the table grows. `index` pins the
+    # planner where it would otherwise pick the wrong one.
+    conn = get_db()
+    try:
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        c.execute(_select_sql(where, index), params)
+        row = c.fetchone()
+        if row:
+            c.execute(
+                "UPDATE items SET done = ? WHERE qid = ?",
+                (CLAIMED, row[0]),
+            )
+        conn.commit()
+        return row
+    finally:
+        conn.close()
+
+
+def _claim_by_priority():
+    return _claim("done = 0 AND wifi_retry = 0 ORDER BY priority, qid")
+
+
+def _claim_from_bucket(bucket):
+    return _claim(
+        "done = 0 AND wifi_retry = 0 AND priority = ? ORDER BY qid",
+        (BUCKET_PRIORITIES[bucket],),
+    )
+
+
+LOOKUP_WHERE = ("done = 0 AND wifi_retry = 0 AND image_url IS NULL "
+                "ORDER BY priority, qid")
+
+
+def _claim_lookup():
+    # Left to itself the planner walks idx_items_queue and skips
+    # every row that already has a URL; the partial index holds
+    # only the rows this wants
+    return _claim(LOOKUP_WHERE, index="idx_items_lookup")
+
+
+def _claim_due_retry():
+    return _claim(
+        "done = 0 AND wifi_retry = 1 AND next_attempt_at <= ? "
+        "ORDER BY next_attempt_at",
+        (time.time(),),
+    )
+
+
+def _claim_fair_share():
+    global _claims_since_recheck
+
+    _claims_since_recheck += 1
+    if _claims_since_recheck >= EMPTY_RECHECK_CLAIMS:
+        _empty.clear()
+        _claims_since_recheck = 0
+
+    while True:
+        active = [b for b in BUCKET_WEIGHTS if b not in _empty]
+        if not active:
+            # Everything looked empty: probe once more before giving up
+            _empty.clear()
+            _claims_since_recheck = 0
+            return _claim_by_priority()
+
+        # Smooth weighted round-robin (same scheme nginx uses)
+        total = 0
+        for bucket in active:
+            _credit[bucket] += BUCKET_WEIGHTS[bucket]
+            total += BUCKET_WEIGHTS[bucket]
+        bucket = max(active, key=lambda b: _credit[b])
+        _credit[bucket] -= total
+
+        row = _claim_from_bucket(bucket)
+        if row:
+            return row
+
+        _empty.add(bucket)
+        _credit[bucket] = 0
+
+
+# ---------------------------------------------------------
+# Public API
+# ---------------------------------------------------------
+def claim_next(metadata_only=False):
+    """Claim the next item to crawl. Returns (qid, year) or None.
+
+    metadata_only: skip items whose download URL is already known
+    (the governor's low-storage mode).
+    """
+    global _claims_total
+
+    with _lock:
+        if metadata_only:
+            return _claim_lookup()
+
+        _claims_total += 1
+        if _claims_total % RETRY_EVERY == 0:
+            row = _claim_due_retry()
+            if row:
+                return row
+
+        if FAIR_SHARE:
+            row = _claim_fair_share()
+        else:
+            row = _claim_by_priority()
+
+        # Fresh work ran out: keep draining whatever retries are due
+        return row or _claim_due_retry()
+
+
+def next_retry_due():
+    """When the earliest scheduled retry comes due, or None."""
+    conn = get_db()
+    try:
+        return conn.execute("""
+            SELECT MIN(next_attempt_at) FROM items
+            WHERE done = 0 AND wifi_retry = 1
+        """).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def release(qid, image_url=None):
+    """Put a claimed item back in the queue (e.g. on stop).
+
+    image_url, if given, is kept so the next attempt can skip the
+    metadata lookups.
+    """
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(
+        "UPDATE items SET done = 0, image_url = COALESCE(?, image_url) "
+        "WHERE qid = ? AND done = ?",
+        (image_url, qid, CLAIMED),
+    )
+    conn.commit()
+    conn.close()
+
+
+def release_all_claims():
+    """Reset claims left behind by a crawler that died mid-item."""
+    conn = get_db()
+    c = conn.cursor()
+    # Rows leased out by coordinator.py are claimed by another device
+    # (expired leases stay in the table, marked reaped)
+    c.execute("""
+        UPDATE items SET done = 0
+        WHERE done = ? AND qid NOT IN (SELECT qid FROM leases WHERE reaped = 0)
+    """, (CLAIMED,))
+    released = c.rowcount
+    conn.commit()
+    conn.close()
+    return released
+
+
+# ---------------------------------------------------------
+# Wake-ups
+# ---------------------------------------------------------
+# A crawler with nothing to claim waits here instead of sleeping a
+# fixed interval; the indexer and remote.py notify as soon as they
+# commit new items. Take work_generation() before the claim that
+# came back empty, so a commit in between isn't missed.
+def work_generation():
+    return _work_generation
+
+
+def notify():
+    """Wake crawlers waiting for work (new items, or a stop)."""
+    global _work_generation
+    with _work:
+        _work_generation += 1
+        _work.notify_all()
+
+
+def wait_for_work(since, timeout):
+    """Block until notify() runs after generation `since`, or timeout.
+
+    Returns True if notified.
+    """
+    with _work:
+        return _work.wait_for(lambda: _work_generation != since, timeout)
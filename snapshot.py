@@ -0,0 +1,164 @@
+import os
+import sys
+import gzip
+import time
+import shutil
+import sqlite3
+import argparse
+import threading
+
+import device
+from db import get_db
+
+# ---------------------------------------------------------
+# Settings
+# ---------------------------------------------------------
+SNAPSHOT_DIR = os.path.join(
+    device.shared_dir(), "Download", "ArtCrawler", "snapshots"
+)
+
+PAGES_PER_STEP = 256        # ~1 MB per step with 4 KB pages
+STEP_PAUSE = 0.02           # seconds between steps
+MIN_INTERVAL = 6 * 60 * 60  # automatic snapshots at most this often
+CHECK_INTERVAL = 10 * 60    # how often the background thread looks
+KEEP = 5
+COMPRESS = True
+
+PREFIX = "art-"
+
+_started = False
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------
+def _list_snapshots(dest_dir):
+    try:
+        names = os.listdir(dest_dir)
+    except FileNotFoundError:
+        return []
+    snaps = [n for n in names
+             if n.startswith(PREFIX) and (n.endswith(".db") or n.endswith(".db.gz"))]
+    return sorted(os.path.join(dest_dir, n) for n in snaps)
+
+
+def _apply_retention(dest_dir, keep):
+    snaps = _list_snapshots(dest_dir)
+    for path in snaps[:-keep] if keep else []:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def snapshot(dest_dir=SNAPSHOT_DIR, compress=COMPRESS, keep=KEEP,
+             pages=PAGES_PER_STEP, pause=STEP_PAUSE):
+    """Copy art.db with the online backup API. Returns the file path.
+
+    The source connection holds one WAL read transaction for the
+    whole copy, so concurrent crawler/indexer commits neither block
+    nor restart it, and the result is a consistent point in time.
+    """
+    with _lock:
+        os.makedirs(dest_dir, exist_ok=True)
+        name = PREFIX + time.strftime("%Y%m%d-%H%M%S") + ".db"
+        path = os.path.join(dest_dir, name)
+        tmp = path + ".tmp"
+
+        src = get_db()
+        src.isolation_level = None
+        if src.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+            src.execute("PRAGMA journal_mode = WAL")
+
+        dst = sqlite3.connect(tmp)
+        try:
+            src.execute("BEGIN")
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+
+            def throttle(status, remaining, total):
+                time.sleep(pause)
+
+            src.backup(dst, pages=pages, progress=throttle)
+            src.execute("COMMIT")
+        except Exception:
+            dst.close()
+            os.remove(tmp)
+            raise
+        finally:
+            src.close()
+
+        # The copy doesn't need a WAL next to it in shared storage
+        dst.execute("PRAGMA journal_mode = DELETE")
+        dst.close()
+
+        if compress:
+            with open(tmp, "rb") as fin, gzip.open(path + ".gz.tmp", "wb", 6) as fout:
+                shutil.copyfileobj(fin, fout, 1024 * 1024)
+            os.remove(tmp)
+            tmp = path + ".gz.tmp"
+            path += ".gz"
+
+        os.replace(tmp, path)
+        _apply_retention(dest_dir, keep)
+        return path
+
+
+def last_snapshot_time(dest_dir=SNAPSHOT_DIR):
+    snaps = _list_snapshots(dest_dir)
+    if not snaps:
+        return None
+    return os.path.getmtime(snaps[-1])
+
+
+def snapshot_if_due(dest_dir=SNAPSHOT_DIR, min_interval=MIN_INTERVAL):
+    last = last_snapshot_time(dest_dir)
+    if last is not None and time.time() - last < min_interval:
+        return None
+    return snapshot(dest_dir)
+
+
+def start_background(dest_dir=SNAPSHOT_DIR):
+    """Take throttled snapshots from a daemon thread (once per process)."""
+    global _started
+    if _started:
+        return
+    _started = True
+
+    def loop():
+        while True:
+            try:
+                path = snapshot_if_due(dest_dir)
+                if path:
+                    print("DB snapshot written:", path)
+            except Exception as e:
+                print("DB snapshot error:", e)
+            time.sleep(CHECK_INTERVAL)
+
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Online art.db snapshot")
+    parser.add_argument("--dest", default=SNAPSHOT_DIR)
+    parser.add_argument("--keep", type=int, default=KEEP)
+    parser.add_argument("--no-compress", action="store_true")
+    parser.add_argument("--if-due", action="store_true",
+                        help="skip if the newest snapshot is recent")
+    args = parser.parse_args(argv)
+
+    if args.if_due:
+        last = last_snapshot_time(args.dest)
+        if last is not None and time.time() - last < MIN_INTERVAL:
+            print("Snapshot not due yet.")
+            return 0
+
+    t0 = time.time()
+    path = snapshot(args.dest, not args.no_compress, args.keep)
+    size = os.path.getsize(path) / 1e6
+    print(f"Snapshot {path} ({size:.1f} MB) in {time.time() - t0:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import time
+import threading
+
+from db import get_db, archive_counts
+import upgrades
+
+# ---------------------------------------------------------
+# Background status service
+# ---------------------------------------------------------
+# The UI reads latest() on its refresh tick; all SQLite work happens
+# on this thread, at most once per interval, whatever the UI does.
+DB_INTERVAL = 2             # item counts
+INDEXER_STALL_CHECK = 300   # offset compared against this long ago
+
+_latest = {}
+_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+_running = False
+
+
+def latest():
+    """Most recent snapshot (a dict; empty until the first one lands)."""
+    return _latest
+
+
+def refresh_soon():
+    """Ask for a snapshot now instead of at the next interval."""
+    _wake.set()
+
+
+# ---------------------------------------------------------
+# Queries
+# ---------------------------------------------------------
+def collect_db(conn):
+    # One pass over items instead of a COUNT(*) per figure
+    total, modern, contemporary, done = conn.execute("""
+        SELECT COUNT(*),
+               COALESCE(SUM(bucket = 'modern'), 0),
+               COALESCE(SUM(bucket = 'contemporary'), 0),
+               COALESCE(SUM(done = 1), 0)
+        FROM items
+    """).fetchone()
+
+    last = conn.execute("""
+        SELECT qid, year, bucket
+        FROM items
+        WHERE done = 1
+        ORDER BY rowid DESC
+        LIMIT 1
+    """).fetchone()
+
+    # Pruned items are finished ones
+    archive = archive_counts(conn)
+    total += archive["archived"]
+    done += archive["archived"]
+    modern += archive["modern"]
+    contemporary += archive["contemporary"]
+
+    row = conn.execute("SELECT offset FROM indexer_state WHERE id = 1").fetchone()
+    upgrade_counts = upgrades.counts(conn)
+
+    return {
+        "total": total,
+        "modern": modern,
+        "contemporary": contemporary,
+        "downloaded": done,
+        "pending": total - done,
+        "last_done": last,
+        "indexer_offset": row[0] if row else 0,
+        "upgrades_pending": upgrade_counts["pending"],
+        "upgrades_done": upgrade_counts["done"],
+    }
+
+
+# ---------------------------------------------------------
+# Service thread
+# ---------------------------------------------------------
+def _loop():
+    global _latest
+    offsets = []    # (time, offset) samples for stall detection
+
+    while _running:
+        snap = {"at": time.time()}
+        try:
+            conn = get_db()
+            try:
+                snap.update(collect_db(conn))
+            finally:
+                conn.close()
+        except Exception as e:
+            snap["error"] = str(e).split("\n")[0]
+
+        if "indexer_offset" in snap:
+            now = snap["at"]
+            offsets.append((now, snap["indexer_offset"]))
+            while len(offsets) > 1 and now - offsets[1][0] >= INDEXER_STALL_CHECK:
+                offsets.pop(0)
+            first_at, first_offset = offsets[0]
+            snap["indexer_offset_was"] = first_offset
+            snap["indexer_window"] = now - first_at
+
+        # Swap in a new dict; readers never see a half-built one
+        _latest = snap
+
+        _wake.wait(DB_INTERVAL)
+        _wake.clear()
+
+
+def start():
+    """Start the service thread (once per process)."""
+    global _thread, _running
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _running = True
+        _thread = threading.Thread(target=_loop, name="status", daemon=True)
+        _thread.start()
+
+
+def stop():
+    global _running
+    _running = False
+    _wake.set()
@@ -1,6 +1,11 @@
 import os
+import sys
+import time
 import shutil
-from datetime import datetime
+import hashlib
+import sqlite3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # MODIFY THESE PATHS IF NEEDED
 SRC = "/data/data/ru.iiec.pydroid3/files/home/storage/downloads/artcrawler"
@@ -9,58 +14,274 @@ DST = "/storage/emulated/0/ArtCrawler"
 # File extensions to sync
 SYNC_EXT = {".py", ".kv", ".log"}
 
-def sync():
-    print("=== ArtCrawler Sync Script ===")
-    print(f"Source:      {SRC}")
-    print(f"Destination: {DST}")
-    print(f"Extensions:  {', '.join(SYNC_EXT)}")
-    print("================================\n")
+# Images tree (--images) is copied whole, minus in-flight downloads
+IMAGES_SUBDIR = "images"
+IMAGE_SKIP_SUFFIXES = (".part",)
 
+# Manifest of what was last copied, kept in the destination. Lets a
+# run find changed files from source stats alone.
+MANIFEST_NAME = ".artcrawler-sync.db"
+
+WORKERS = 4
+COMMIT_EVERY = 1000
+CHUNK = 8 * 1024 * 1024
+
+
+# ---------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------
+def open_manifest(dst):
+    os.makedirs(dst, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(dst, MANIFEST_NAME))
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS files (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime_ns INTEGER,
+            sha1 TEXT
+        ) WITHOUT ROWID
+    """)
+    conn.commit()
+    return conn
+
+
+def load_manifest(conn):
+    return {
+        path: (size, mtime_ns, sha1)
+        for path, size, mtime_ns, sha1 in conn.execute(
+            "SELECT path, size, mtime_ns, sha1 FROM files"
+        )
+    }
+
+
+def save_entries(conn, entries):
+    conn.executemany(
+        "INSERT OR REPLACE INTO files (path, size, mtime_ns, sha1) "
+        "VALUES (?, ?, ?, ?)",
+        entries,
+    )
+    conn.commit()
+
+
+# ---------------------------------------------------------
+# Scanning
+# ---------------------------------------------------------
+def scan(root, prefix, wanted):
+    """Yield (relpath, path, size, mtime_ns) for files under root.
+
+    scandir hands back the stat from the directory read on Linux,
+    so there's no extra syscall per file.
+    """
+    stack = [(root, prefix)]
+    while stack:
+        folder, rel = stack.pop()
+        try:
+            entries = os.scandir(folder)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                rel_path = os.path.join(rel, entry.name) if rel else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, rel_path))
+                elif entry.is_file() and wanted(entry.name):
+                    st = entry.stat()
+                    yield rel_path, entry.path, st.st_size, st.st_mtime_ns
+
+
+def code_file(name):
+    return os.path.splitext(name)[1].lower() in SYNC_EXT
+
+
+def image_file(name):
+    return not name.startswith(".") and not name.endswith(IMAGE_SKIP_SUFFIXES)
+
+
+# ---------------------------------------------------------
+# Copying
+# ---------------------------------------------------------
+def sha1_of(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _copy_data(fin, fout, size):
+    """Kernel-side copy: copy_file_range, then sendfile, then read/write."""
+    src, dst = fin.fileno(), fout.fileno()
     copied = 0
-    skipped = 0
-    created_dirs = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(src, dst, min(CHUNK, size - copied))
+                if n == 0:
+                    break
+                copied += n
+            return
+        except OSError:
+            # EXDEV/ENOSYS on older kernels and FUSE; carry on from here
+            pass
+    try:
+        while copied < size:
+            n = os.sendfile(dst, src, copied, min(CHUNK, size - copied))
+            if n == 0:
+                break
+            copied += n
+        return
+    except OSError:
+        pass
+    fin.seek(copied)
+    fout.seek(copied)
+    shutil.copyfileobj(fin, fout, CHUNK)
 
-    for root, dirs, files in os.walk(SRC):
-        rel = os.path.relpath(root, SRC)
-        dst_root = os.path.join(DST, rel)
 
-        # Ensure destination directory exists
-        if not os.path.exists(dst_root):
-            print(f"[DIR] Creating directory: {dst_root}")
-            os.makedirs(dst_root, exist_ok=True)
-            created_dirs += 1
+def copy_file(src_path, dst_path, size, mtime_ns):
+    tmp = dst_path + ".sync-tmp"
+    with open(src_path, "rb") as fin, open(tmp, "wb") as fout:
+        _copy_data(fin, fout, size)
+    os.utime(tmp, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp, dst_path)
 
-        print(f"\n[DIR] Entering: {root}")
 
-        for f in files:
-            ext = os.path.splitext(f)[1].lower()
-            src_file = os.path.join(root, f)
-            dst_file = os.path.join(dst_root, f)
+def sync_one(job, dst, use_hash):
+    """Returns (manifest entry, bytes copied). Runs on a worker thread."""
+    rel, src_path, size, mtime_ns, old = job
+    dst_path = os.path.join(dst, rel)
 
-            if ext not in SYNC_EXT:
-                print(f"  [SKIP] {f} (extension not in sync list)")
-                skipped += 1
+    sha1 = None
+    if use_hash:
+        sha1 = sha1_of(src_path)
+        # Touched but identical: refresh the manifest, skip the copy
+        if old and old[0] == size and old[2] == sha1:
+            return (rel, size, mtime_ns, sha1), 0
+
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    copy_file(src_path, dst_path, size, mtime_ns)
+    return (rel, size, mtime_ns, sha1), size
+
+
+def up_to_date_on_disk(dst_path, size, mtime_ns):
+    # --rebuild only: trust a destination file that already matches
+    try:
+        st = os.stat(dst_path)
+    except FileNotFoundError:
+        return False
+    return st.st_size == size and st.st_mtime_ns >= mtime_ns
+
+
+# ---------------------------------------------------------
+# Sync
+# ---------------------------------------------------------
+def sync(src=SRC, dst=DST, images_dir=None, use_hash=False,
+         workers=WORKERS, rebuild=False, dry_run=False):
+    t0 = time.time()
+    manifest_conn = open_manifest(dst)
+    manifest = {} if rebuild else load_manifest(manifest_conn)
+
+    trees = [(src, "", code_file)]
+    if images_dir:
+        trees.append((images_dir, IMAGES_SUBDIR, image_file))
+
+    stats = {"scanned": 0, "unchanged": 0, "copied": 0, "hash_skipped": 0,
+             "errors": 0, "bytes": 0}
+    jobs = []
+    relinked = []
+
+    for root, prefix, wanted in trees:
+        for rel, path, size, mtime_ns in scan(root, prefix, wanted):
+            stats["scanned"] += 1
+            old = manifest.get(rel)
+            if old and old[0] == size and old[1] == mtime_ns:
+                stats["unchanged"] += 1
+                continue
+            if rebuild and up_to_date_on_disk(os.path.join(dst, rel), size, mtime_ns):
+                relinked.append((rel, size, mtime_ns, None))
+                stats["unchanged"] += 1
                 continue
+            jobs.append((rel, path, size, mtime_ns, old))
+
+    if dry_run:
+        stats["copied"] = len(jobs)
+        stats["bytes"] = sum(job[2] for job in jobs)
+        manifest_conn.close()
+        stats["elapsed"] = time.time() - t0
+        return stats
+
+    if relinked:
+        save_entries(manifest_conn, relinked)
+
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(job, pool.submit(sync_one, job, dst, use_hash)) for job in jobs]
+        for job, future in futures:
+            try:
+                entry, copied = future.result()
+            except OSError as e:
+                stats["errors"] += 1
+                print(f"[ERROR] {job[0]}: {e}")
+                continue
+            pending.append(entry)
+            if copied:
+                stats["copied"] += 1
+                stats["bytes"] += copied
+            else:
+                stats["hash_skipped"] += 1
+            if len(pending) >= COMMIT_EVERY:
+                save_entries(manifest_conn, pending)
+                pending = []
+
+    if pending:
+        save_entries(manifest_conn, pending)
+    manifest_conn.close()
+
+    stats["elapsed"] = time.time() - t0
+    return stats
+
+
+def print_summary(stats, src, dst, dry_run=False):
+    mb = stats["bytes"] / 1e6
+    rate = mb / stats["elapsed"] if stats["elapsed"] else 0
+    print("=== ArtCrawler Sync ===")
+    print(f"Source:       {src}")
+    print(f"Destination:  {dst}")
+    print(f"Scanned:      {stats['scanned']}")
+    print(f"Unchanged:    {stats['unchanged']}")
+    print(f"{'Would copy:' if dry_run else 'Copied:':<14}{stats['copied']} "
+          f"({mb:.1f} MB, {rate:.1f} MB/s)")
+    if stats["hash_skipped"]:
+        print(f"Same content: {stats['hash_skipped']} (mtime only)")
+    if stats["errors"]:
+        print(f"Errors:       {stats['errors']}")
+    print(f"Took:         {stats['elapsed']:.1f}s")
+
 
-            # Compare timestamps if destination exists
-            if os.path.exists(dst_file):
-                src_mtime = os.path.getmtime(src_file)
-                dst_mtime = os.path.getmtime(dst_file)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sync ArtCrawler files to shared storage")
+    parser.add_argument("--src", default=SRC)
+    parser.add_argument("--dst", default=DST)
+    parser.add_argument("--images", nargs="?", const="", default=None,
+                        metavar="DIR",
+                        help="also sync the images tree (default: device images dir)")
+    parser.add_argument("--hash", action="store_true",
+                        help="record sha1 and skip files whose content is unchanged")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--rebuild", action="store_true",
+                        help="ignore the manifest and compare against the destination")
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
 
-                if src_mtime <= dst_mtime:
-                    print(f"  [SKIP] {f} (destination is newer or same)")
-                    skipped += 1
-                    continue
+    images_dir = args.images
+    if images_dir == "":
+        import device
+        images_dir = device.images_dir()
 
-            print(f"  [COPY] {src_file} → {dst_file}")
-            shutil.copy2(src_file, dst_file)
-            copied += 1
+    stats = sync(args.src, args.dst, images_dir, args.hash,
+                 args.workers, args.rebuild, args.dry_run)
+    print_summary(stats, args.src, args.dst, args.dry_run)
+    return 1 if stats["errors"] else 0
 
-    print("\n=== Sync Complete ===")
-    print(f"Directories created: {created_dirs}")
-    print(f"Files copied:        {copied}")
-    print(f"Files skipped:       {skipped}")
-    print("======================")
 
 if __name__ == "__main__":
-    sync()
+    sys.exit(main())
@@ -0,0 +1,19 @@
+import sys
+import importlib
+
+import pytest
+
+# Modules that read the data/shared dirs when first imported
+PATH_MODULES = ("device", "db", "imagestore", "scheduler", "coordinator",
+                "verify", "merge_db")
+
+
+@pytest.fixture
+def fresh(tmp_path, monkeypatch):
+    """import_module() against an empty art.db under tmp_path."""
+    monkeypatch.setenv("ARTCRAWLER_DATA_DIR", str(tmp_path / "private"))
+    monkeypatch.setenv("ARTCRAWLER_SHARED_DIR", str(tmp_path / "shared"))
+    for name in PATH_MODULES:
+        sys.modules.pop(name, None)
+    importlib.import_module("db").init_db()
+    return importlib.import_module
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def coordinator(fresh):
+    module = fresh("coordinator")
+    conn = fresh("db").get_db()
+    conn.executemany(
+        "INSERT INTO items (qid, year, priority) VALUES (?, 1900, 2)",
+        [(f"Q{n}",) for n in range(1, 7)],
+    )
+    conn.commit()
+    conn.close()
+    return module
+
+
+def _done(coordinator):
+    conn = coordinator.get_db()
+    try:
+        return dict(conn.execute("SELECT qid, done FROM items"))
+    finally:
+        conn.close()
+
+
+def test_report_rows_must_be_typed(coordinator):
+    assert coordinator._valid_row(["Q1", 1, 0, 0, None, None])
+    assert not coordinator._valid_row(["Q1", "x", 0, 0, None, None])
+    assert not coordinator._valid_row(["Q1", 2, 0, 0, None, None])
+    assert not coordinator._valid_row(["Q1", 0, 1, 0, None, "soon"])
+
+
+def test_report_applies_only_own_or_expired_leases(coordinator):
+    coordinator.lease("a", 2)       # Q1, Q2
+    coordinator.lease("b", 2)       # Q3, Q4
+    ok = [1, 0, 0, None, None]
+
+    assert coordinator.report("a", [["Q5"] + ok]) == 0      # never leased
+    assert coordinator.report("a", [["Q3"] + ok]) == 0      # b's live lease
+    assert coordinator.report("a", [["Q1"] + ok]) == 1
+
+    conn = coordinator.get_db()
+    conn.execute("UPDATE leases SET expires_at = ? WHERE qid = 'Q4'",
+                 (time.time() - 1,))
+    conn.commit()
+    conn.close()
+    assert coordinator.reap() == 1
+    assert coordinator.report("a", [["Q4"] + ok]) == 1      # late, expired
+
+    assert _done(coordinator) == {"Q1": 1, "Q2": 2, "Q3": 2, "Q4": 1,
+                                  "Q5": 0, "Q6": 0}
+
+
+def test_reaped_leases_dont_pin_local_claims(coordinator, fresh):
+    scheduler = fresh("scheduler")
+    coordinator.lease("a", 1)       # Q1
+    conn = coordinator.get_db()
+    conn.execute("UPDATE leases SET expires_at = 0")
+    conn.commit()
+    coordinator.reap()
+    # Claimed locally after the lease ran out, then the crawler died
+    conn.execute("UPDATE items SET done = 2 WHERE qid = 'Q1'")
+    conn.commit()
+    conn.close()
+
+    assert scheduler.release_all_claims() == 1
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def merge_db(fresh):
+    return fresh("merge_db")
+
+
+def _source(merge_db, tmp_path):
+    """A second device's art.db with a looked-up URL, a hash and upgrades."""
+    path = str(tmp_path / "tablet.db")
+    target, merge_db.db.DB_PATH = merge_db.db.DB_PATH, path
+    try:
+        merge_db.db.init_db()
+    finally:
+        merge_db.db.DB_PATH = target
+
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO items (qid, year, priority, done, image_url) "
+        "VALUES (?, 1900, 2, ?, ?)",
+        [("Q1", 0, "https://upload.example/Q1.jpg"),
+         ("Q2", 1, None),
+         ("Q3", 2, "https://upload.example/Q3.jpg")],
+    )
+    conn.execute(
+        "INSERT INTO images (qid, size, sha1, source, saved_at) "
+        "VALUES ('Q2', 10, 'abc', 'commons', 0)"
+    )
+    conn.executemany(
+        "INSERT INTO upgrades (qid, url, state, created_at) VALUES (?, ?, ?, 0)",
+        [("Q2", "https://upload.example/Q2.jpg", merge_db.upgrades.CLAIMED),
+         ("Q4", "https://upload.example/Q4.jpg", merge_db.upgrades.DONE)],
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_merge_carries_urls_hashes_and_upgrades(merge_db, tmp_path):
+    source = _source(merge_db, tmp_path)
+    conn = merge_db.db.get_db()
+    conn.execute("INSERT INTO items (qid, year, priority) VALUES ('Q1', 1900, 2)")
+    conn.execute(
+        "INSERT INTO upgrades (qid, url, state, created_at) "
+        "VALUES ('Q4', 'https://upload.example/mine.jpg', 0, 0)"
+    )
+    conn.commit()
+
+    stats = merge_db.merge_source(conn, source)
+
+    assert stats["images_added"] == 1
+    assert stats["upgrades_added"] == 1
+    urls = dict(conn.execute("SELECT qid, image_url FROM items"))
+    assert urls == {"Q1": "https://upload.example/Q1.jpg", "Q2": None,
+                    "Q3": "https://upload.example/Q3.jpg"}
+    assert conn.execute("SELECT qid, sha1 FROM images").fetchall() == [("Q2", "abc")]
+    # Claimed on the tablet: pending here; Q4 was already queued here
+    assert dict(conn.execute("SELECT qid, state FROM upgrades")) == {
+        "Q2": merge_db.upgrades.PENDING, "Q4": merge_db.upgrades.PENDING,
+    }
+    conn.close()
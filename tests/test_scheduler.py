@@ -0,0 +1,31 @@
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def scheduler(fresh):
+    return fresh("scheduler")
+
+
+def test_lookup_claim_seeks_the_partial_index(scheduler):
+    conn = sys.modules["db"].get_db()
+    conn.executemany(
+        "INSERT INTO items (qid, priority, image_url) VALUES (?, 1, ?)",
+        [(f"Q{n}", f"http://x/{n}" if n % 10 else None) for n in range(2000)],
+    )
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    plan = " ".join(
+        row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN "
+            + scheduler._select_sql(scheduler.LOOKUP_WHERE, "idx_items_lookup")
+        )
+    )
+    conn.close()
+    assert "idx_items_lookup" in plan
+    assert "TEMP B-TREE" not in plan
+
+    qid, _ = scheduler._claim_lookup()
+    assert qid == "Q0"
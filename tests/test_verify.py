@@ -0,0 +1,55 @@
+import os
+import sys
+import hashlib
+import sqlite3
+
+import pytest
+
+JPEG = b"\xff\xd8\xff\xe0" + bytes(range(256)) * 4 + b"\xff\xd9"
+
+
+@pytest.fixture
+def verify(fresh):
+    return fresh("verify")
+
+
+def test_counts_dont_depend_on_commit_boundaries(verify, tmp_path, monkeypatch):
+    images = tmp_path / "images"
+    images.mkdir()
+    conn = sqlite3.connect(sys.modules["db"].DB_PATH)
+    for n in range(7):
+        (images / f"Q{n}.jpg").write_bytes(JPEG)
+        if n % 2:
+            # Recorded at download time; the rest get a baseline
+            conn.execute(
+                "INSERT INTO images (qid, size, sha1, source, saved_at) "
+                "VALUES (?, ?, ?, 'download', 0)",
+                (f"Q{n}", len(JPEG), hashlib.sha1(JPEG).hexdigest()),
+            )
+    conn.commit()
+    (images / "Q9.jpg").write_bytes(JPEG[:500])
+
+    monkeypatch.setattr(verify, "COMMIT_EVERY", 3)
+    stats = verify.verify(str(images), workers=2)
+
+    assert stats["files"] == 8
+    assert stats["ok"] == 7
+    assert stats["baselined"] == 4
+    assert stats["bad"] == 1
+    assert not (images / "Q9.jpg").exists()
+    rows = conn.execute(
+        "SELECT COUNT(*), COUNT(verified_at) FROM images"
+    ).fetchone()
+    assert rows == (7, 7)
+    conn.close()
+
+
+def test_refuses_while_a_crawl_holds_the_pid_file(verify, capsys):
+    device = sys.modules["device"]
+    with open(device.crawler_pid_path(), "w") as f:
+        f.write(str(os.getpid()))
+    assert verify.main([]) == 2
+    assert "crawler is running" in capsys.readouterr().out
+
+    os.remove(device.crawler_pid_path())
+    assert device.crawler_pid() is None
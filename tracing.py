@@ -0,0 +1,195 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from contextlib import contextmanager
+
+# ---------------------------------------------------------
+# Settings
+# ---------------------------------------------------------
+ENABLED = True
+SAMPLE_RATE = 0.01          # fraction of ordinary items written out
+SLOW_ITEM_SECONDS = 30      # items slower than this are always written
+
+MAX_FILE_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+TRACE_PATH = None           # set by configure()
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def configure(path):
+    global TRACE_PATH
+    TRACE_PATH = path
+
+
+# ---------------------------------------------------------
+# Recording
+# ---------------------------------------------------------
+# Spans are kept in memory for every item; the keep/drop decision
+# is made in end() once the total duration is known.
+def begin(qid, claim_seconds=None):
+    if not ENABLED:
+        _local.trace = None
+        return
+    _local.trace = {
+        "qid": qid,
+        "start": time.time(),
+        "t0": time.perf_counter(),
+        "spans": [],
+    }
+    if claim_seconds is not None:
+        event("claim", claim_seconds)
+
+
+def _current():
+    return getattr(_local, "trace", None)
+
+
+def event(stage, duration=None, **attrs):
+    trace = _current()
+    if trace is None:
+        return
+    now = time.perf_counter() - trace["t0"]
+    span = {"stage": stage, "at": round(now - (duration or 0), 4)}
+    if duration is not None:
+        span["dur"] = round(duration, 4)
+    span.update(attrs)
+    trace["spans"].append(span)
+
+
+@contextmanager
+def span(stage, **attrs):
+    """Time a block; the yielded dict can be filled with attributes."""
+    trace = _current()
+    if trace is None:
+        yield attrs
+        return
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        event(stage, time.perf_counter() - t0, **attrs)
+
+
+def end(outcome):
+    trace = _current()
+    _local.trace = None
+    if trace is None or TRACE_PATH is None:
+        return
+
+    duration = time.perf_counter() - trace.pop("t0")
+    slow = duration >= SLOW_ITEM_SECONDS
+    if not slow and random.random() >= SAMPLE_RATE:
+        return
+
+    trace["duration"] = round(duration, 4)
+    trace["outcome"] = outcome
+    trace["slow"] = slow
+    _write(json.dumps(trace))
+
+
+def _write(line):
+    with _write_lock:
+        try:
+            if (os.path.exists(TRACE_PATH)
+                    and os.path.getsize(TRACE_PATH) >= MAX_FILE_BYTES):
+                _rotate()
+            with open(TRACE_PATH, "a") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+
+def _rotate():
+    for n in range(BACKUP_COUNT - 1, 0, -1):
+        src = f"{TRACE_PATH}.{n}"
+        if os.path.exists(src):
+            os.replace(src, f"{TRACE_PATH}.{n + 1}")
+    os.replace(TRACE_PATH, f"{TRACE_PATH}.1")
+
+
+# ---------------------------------------------------------
+# CLI: summarise the worst offenders
+# ---------------------------------------------------------
+def load(path):
+    traces = []
+    paths = [path] + [f"{path}.{n}" for n in range(1, BACKUP_COUNT + 1)]
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        with open(p) as f:
+            for line in f:
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    continue
+    return traces
+
+
+def summarise(traces, top=20, stage=None):
+    if stage:
+        def cost(t):
+            return sum(s.get("dur", 0) for s in t["spans"] if s["stage"] == stage)
+    else:
+        def cost(t):
+            return t["duration"]
+
+    worst = sorted(traces, key=cost, reverse=True)[:top]
+
+    print(f"{len(traces)} traces, "
+          f"{sum(1 for t in traces if t.get('slow'))} slow")
+    print()
+    print(f"{'qid':<14}{'total s':>9}  {'outcome':<18}slowest stages")
+    for t in worst:
+        by_stage = {}
+        for s in t["spans"]:
+            by_stage[s["stage"]] = by_stage.get(s["stage"], 0) + s.get("dur", 0)
+        slowest = sorted(by_stage.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        stages = ", ".join(f"{name} {secs:.2f}s" for name, secs in slowest)
+        print(f"{t['qid']:<14}{t['duration']:>9.2f}  {t['outcome']:<18}{stages}")
+
+    totals = {}
+    for t in worst:
+        for s in t["spans"]:
+            entry = totals.setdefault(s["stage"], [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += s.get("dur", 0)
+            entry[2] = max(entry[2], s.get("dur", 0))
+
+    print()
+    print(f"Stage totals over these {len(worst)} items:")
+    print(f"{'stage':<14}{'spans':>7}{'total s':>10}{'max s':>9}")
+    for name, (count, total, longest) in sorted(
+        totals.items(), key=lambda kv: kv[1][1], reverse=True
+    ):
+        print(f"{name:<14}{count:>7}{total:>10.2f}{longest:>9.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise crawler traces")
+    parser.add_argument("path", nargs="?", help="traces.jsonl (default: private storage)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--stage", help="rank by time spent in this stage")
+    args = parser.parse_args(argv)
+
+    path = args.path
+    if path is None:
+        from db import PRIVATE_DIR
+        path = os.path.join(PRIVATE_DIR, "traces.jsonl")
+
+    traces = load(path)
+    if not traces:
+        print(f"No traces in {path}")
+        return 1
+    summarise(traces, args.top, args.stage)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import time
+import threading
+
+from db import get_db
+import retries
+import metrics
+
+# ---------------------------------------------------------
+# Full-resolution upgrade queue (progressive mode)
+# ---------------------------------------------------------
+# In progressive mode the crawler saves a small preview of each item
+# and queues the full-size URL here. The queue is worked through by
+# one low-priority worker, and only while the governor's budget is
+# full. Rows are claimed (state 2) in next_attempt_at order. A
+# failure puts the row back with the same backoff as items. A 403,
+# or running out of attempts, gives up and keeps the preview.
+PENDING, DONE, CLAIMED, GAVE_UP = 0, 1, 2, 3
+
+_lock = threading.Lock()
+
+
+def add(qid, url, size=None, sha1=None):
+    """Queue url for qid. size/sha1: Commons' values if url is the
+    original file, so the download can be checked against them."""
+    now = time.time()
+    conn = get_db()
+    try:
+        conn.execute("""
+            INSERT INTO upgrades
+                (qid, url, size, sha1, state, next_attempt_at, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(qid) DO UPDATE
+            SET url = excluded.url, size = excluded.size,
+                sha1 = excluded.sha1, state = excluded.state,
+                next_attempt_at = excluded.next_attempt_at
+            WHERE state != ?
+        """, (qid, url, size, sha1, PENDING, now, now, DONE))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@metrics.timed("db_claim_seconds")
+def claim_next():
+    """Claim the next due upgrade. Returns (qid, url, size, sha1) or None."""
+    with _lock:
+        conn = get_db()
+        try:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            row = c.execute("""
+                SELECT qid, url, size, sha1 FROM upgrades
+                WHERE state = ? AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT 1
+            """, (PENDING, time.time())).fetchone()
+            if row:
+                c.execute("UPDATE upgrades SET state = ? WHERE qid = ?",
+                          (CLAIMED, row[0]))
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+
+def mark_done(qid):
+    conn = get_db()
+    try:
+        conn.execute("""
+            UPDATE upgrades
+            SET state = ?, last_fail_reason = NULL, done_at = ?
+            WHERE qid = ?
+        """, (DONE, time.time(), qid))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def mark_failed(qid, reason):
+    """Back off and retry later, or give up (403 / too many attempts)."""
+    conn = get_db()
+    try:
+        row = conn.execute(
+            "SELECT fail_count FROM upgrades WHERE qid = ?", (qid,)
+        ).fetchone()
+        fail_count = (row[0] if row else 0) + 1
+        if reason in retries.PERMANENT_REASONS or fail_count >= retries.MAX_ATTEMPTS:
+            state, retry_at = GAVE_UP, None
+        else:
+            state = PENDING
+            retry_at = time.time() + retries.backoff_delay(reason, fail_count)
+        conn.execute("""
+            UPDATE upgrades
+            SET state = ?, fail_count = ?, last_fail_reason = ?,
+                next_attempt_at = ?
+            WHERE qid = ?
+        """, (state, fail_count, reason, retry_at, qid))
+        conn.commit()
+    finally:
+        conn.close()
+    return retry_at
+
+
+def release(qid):
+    conn = get_db()
+    try:
+        conn.execute("UPDATE upgrades SET state = ? WHERE qid = ? AND state = ?",
+                     (PENDING, qid, CLAIMED))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def release_all_claims():
+    conn = get_db()
+    try:
+        c = conn.execute("UPDATE upgrades SET state = ? WHERE state = ?",
+                         (PENDING, CLAIMED))
+        conn.commit()
+        return c.rowcount
+    finally:
+        conn.close()
+
+
+def counts(conn):
+    """{"pending", "done", "gave_up"} for the stats lines."""
+    pending, done, gave_up = conn.execute("""
+        SELECT COALESCE(SUM(state IN (?, ?)), 0),
+               COALESCE(SUM(state = ?), 0),
+               COALESCE(SUM(state = ?), 0)
+        FROM upgrades
+    """, (PENDING, CLAIMED, DONE, GAVE_UP)).fetchone()
+    return {"pending": pending, "done": done, "gave_up": gave_up}
@@ -0,0 +1,306 @@
+"""Check every image in the library and re-queue the bad ones.
+
+    python verify.py
+    python verify.py --images /sdcard/Pictures/ArtCrawler --workers 4 --dry-run
+
+Each file is hashed through a read-only mmap, in a pool of worker
+processes, and compared with the size and sha1 recorded when it was
+downloaded (Commons' own sha1 for originals). JPEG and PNG files also
+get a structure check: SOI/EOI markers, PNG signature, IHDR and IEND.
+Bad files are moved to a quarantine folder and their items put back
+on the download queue. Files saved before hashes were recorded get
+the structure check only, and their hash becomes the baseline for
+the next sweep.
+
+Run it while the crawler is stopped (it refuses to move anything
+while a crawl is running, whether from the app, a worker or the
+command line): the crawler keeps its own index of the library,
+built when it starts, and would take a re-queued item's old entry
+for a file that is still there.
+"""
+import os
+import sys
+import time
+import mmap
+import zlib
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from db import get_db, init_db, classify_year
+import device
+import imagestore
+
+WORKERS = os.cpu_count() or 2
+CHUNKSIZE = 64                  # files per task sent to a worker
+COMMIT_EVERY = 1000
+BATCH_SIZE = 500                # qids per IN (...) list
+
+QUARANTINE_SUBDIR = ".quarantine"
+
+# A JPEG may carry trailer data after its EOI marker (some cameras
+# append their own blocks); look for EOI this far back from the end
+JPEG_TAIL = 256 * 1024
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_IHDR = b"\x00\x00\x00\x0dIHDR"
+PNG_IEND = b"\x00\x00\x00\x00IEND\xaeB`\x82"
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+# ---------------------------------------------------------
+# Checks (run in the worker processes)
+# ---------------------------------------------------------
+def check_structure(mm, ext):
+    """Problem with the file's framing, or None."""
+    size = len(mm)
+    if mm[:2] == JPEG_SOI:
+        if mm.rfind(JPEG_EOI, max(0, size - JPEG_TAIL)) < 0:
+            return "jpeg: no EOI marker (truncated)"
+        return None
+    if mm[:8] == PNG_SIGNATURE:
+        if mm[8:16] != PNG_IHDR:
+            return "png: IHDR is not the first chunk"
+        if zlib.crc32(mm[12:29]) != int.from_bytes(mm[29:33], "big"):
+            return "png: IHDR checksum mismatch"
+        width = int.from_bytes(mm[16:20], "big")
+        height = int.from_bytes(mm[20:24], "big")
+        if not width or not height:
+            return "png: zero-sized IHDR"
+        if mm.rfind(PNG_IEND, max(0, size - 4096)) < 0:
+            return "png: no IEND chunk (truncated)"
+        return None
+    if ext in IMAGE_EXTS:
+        # Often an HTML error page saved under the image's name
+        return "not a JPEG or PNG"
+    return None
+
+
+def check_file(job):
+    """job: (qid, path, size, sha1); size/sha1 None if never recorded.
+
+    Returns (qid, path, problem or None, size on disk, sha1 on disk).
+    """
+    qid, path, want_size, want_sha1 = job
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return qid, path, "empty file", 0, None
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                problem = check_structure(mm, os.path.splitext(path)[1].lower())
+                # hashlib reads the mapping in place: the file is paged
+                # in by the kernel, never copied into a Python object
+                sha1 = hashlib.sha1(mm).hexdigest()
+    except OSError as e:
+        return qid, path, f"unreadable: {e}", None, None
+
+    if problem is None and want_size is not None and size != want_size:
+        problem = f"size {size}, expected {want_size}"
+    if problem is None and want_sha1 and sha1 != want_sha1:
+        problem = "sha1 mismatch"
+    return qid, path, problem, size, sha1
+
+
+def _pool(workers):
+    try:
+        return ProcessPoolExecutor(max_workers=workers)
+    except (ImportError, NotImplementedError, OSError) as e:
+        # No working multiprocessing (some Android Pythons lack
+        # sem_open); hashlib drops the GIL, so threads still scale
+        print(f"Process pool unavailable ({e}); using threads.")
+        return ThreadPoolExecutor(max_workers=workers)
+
+
+# ---------------------------------------------------------
+# DB updates
+# ---------------------------------------------------------
+def _batches(items, size=BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def load_expected(conn):
+    return {
+        qid: (size, sha1)
+        for qid, size, sha1 in conn.execute("SELECT qid, size, sha1 FROM images")
+    }
+
+
+def save_verified(conn, verified, baselines):
+    now = time.time()
+    conn.executemany(
+        "UPDATE images SET verified_at = ? WHERE qid = ?",
+        [(now, qid) for qid in verified],
+    )
+    conn.executemany("""
+        INSERT OR IGNORE INTO images (qid, size, sha1, source, saved_at, verified_at)
+        VALUES (?, ?, ?, 'verify', ?, ?)
+    """, [(qid, size, sha1, now, now) for qid, size, sha1 in baselines])
+    conn.commit()
+
+
+def requeue(conn, qids):
+    """Put qids back on the download queue. Returns how many."""
+    requeued = 0
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        for batch in _batches(qids):
+            marks = ",".join("?" * len(batch))
+
+            # Archived by prune.py: bring the row back
+            for qid, year, bucket in c.execute(f"""
+                SELECT qid, year, bucket FROM items_archive
+                WHERE qid IN ({marks})
+            """, batch).fetchall():
+                century = (year // 100) + 1 if year is not None else None
+                priority = classify_year(year)[1]
+                c.execute("""
+                    INSERT OR IGNORE INTO items (qid, year, century, bucket, priority)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (qid, year, century, bucket, priority))
+            c.execute(f"DELETE FROM items_archive WHERE qid IN ({marks})", batch)
+
+            # Rows a crawler has claimed (done = 2) are left to it
+            c.execute(f"""
+                UPDATE items
+                SET done = 0, wifi_retry = 0, last_fail_reason = NULL,
+                    next_attempt_at = NULL, image_url = NULL
+                WHERE qid IN ({marks}) AND done != 2
+            """, batch)
+            requeued += c.rowcount
+
+            c.execute(f"DELETE FROM images WHERE qid IN ({marks})", batch)
+            # A fresh download queues its own upgrade if it needs one
+            c.execute(f"DELETE FROM upgrades WHERE qid IN ({marks})", batch)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return requeued
+
+
+# ---------------------------------------------------------
+# Quarantine
+# ---------------------------------------------------------
+def quarantine(qid, path, dest):
+    """Move a bad file out of the library, out of the gallery's view."""
+    os.makedirs(dest, exist_ok=True)
+    nomedia = os.path.join(dest, ".nomedia")
+    if not os.path.exists(nomedia):
+        open(nomedia, "w").close()
+    target = os.path.join(dest, os.path.basename(path))
+    os.replace(path, target)
+    imagestore.remove(qid)
+    device.scan_media(path)
+    return target
+
+
+# ---------------------------------------------------------
+# Sweep
+# ---------------------------------------------------------
+def verify(images_dir, workers=WORKERS, dry_run=False, quarantine_dir=None):
+    t0 = time.time()
+    quarantine_dir = quarantine_dir or os.path.join(images_dir, QUARANTINE_SUBDIR)
+
+    files = imagestore.scan(images_dir)
+    conn = get_db()
+    expected = load_expected(conn)
+
+    jobs = [(qid, path) + expected.get(qid, (None, None))
+            for qid, path in files.items()]
+    stats = {"files": len(jobs), "ok": 0, "bad": 0, "bytes": 0,
+             "baselined": 0, "requeued": 0}
+    verified, baselines, bad = [], [], []
+
+    def flush(verified, baselines):
+        if not dry_run:
+            save_verified(conn, verified, baselines)
+        stats["ok"] += len(verified) + len(baselines)
+        stats["baselined"] += len(baselines)
+
+    try:
+        with _pool(workers) as pool:
+            for n, (qid, path, problem, size, sha1) in enumerate(
+                pool.map(check_file, jobs, chunksize=CHUNKSIZE), 1
+            ):
+                stats["bytes"] += size or 0
+                if problem:
+                    bad.append((qid, path, problem))
+                    print(f"BAD {qid}: {problem} ({path})")
+                elif qid in expected:
+                    verified.append(qid)
+                else:
+                    baselines.append((qid, size, sha1))
+
+                if n % COMMIT_EVERY == 0:
+                    flush(verified, baselines)
+                    verified, baselines = [], []
+                    print(f"Checked {n}/{len(jobs)} files…")
+
+        flush(verified, baselines)
+        stats["bad"] = len(bad)
+
+        if bad and not dry_run:
+            for qid, path, problem in bad:
+                try:
+                    quarantine(qid, path, quarantine_dir)
+                except OSError as e:
+                    print(f"Could not move {path}: {e}")
+            stats["requeued"] = requeue(conn, [qid for qid, _, _ in bad])
+    finally:
+        conn.close()
+
+    stats["seconds"] = time.time() - t0
+    return stats
+
+
+def _crawler_running():
+    """Is a crawler (app, worker or command line) running right now?"""
+    if device.crawler_pid() is not None:
+        return True
+    import worker
+    try:
+        return bool(worker.request("status", timeout=2).get("crawler"))
+    except (OSError, ValueError):
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify the image library")
+    parser.add_argument("--images", default=device.images_dir(),
+                        help="image library directory")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--quarantine", metavar="DIR",
+                        help=f"where bad files go (default: <images>/{QUARANTINE_SUBDIR})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report only; move nothing, write nothing")
+    args = parser.parse_args(argv)
+
+    if not args.dry_run and _crawler_running():
+        print("The crawler is running; stop it first (or use --dry-run).")
+        return 2
+
+    init_db()
+    stats = verify(args.images, args.workers, args.dry_run, args.quarantine)
+
+    rate = stats["bytes"] / max(stats["seconds"], 1e-6) / 1e6
+    print(f"Verified {stats['files']} files ({stats['bytes'] / 1e9:.2f} GB) "
+          f"in {stats['seconds']:.1f}s, {rate:.0f} MB/s: "
+          f"{stats['ok']} ok ({stats['baselined']} new baselines), "
+          f"{stats['bad']} bad.")
+    if stats["bad"]:
+        if args.dry_run:
+            print("Dry run: nothing moved or re-queued.")
+        else:
+            print(f"Re-queued {stats['requeued']} items for download.")
+    return 1 if stats["bad"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
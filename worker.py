@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import time
+import socket
+import threading
+import subprocess
+import socketserver
+from collections import deque
+
+import device
+import events
+
+# ---------------------------------------------------------
+# Crawl worker process, controlled over a Unix socket
+# ---------------------------------------------------------
+# The crawler and indexer run here instead of inside the Kivy
+# process. Protocol: one JSON object per line.
+#
+#   {"cmd": "ping"}                         -> {"ok": true, "pid": ...}
+#   {"cmd": "start", "engine": "crawler"}   -> {"ok": true, "started": bool}
+#   {"cmd": "stop", "engine": "indexer"}    -> {"ok": true, "stopping": bool}
+#   {"cmd": "status"}                       -> {"ok": true, "crawler": bool, ...}
+#   {"cmd": "shutdown"}                     -> {"ok": true}
+#   {"cmd": "subscribe"}                    -> stream of events (below)
+#
+# Events: {"type": "log", "source", "msg", "at"} for every log line and
+# {"type": "update", "source", "fields"} with the latest field values.
+SOCKET_PATH = os.path.join(device.private_dir(), "worker.sock")
+WORKER_LOG = os.path.join(device.private_dir(), "worker.log")
+
+ENGINES = ("crawler", "indexer")
+
+EVENT_FPS = 10          # broadcast rate to subscribers
+BACKLOG = 200           # log lines replayed to a new subscriber
+SEND_TIMEOUT = 2        # a subscriber this slow is dropped
+REQUEST_TIMEOUT = 5
+SPAWN_TIMEOUT = 15
+SHUTDOWN_GRACE = 30     # seconds to let engines finish their step
+
+_threads = {}
+_engine_lock = threading.Lock()
+_subscribers = {}      # socket -> Event set when it's dropped
+_sub_lock = threading.Lock()
+_backlog = deque(maxlen=BACKLOG)
+_started_at = time.time()
+_server = None
+
+
+# ---------------------------------------------------------
+# Engines
+# ---------------------------------------------------------
+def _run_engine(name):
+    events.update("worker", **{name: True})
+    try:
+        if name == "crawler":
+            import crawler
+            crawler.run_crawler(progress_callback=events.publisher("crawler"))
+        else:
+            import indexer
+            indexer.run_indexer(progress_callback=events.publisher("indexer"))
+    except Exception as e:
+        msg = str(e).split("\n")[0]
+        events.update("app", status=f"{name.upper()} ERROR: {msg}")
+    else:
+        events.update("app", status=f"{name.capitalize()} stopped")
+    finally:
+        events.update("worker", **{name: False})
+
+
+def running(name):
+    thread = _threads.get(name)
+    return thread is not None and thread.is_alive()
+
+
+def start_engine(name):
+    with _engine_lock:
+        if running(name):
+            return False
+        thread = threading.Thread(target=_run_engine, args=(name,),
+                                  name=name, daemon=True)
+        _threads[name] = thread
+        thread.start()
+        return True
+
+
+def stop_engine(name):
+    if not running(name):
+        return False
+    if name == "crawler":
+        import crawler
+        crawler.request_stop()
+    else:
+        import indexer
+        indexer.request_stop()
+    return True
+
+
+def state():
+    snap = {name: running(name) for name in ENGINES}
+    snap["pid"] = os.getpid()
+    snap["uptime"] = round(time.time() - _started_at, 1)
+    if "crawler" in sys.modules:
+        snap["stats"] = dict(sys.modules["crawler"].stats)
+    if "breaker" in sys.modules:
+        snap["breakers"] = sys.modules["breaker"].snapshot()
+    if "resolver" in sys.modules:
+        snap["dns"] = sys.modules["resolver"].snapshot()
+    return snap
+
+
+# ---------------------------------------------------------
+# Server
+# ---------------------------------------------------------
+def handle_command(req):
+    cmd = req.get("cmd")
+    engine = req.get("engine")
+
+    if cmd in ("start", "stop") and engine not in ENGINES:
+        return {"ok": False, "error": f"unknown engine {engine!r}"}
+
+    if cmd == "ping":
+        return {"ok": True, "pid": os.getpid()}
+    if cmd == "start":
+        return {"ok": True, "started": start_engine(engine)}
+    if cmd == "stop":
+        return {"ok": True, "stopping": stop_engine(engine)}
+    if cmd == "status":
+        return dict(state(), ok=True)
+    if cmd == "shutdown":
+        threading.Thread(target=shutdown, daemon=True).start()
+        return {"ok": True}
+    return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+
+def _send(sock, msg):
+    sock.sendall((json.dumps(msg) + "\n").encode())
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                req = json.loads(line)
+            except ValueError:
+                _send(self.connection, {"ok": False, "error": "bad request"})
+                continue
+
+            if req.get("cmd") == "subscribe":
+                self._stream()
+                return
+            _send(self.connection, handle_command(req))
+
+    def _stream(self):
+        sock = self.connection
+        sock.settimeout(SEND_TIMEOUT)
+        try:
+            _send(sock, {"ok": True})
+            for at, source, msg in list(_backlog):
+                _send(sock, {"type": "log", "source": source, "msg": msg, "at": at})
+            _send(sock, {"type": "update", "source": "worker", "fields": state()})
+        except OSError:
+            return
+
+        # The broadcaster does the sending from here on; returning
+        # would close the socket, so wait until it gives up on us
+        dropped = threading.Event()
+        with _sub_lock:
+            _subscribers[sock] = dropped
+        dropped.wait()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _broadcast_loop():
+    while True:
+        time.sleep(1 / EVENT_FPS)
+        lines, latest = events.drain()
+        if not lines and not latest:
+            continue
+
+        out = []
+        for at, source, msg in lines:
+            _backlog.append((at, source, msg))
+            out.append({"type": "log", "source": source, "msg": msg, "at": at})
+        for source, fields in latest.items():
+            fields = {k: v for k, v in fields.items() if k != "message"}
+            if fields:
+                out.append({"type": "update", "source": source, "fields": fields})
+        payload = "".join(json.dumps(m) + "\n" for m in out).encode()
+
+        with _sub_lock:
+            subscribers = list(_subscribers.items())
+        for sock, dropped in subscribers:
+            try:
+                sock.sendall(payload)
+            except OSError:
+                # Hung up, or too slow to take SEND_TIMEOUT worth
+                with _sub_lock:
+                    _subscribers.pop(sock, None)
+                dropped.set()
+
+
+def _remove_stale_socket(path):
+    if not os.path.exists(path):
+        return
+    if is_running(path):
+        raise RuntimeError(f"A worker is already listening on {path}")
+    os.remove(path)
+
+
+def serve(path=SOCKET_PATH):
+    """Run the worker until shutdown() (blocks)."""
+    global _server
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _remove_stale_socket(path)
+
+    _server = _Server(path, _Handler)
+    os.chmod(path, 0o600)
+    threading.Thread(target=_broadcast_loop, name="broadcast", daemon=True).start()
+    print(f"Worker {os.getpid()} listening on {path}")
+    try:
+        _server.serve_forever()
+    finally:
+        _server.server_close()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def shutdown():
+    for name in ENGINES:
+        stop_engine(name)
+    deadline = time.time() + SHUTDOWN_GRACE
+    for name in ENGINES:
+        thread = _threads.get(name)
+        if thread is not None:
+            thread.join(max(0, deadline - time.time()))
+    with _sub_lock:
+        for dropped in _subscribers.values():
+            dropped.set()
+        _subscribers.clear()
+    if _server is not None:
+        _server.shutdown()
+
+
+# ---------------------------------------------------------
+# Client side (UI process, CLI)
+# ---------------------------------------------------------
+def request(cmd, path=SOCKET_PATH, timeout=REQUEST_TIMEOUT, **args):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        _send(sock, dict(args, cmd=cmd))
+        with sock.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise ConnectionError("worker closed the connection")
+    return json.loads(line)
+
+
+def is_running(path=SOCKET_PATH):
+    try:
+        return request("ping", path, timeout=1).get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+
+def spawn(path=SOCKET_PATH):
+    """Make sure a worker is up: the Android service, or a child process."""
+    if is_running(path):
+        return True
+
+    if not device.start_worker_service():
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        os.makedirs(os.path.dirname(WORKER_LOG), exist_ok=True)
+        with open(WORKER_LOG, "ab") as log:
+            subprocess.Popen(
+                [sys.executable, "-m", "artcrawler", "worker", "--socket", path],
+                cwd=app_dir,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                # Own session: outlives the UI and its Ctrl-C
+                start_new_session=True,
+            )
+
+    deadline = time.time() + SPAWN_TIMEOUT
+    while time.time() < deadline:
+        if is_running(path):
+            return True
+        time.sleep(0.2)
+    return False
+
+
+def subscribe(on_event, path=SOCKET_PATH, retry=2):
+    """Stream worker events to on_event(dict) from a daemon thread.
+
+    Reconnects after `retry` seconds if the worker goes away.
+    Returns a threading.Event; set it to stop.
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                    sock.connect(path)
+                    _send(sock, {"cmd": "subscribe"})
+                    with sock.makefile("rb") as f:
+                        f.readline()    # {"ok": true}
+                        for line in f:
+                            if stop.is_set():
+                                return
+                            on_event(json.loads(line))
+            except (OSError, ValueError):
+                pass
+            stop.wait(retry)
+
+    threading.Thread(target=loop, name="worker-events", daemon=True).start()
+    return stop
+
+
+def forward_to_bus(msg):
+    """subscribe() callback that replays worker events on the local bus."""
+    if msg.get("type") == "log":
+        events.log(msg["source"], msg["msg"], msg.get("at"))
+    elif msg.get("type") == "update":
+        events.update(msg["source"], **msg["fields"])